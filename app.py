@@ -1,41 +1,92 @@
 import os
-import sys
+import copy
 import time
 import logging
-from flask import Flask, session, request, redirect, render_template, url_for, jsonify
+from flask import Flask, session, request, redirect, render_template, url_for, jsonify, g
 from spotipy.oauth2 import SpotifyOAuth
 from spotipy.exceptions import SpotifyException
 from dotenv import load_dotenv
 import spotipy
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, 
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                   stream=sys.stdout)
-logger = logging.getLogger(__name__)
-
-# Load environment variables from .env file if present
+# Load environment variables from .env file if present (including the LOG_* settings)
 load_dotenv()
 
-# Import analysis modules
-try:
-    from spotify_analysis.artist_analysis import get_top_artists, analyze_genre_distribution
-    from spotify_analysis.track_analysis import get_top_tracks, analyze_recent_plays
-    from spotify_analysis.mood_analysis import analyze_music_mood
-    from spotify_analysis.obscurity_score import calculate_obscurity_score
-    logger.info("Successfully imported spotify_analysis modules")
-except Exception as e:
-    logger.error(f"ERROR IMPORTING MODULES: {e}")
-    def get_top_artists(*args, **kwargs): return {"error": "Module import failed"}
-    def analyze_genre_distribution(*args, **kwargs): return {"error": "Module import failed"}
-    def get_top_tracks(*args, **kwargs): return {"error": "Module import failed"}
-    def analyze_recent_plays(*args, **kwargs): return {"error": "Module import failed"}
-    def analyze_music_mood(*args, **kwargs): return {"error": "Module import failed"}
-    def calculate_obscurity_score(*args, **kwargs): return {"error": "Module import failed"}
+# Configure logging: records are formatted and written on a background thread
+from spotify_analysis.logs import configure_logging, chatter_logger, logging_stats, ACCESS_LOG  # noqa: E402
+configure_logging()
+logger = logging.getLogger(__name__)
+# Per-request lines (route hits, redirects), rate limited per message
+chatter = chatter_logger(__name__)
+access_logger = logging.getLogger(f"{__name__}.access")
+
+# Import analysis modules. Routes, hooks and the session interface use them at import
+# time, so a broken install fails here rather than serving a half-working app.
+from spotify_analysis.artist_analysis import get_top_artists, analyze_genre_distribution
+from spotify_analysis.track_analysis import get_top_tracks, analyze_recent_plays
+from spotify_analysis.mood_analysis import analyze_music_mood
+from spotify_analysis.obscurity_score import calculate_obscurity_score
+from spotify_analysis.snapshot import UserSnapshot
+from spotify_analysis.fanout import run_concurrently, SectionTimeout
+from spotify_analysis.cache import user_data_cache
+from spotify_analysis.client import SpotifyClient, TokenManager
+from spotify_analysis.transport import pool_stats, ACCOUNTS_URL
+from spotify_analysis.token_refresh import TokenRefresher, REFRESH_MARGIN, PROACTIVE_REFRESH_WINDOW
+from spotify_analysis.scheduler import scheduler
+from spotify_analysis.resilience import resilience_stats, spotify_breaker
+from spotify_analysis.metrics import (registry, traced, call_upstream, set_route, reset_route,
+                                      observe_route)
+from spotify_analysis.profiling import (ENABLED as PROFILING_ENABLED, PROFILE_HEADER, wants_profile,
+                                        start_profile, stop_profile, is_authorised,
+                                        list_profiles, read_profile, profiling_stats)
+from spotify_analysis.feature_store import get_feature_store
+from spotify_analysis.metadata import metadata_store
+from spotify_analysis.mood_classifier import mood_classifier
+from spotify_analysis.history import analyze_listening_history, get_listening_history
+from spotify_analysis.play_store import get_play_store
+from spotify_analysis.jobs import job_queue, wait_for
+from spotify_analysis.sessions import create_session_interface
+from spotify_analysis.search import search_artists, artist_index, search_stats, search_cache
+from spotify_analysis.artist_details import get_artists_details, artist_cache, MAX_BATCH as MAX_ARTIST_BATCH
 
 # Spotify API scopes - all the permissions we need
 SCOPE = "user-read-private user-read-email user-top-read user-read-recently-played playlist-read-private"
 
+# Seconds spotipy waits on a single Spotify call, and on a whole page's fetches
+REQUEST_TIMEOUT = float(os.environ.get('SPOTIFY_REQUEST_TIMEOUT', 5))
+PAGE_DEADLINE = float(os.environ.get('SPOTIFY_PAGE_DEADLINE', 10))
+
+EMPTY_RECENT = {'hour_distribution': {}, 'peak_listening_hour': None, 'top_recent_artists': []}
+EMPTY_GENRES = {'genre_counts': {}, 'genre_percentages': {}, 'sorted_genres': []}
+EMPTY_MOOD = {'mood': 'Unavailable', 'danceability_interpretation': 'Unavailable right now'}
+
+# Page sections: name -> (loader taking a snapshot, fallback used if the section fails)
+PAGE_SECTIONS = {
+    'top_artists_short': (lambda snapshot: get_top_artists(snapshot, 'short_term'), []),
+    'top_artists_medium': (lambda snapshot: get_top_artists(snapshot, 'medium_term'), []),
+    'top_artists_long': (lambda snapshot: get_top_artists(snapshot, 'long_term'), []),
+    'top_tracks_short': (lambda snapshot: get_top_tracks(snapshot, 'short_term'), []),
+    'top_tracks_medium': (lambda snapshot: get_top_tracks(snapshot, 'medium_term'), []),
+    'top_tracks_long': (lambda snapshot: get_top_tracks(snapshot, 'long_term'), []),
+    'recent': (lambda snapshot: analyze_recent_plays(snapshot), EMPTY_RECENT),
+    'mood': (lambda snapshot: analyze_music_mood(snapshot), EMPTY_MOOD),
+    'genre_data': (lambda snapshot: analyze_genre_distribution(snapshot), EMPTY_GENRES),
+    'obscurity': (lambda snapshot: calculate_obscurity_score(snapshot), 50),
+    # Stored history, brought up to date from the recently-played `after` cursor
+    'history': (lambda snapshot: analyze_listening_history(snapshot), EMPTY_RECENT),
+}
+# Sections each page shows; 'history' ingests new plays, so only Music DNA runs it
+TOP_ITEM_SECTIONS = ['top_artists_short', 'top_artists_medium', 'top_artists_long',
+                     'top_tracks_short', 'top_tracks_medium', 'top_tracks_long']
+DASHBOARD_SECTIONS = TOP_ITEM_SECTIONS + ['recent', 'mood', 'genre_data', 'obscurity']
+BASICS_SECTIONS = TOP_ITEM_SECTIONS + ['recent', 'mood', 'genre_data', 'obscurity']
+MUSIC_DNA_SECTIONS = ['mood', 'genre_data', 'history']
+
+# Browser/proxy cache lifetime for artist details, which are the same for every user
+ARTIST_MAX_AGE = int(os.environ.get('ARTIST_CACHE_MAX_AGE', 3600))
+
+# Send page shells right away and let sections.js load each section from /api/section/<name>
+PROGRESSIVE_PAGES = os.environ.get('SPOTIFY_PROGRESSIVE_PAGES', '').lower() in ('1', 'true', 'yes')
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -45,8 +96,9 @@ if not app.secret_key:
     logger.warning("WARNING: Using random secret key - sessions will be invalidated on restart")
     app.secret_key = os.urandom(24)
 
-# Configure session
+# Configure session: data (including token_info) stays on the server, the cookie holds its id
 app.config['SESSION_COOKIE_NAME'] = 'spotify-login-session'
+app.session_interface = create_session_interface()
 
 def create_spotify_oauth():
     """Create and configure a SpotifyOAuth object"""
@@ -55,82 +107,237 @@ def create_spotify_oauth():
         client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
         redirect_uri = os.environ.get('SPOTIFY_REDIRECT_URI')
         
-        logger.info(f"Creating OAuth with redirect URI: {redirect_uri}")
+        chatter.info("Creating OAuth with redirect URI: %s", redirect_uri)
         
         # Don't use cache_path - rely only on session storage
-        return SpotifyOAuth(
+        sp_oauth = SpotifyOAuth(
             client_id=client_id,
             client_secret=client_secret,
             redirect_uri=redirect_uri,
             scope=SCOPE,
             cache_path=None  # Don't use file caching
         )
+        sp_oauth.OAUTH_TOKEN_URL = f"{ACCOUNTS_URL}/api/token"
+        return sp_oauth
     except Exception as e:
-        logger.error(f"ERROR CREATING OAUTH: {e}")
+        logger.error("ERROR CREATING OAUTH: %s", e)
         raise
 
 def get_token():
-    """Get and validate the token from the session, refreshing if needed"""
+    """Get and validate the token from the session, refreshing if needed
+    
+    Refreshes are single-flight per refresh token, and tokens close to expiry
+    are refreshed in the background so requests rarely wait on one.
+    """
     try:
         token_info = session.get('token_info', None)
         
         if not token_info:
-            logger.info("No token found in session")
+            chatter.info("No token found in session")
             return None
 
+        # Another request, worker or background refresh may already have a newer token
+        newer = token_refresher.peek(token_info['refresh_token'])
+        if newer and newer['expires_at'] > token_info['expires_at']:
+            token_info = newer
+            session['token_info'] = token_info
+
         now = int(time.time())
-        is_expired = token_info['expires_at'] - now < 60
+        remaining = token_info['expires_at'] - now
         
-        if is_expired:
+        if remaining < REFRESH_MARGIN:
             logger.info("Token is expired, refreshing...")
-            sp_oauth = create_spotify_oauth()
-            token_info = sp_oauth.refresh_access_token(token_info['refresh_token'])
+            token_info = token_refresher.refresh(token_info['refresh_token'], token_info['access_token'])
             session['token_info'] = token_info
+        elif remaining < PROACTIVE_REFRESH_WINDOW:
+            token_refresher.refresh_in_background(token_info['refresh_token'], token_info['access_token'])
             
         return token_info
     except Exception as e:
-        logger.error(f"ERROR IN get_token: {e}")
+        logger.error("ERROR IN get_token: %s", e)
         session.clear()  # Clear invalid session
         return None
 
-def get_spotify_client():
-    """Get an authenticated Spotify client using the current user's token"""
-    try:
+def refresh_token_info(refresh_token):
+    """Exchange a refresh token for a new token_info dict"""
+    return call_upstream(create_spotify_oauth().refresh_access_token, 'accounts/api/token', refresh_token)
+
+# One refresher per worker, so concurrent requests for a user share a single refresh
+token_refresher = TokenRefresher(refresh_token_info)
+
+def refresh_rejected_token(refresh_token, stale_access_token=None):
+    """Refresh callback for TokenManager, used when Spotify answers 401"""
+    logger.info("Access token rejected by Spotify, refreshing...")
+    return token_refresher.refresh(refresh_token, stale_access_token)
+
+def get_token_manager():
+    """Per-request TokenManager for the session token; refreshed tokens are saved after the request"""
+    if 'token_manager' not in g:
         token_info = get_token()
         if not token_info:
-            logger.info("No valid token available")
             return None
-            
-        # Create a fresh client with the current token
-        client = spotipy.Spotify(auth=token_info['access_token'])
-        
-        # Test the client with a basic API call
-        try:
-            user = client.me()
-            logger.info(f"Authenticated as: {user.get('display_name')} ({user.get('id')})")
-            return client
-        except Exception as e:
-            logger.error(f"Token validation failed: {e}")
-            session.clear()
+        g.token_manager = TokenManager(token_info, refresh_rejected_token)
+    return g.token_manager
+
+def get_spotify_client():
+    """Get an authenticated Spotify client using the current user's token
+    
+    The token is not tested up front; a 401 from the first real call
+    triggers one refresh-and-retry inside SpotifyClient.
+    """
+    try:
+        token_manager = get_token_manager()
+        if not token_manager:
+            chatter.info("No valid token available")
             return None
             
+        return SpotifyClient(auth_manager=token_manager, requests_timeout=REQUEST_TIMEOUT)
     except Exception as e:
-        logger.error(f"ERROR creating Spotify client: {e}")
+        logger.error("ERROR creating Spotify client: %s", e)
         return None
 
+def profile_summary(user):
+    """The few profile fields the pages use, small enough to keep in the session"""
+    return {
+        'id': user.get('id'),
+        'display_name': user.get('display_name'),
+        'email': user.get('email')
+    }
+
+@traced
+def get_user_info(sp):
+    """Return the profile cached in the session, fetching it once if it's missing"""
+    user_info = session.get('user_info')
+    if not user_info:
+        user_info = profile_summary(sp.me())
+        session['user_info'] = user_info
+    return user_info
+
+@app.before_request
+def start_request_metrics():
+    """Label the Spotify calls made while serving this request with its route"""
+    g.request_started = time.perf_counter()
+    g.route_token = set_route(request.endpoint or 'not_found')
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' in g:
+        observe_route(request.endpoint or 'not_found', request.method, response.status_code,
+                      time.perf_counter() - g.request_started)
+    return response
+
+@app.after_request
+def log_request(response):
+    """Access log line, written by the logging thread rather than by gunicorn on this one"""
+    if ACCESS_LOG and 'request_started' in g:
+        elapsed_ms = (time.perf_counter() - g.request_started) * 1000
+        access_logger.info('%s "%s %s" %s %.1fms', request.remote_addr, request.method,
+                           request.full_path.rstrip('?'), response.status_code, elapsed_ms,
+                           extra={'route': request.endpoint, 'status': response.status_code,
+                                  'duration_ms': round(elapsed_ms, 1)})
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    route_token = g.pop('route_token', None)
+    if route_token is not None:
+        reset_route(route_token)
+
+@app.before_request
+def start_request_profile():
+    """Sample this request's stacks if it was picked for profiling"""
+    if PROFILING_ENABLED and wants_profile(request.headers.get(PROFILE_HEADER)):
+        g.profile = start_profile(request.endpoint or 'not_found')
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        name = stop_profile(profile)
+        if name:
+            logger.info("Saved request profile %s", name)
+
+@app.after_request
+def save_refreshed_token(response):
+    """Persist a token refreshed mid-request (possibly from a fan-out thread)"""
+    token_manager = g.get('token_manager')
+    if token_manager is not None and token_manager.refreshed:
+        session['token_info'] = token_manager.token_info
+    return response
+
+def section_job_key(user_id, name):
+    return ('section', user_id, name)
+
+def start_page_sections(token_info, user_info, names):
+    """
+    Compute page sections in background jobs, one per section, over one shared snapshot.
+    
+    Started at login, so the first page renders from warm results, and by
+    progressive page shells, whose section requests pick the results up.
+    Sections already running or recently computed for the user are reused.
+    """
+    sp = SpotifyClient(auth_manager=TokenManager(token_info, refresh_rejected_token),
+                       requests_timeout=REQUEST_TIMEOUT)
+    snapshot = UserSnapshot(sp, user_info=user_info)
+    for name in names:
+        job_queue.submit(section_job_key(user_info.get('id'), name), PAGE_SECTIONS[name][0], snapshot)
+
+def section_jobs(user_id, names):
+    """name -> Future of the background job computing each section, for the sections that have one"""
+    if not user_id:
+        return {}
+    futures = job_queue.futures([section_job_key(user_id, name) for name in names])
+    return {key[2]: future for key, future in futures.items()}
+
+def time_left(deadline):
+    """Seconds until an absolute time.monotonic() deadline, never negative"""
+    return max(0.0, deadline - time.monotonic())
+
+def job_outcomes(results, errors):
+    """wait_for() outcomes as run_concurrently() reports them, with SectionTimeout for unfinished jobs"""
+    return results, {name: error or SectionTimeout(name) for name, error in errors.items()}
+
+def load_page_sections(snapshot, names, deadline=None):
+    """Run the named page sections in parallel, falling back per section on failure
+    
+    Sections with a background job (see start_page_sections) take that job's
+    result, waiting for it if it is still running rather than computing the
+    section a second time. Everything shares one deadline, PAGE_DEADLINE
+    seconds from the call unless given (as a time.monotonic() value).
+    """
+    if deadline is None:
+        deadline = time.monotonic() + PAGE_DEADLINE
+    jobs = section_jobs(snapshot.me().get('id'), names)
+    tasks = {name: (lambda loader=PAGE_SECTIONS[name][0]: loader(snapshot))
+             for name in names if name not in jobs}
+    # The jobs keep running on their own threads while the other sections are computed
+    results, errors = run_concurrently(tasks, deadline=time_left(deadline))
+    warm, failed = job_outcomes(*wait_for(jobs, timeout=time_left(deadline)))
+    results.update(warm)
+    errors.update(failed)
+    
+    for name, error in errors.items():
+        results[name] = section_fallback(name, error)
+    return results
+
+def section_fallback(name, error):
+    """Log a failed page section and return its empty placeholder"""
+    logger.warning("Section %s unavailable: %r", name, error)
+    return copy.deepcopy(PAGE_SECTIONS[name][1])
+
 def is_authenticated():
     """Check if the user is authenticated"""
     try:
         return 'token_info' in session and get_token() is not None
     except Exception as e:
-        logger.error(f"Error checking authentication: {e}")
+        logger.error("Error checking authentication: %s", e)
         return False
 
 # Routes
 @app.route('/')
 def index():
     """Landing page - shows login button or redirects to dashboard"""
-    logger.info("Route / accessed")
+    chatter.info("Route / accessed")
     if not is_authenticated():
         return render_template('login.html')
     return redirect(url_for('dashboard'))
@@ -138,20 +345,20 @@ def index():
 @app.route('/login')
 def login():
     """Initialize Spotify OAuth flow"""
-    logger.info("Login route accessed")
+    chatter.info("Login route accessed")
     try:
         sp_oauth = create_spotify_oauth()
         auth_url = sp_oauth.get_authorize_url()
-        logger.info(f"Generated auth URL: {auth_url}")
+        chatter.info("Generated auth URL: %s", auth_url)
         return redirect(auth_url)
     except Exception as e:
-        logger.error(f"Error during login: {e}")
+        logger.error("Error during login: %s", e)
         return render_template('error.html', error=str(e))
 
 @app.route('/callback')
 def callback():
     """Handle the OAuth callback from Spotify"""
-    logger.info("Callback route accessed")
+    chatter.info("Callback route accessed")
     try:
         sp_oauth = create_spotify_oauth()
         session.clear()
@@ -160,199 +367,266 @@ def callback():
         # If there's an error parameter in the callback, handle it
         if 'error' in request.args:
             error = request.args.get('error')
-            logger.error(f"Spotify auth error: {error}")
+            logger.error("Spotify auth error: %s", error)
             return render_template('error.html', 
                 error=f"Spotify authorization failed: {error}",
                 show_login=True)
         
         try:
             # Force a new token request (don't use cache)
-            token_info = sp_oauth.get_access_token(code, check_cache=False)
+            token_info = call_upstream(sp_oauth.get_access_token, 'accounts/api/token',
+                                       code, check_cache=False)
             session['token_info'] = token_info
             
-            # Test the token immediately
-            sp = spotipy.Spotify(auth=token_info['access_token'])
-            user = sp.me()  # Test API call
-            logger.info(f"User authenticated: {user.get('id')} - {user.get('display_name')}")
+            # Test the token immediately and keep the profile for later requests
+            sp = SpotifyClient(auth=token_info['access_token'], requests_timeout=REQUEST_TIMEOUT)
+            user = sp.me()
+            session['user_info'] = profile_summary(user)
+            logger.info("User authenticated: %s - %s", user.get('id'), user.get('display_name'))
+            
+            # Start fetching and analyzing while the browser follows the redirect
+            start_page_sections(token_info, session['user_info'], DASHBOARD_SECTIONS)
             
             return redirect(url_for('dashboard'))
             
         except spotipy.oauth2.SpotifyOauthError as oauth_error:
-            logger.error(f"OAuth error: {oauth_error}")
+            logger.error("OAuth error: %s", oauth_error)
             return render_template('error.html', 
                 error="Authentication failed. Please try logging in again.",
                 show_login=True)
             
     except Exception as e:
-        logger.error(f"Error during callback: {e}")
+        logger.error("Error during callback: %s", e)
         return render_template('error.html', 
             error=str(e),
             show_login=True)
             
     except Exception as e:
-        logger.error(f"Error during callback: {e}")
+        logger.error("Error during callback: %s", e)
         return render_template('error.html', error=str(e))
 
 @app.route('/logout')
 def logout():
     """Clear the user session"""
-    logger.info("Logout route accessed")
+    chatter.info("Logout route accessed")
     session.clear()
     return redirect(url_for('index'))
 
+def dashboard_context(data):
+    return dict(
+        top_artists_short=data['top_artists_short'],
+        top_artists_medium=data['top_artists_medium'],
+        top_artists_long=data['top_artists_long'],
+        top_tracks_short=data['top_tracks_short'],
+        top_tracks_medium=data['top_tracks_medium'],
+        top_tracks_long=data['top_tracks_long'],
+        recent=data['recent'],
+        mood=data['mood'],
+        genre_data=data['genre_data'],
+        obscurity_score=data['obscurity']
+    )
+
+def basics_context(data):
+    return dict(
+        # Artists
+        top_artists_short=data['top_artists_short'],
+        top_artists_medium=data['top_artists_medium'],
+        top_artists_long=data['top_artists_long'],
+        top_artists=data['top_artists_medium'],  # For backward compatibility
+        # Tracks
+        top_tracks_short=data['top_tracks_short'],
+        top_tracks_medium=data['top_tracks_medium'],
+        top_tracks_long=data['top_tracks_long'],
+        top_tracks=data['top_tracks_medium'],  # For backward compatibility
+        # Other data
+        genre_data=data['genre_data'],
+        recent=data['recent'],
+        mood=data['mood'],
+        obscurity=data['obscurity']
+    )
+
+def music_dna_context(data):
+    return dict(
+        mood=data['mood'],
+        genre_data=data['genre_data'],
+        recent=data['history']
+    )
+
+# Pages built from sections: name (also the active_page) -> (template, sections, template variables).
+# A section's markup sits in {% block <section>__<slot> %} blocks so it can be rendered on its own.
+PAGES = {
+    'dashboard': ('dashboard.html', DASHBOARD_SECTIONS, dashboard_context),
+    'basics': ('basics.html', BASICS_SECTIONS, basics_context),
+    'music_dna': ('music_dna.html', MUSIC_DNA_SECTIONS, music_dna_context),
+}
+
+def page_variables(page, user_info, data, pending=()):
+    """Template variables for a page; sections in pending get their fallback and render as placeholders"""
+    _, names, context = PAGES[page]
+    data = dict(data)
+    for name in pending:
+        data[name] = PAGE_SECTIONS[name][1]
+    return dict(context(data), user_info=user_info, active_page=page, pending=list(pending))
+
+def render_page(page, user_info, data):
+    return render_template(PAGES[page][0], **page_variables(page, user_info, data))
+
+def render_page_shell(page):
+    """
+    The page with every section left as a placeholder, for progressive mode.
+    
+    Needs no Spotify call; the sections start computing in background jobs
+    right away and sections.js fetches each one from /api/section/<name>.
+    Returns None when the profile isn't in the session yet.
+    """
+    token_info = get_token()
+    user_info = session.get('user_info')
+    if not token_info or not user_info:
+        return None
+    names = PAGES[page][1]
+    start_page_sections(token_info, user_info, names)
+    return render_template(PAGES[page][0], **page_variables(page, user_info, {}, pending=names))
+
+def render_section(page, user_info, name, value):
+    """HTML of each of the page's slots for one section, keyed by slot name"""
+    template = app.jinja_env.get_template(PAGES[page][0])
+    variables = page_variables(page, user_info, {name: value},
+                               pending=[other for other in PAGES[page][1] if other != name])
+    app.update_template_context(variables)
+    context = template.new_context(variables)
+    prefix = name + '__'
+    return {block: ''.join(render(context)) for block, render in template.blocks.items()
+            if block.startswith(prefix)}
+
 @app.route('/dashboard')
 def dashboard():
     """Main dashboard page showing user's Spotify stats"""
-    logger.info("Dashboard route accessed")
+    chatter.info("Dashboard route accessed")
     if not is_authenticated():
-        logger.info("Not authenticated, redirecting to index")
+        chatter.info("Not authenticated, redirecting to index")
         return redirect(url_for('index'))
         
+    if PROGRESSIVE_PAGES:
+        shell = render_page_shell('dashboard')
+        if shell is not None:
+            return shell
+        
     try:
         sp = get_spotify_client()
         if not sp:
             logger.warning("Failed to get Spotify client, redirecting to login")
             return redirect(url_for('login'))
             
-        user_info = sp.me()
-        logger.info(f"Showing dashboard for: {user_info.get('display_name')}")
-        
-        # Get top artists
-        top_artists_short = get_top_artists(sp, 'short_term')
-        top_artists_medium = get_top_artists(sp, 'medium_term')
-        top_artists_long = get_top_artists(sp, 'long_term')
-        
-        # Get top tracks
-        top_tracks_short = get_top_tracks(sp, 'short_term')
-        top_tracks_medium = get_top_tracks(sp, 'medium_term')
-        top_tracks_long = get_top_tracks(sp, 'long_term')
-        
-        # Get recent plays and mood analysis
-        recent = analyze_recent_plays(sp)
-        mood = analyze_music_mood(sp)
+        # Every analysis below reads from one shared fetch of the user's data
+        snapshot = UserSnapshot(sp, user_info=get_user_info(sp))
+        user_info = snapshot.me()
+        chatter.info("Showing dashboard for: %s", user_info.get('display_name'))
         
-        # Genre distribution
-        genre_data = analyze_genre_distribution(sp)
+        # Top artists/tracks, recent plays, mood, genres and obscurity are fetched in parallel
+        data = load_page_sections(snapshot, DASHBOARD_SECTIONS)
+        chatter.info("Dashboard data loaded with %s upstream calls", snapshot.upstream_calls)
         
-        # Calculate obscurity score (THIS WAS MISSING)
-        from spotify_analysis.obscurity_score import calculate_obscurity_score
-        obscurity_score = calculate_obscurity_score(sp)
-        
-        return render_template(
-            'dashboard.html',
-            user_info=user_info,
-            top_artists_short=top_artists_short,
-            top_artists_medium=top_artists_medium,
-            top_artists_long=top_artists_long,
-            top_tracks_short=top_tracks_short,
-            top_tracks_medium=top_tracks_medium,
-            top_tracks_long=top_tracks_long,
-            recent=recent,
-            mood=mood,
-            genre_data=genre_data,
-            obscurity_score=obscurity_score,  # ADD THIS LINE
-            active_page='dashboard'
-        )
+        return render_page('dashboard', user_info, data)
     except Exception as e:
-        logger.error(f"Error in dashboard route: {e}", exc_info=True)
+        logger.error("Error in dashboard route: %s", e, exc_info=True)
         return render_template('error.html', error=str(e))
 
 @app.route('/basics')
 def basics():
     """Show basic stats about the user's listening habits"""
-    logger.info("Basics route accessed")
+    chatter.info("Basics route accessed")
     if not is_authenticated():
-        logger.info("Not authenticated, redirecting to login")
+        chatter.info("Not authenticated, redirecting to login")
         return redirect(url_for('login'))
         
+    if PROGRESSIVE_PAGES:
+        shell = render_page_shell('basics')
+        if shell is not None:
+            return shell
+        
     try:
         sp = get_spotify_client()
         if not sp:
             logger.warning("Failed to get Spotify client, redirecting to login")
             return redirect(url_for('login'))
             
-        # Get user info and top items
-        user_info = sp.me()
-        
-        # Get top artists for different time ranges
-        top_artists_short = get_top_artists(sp, 'short_term')
-        top_artists_medium = get_top_artists(sp, 'medium_term')
-        top_artists_long = get_top_artists(sp, 'long_term')
-        
-        # Get top tracks for different time ranges
-        top_tracks_short = get_top_tracks(sp, 'short_term')
-        top_tracks_medium = get_top_tracks(sp, 'medium_term')
-        top_tracks_long = get_top_tracks(sp, 'long_term')
+        # Get user info and top items from one shared fetch
+        snapshot = UserSnapshot(sp, user_info=get_user_info(sp))
+        user_info = snapshot.me()
         
-        # Get other data
-        genre_data = analyze_genre_distribution(sp)
-        recent = analyze_recent_plays(sp)
-        mood = analyze_music_mood(sp)
-        obscurity = calculate_obscurity_score(sp)
+        # Top artists and tracks for each time range plus the other analyses, in parallel
+        data = load_page_sections(snapshot, BASICS_SECTIONS)
+        chatter.info("Basics data loaded with %s upstream calls", snapshot.upstream_calls)
         
-        return render_template(
-            'basics.html',
-            user_info=user_info,
-            # Artists
-            top_artists_short=top_artists_short,
-            top_artists_medium=top_artists_medium,
-            top_artists_long=top_artists_long,
-            top_artists=top_artists_medium,  # For backward compatibility
-            # Tracks
-            top_tracks_short=top_tracks_short,
-            top_tracks_medium=top_tracks_medium,
-            top_tracks_long=top_tracks_long,
-            top_tracks=top_tracks_medium,  # For backward compatibility
-            # Other data
-            genre_data=genre_data,
-            recent=recent,
-            mood=mood,
-            obscurity=obscurity,
-            active_page='basics'
-        )
+        return render_page('basics', user_info, data)
     except Exception as e:
-        logger.error(f"Error in basics route: {e}", exc_info=True)
+        logger.error("Error in basics route: %s", e, exc_info=True)
         return render_template('error.html', error=str(e))
 
 @app.route('/music_dna')
 def music_dna():
     """Show detailed analysis of the user's musical taste"""
-    logger.info("Music DNA route accessed")
+    chatter.info("Music DNA route accessed")
     if not is_authenticated():
-        logger.info("Not authenticated, redirecting to login")
+        chatter.info("Not authenticated, redirecting to login")
         return redirect(url_for('login'))
         
+    if PROGRESSIVE_PAGES:
+        shell = render_page_shell('music_dna')
+        if shell is not None:
+            return shell
+        
     try:
         sp = get_spotify_client()
         if not sp:
             logger.warning("Failed to get Spotify client, redirecting to login")
             return redirect(url_for('login'))
             
-        user_info = sp.me()
+        snapshot = UserSnapshot(sp, user_info=get_user_info(sp))
+        user_info = snapshot.me()
         
-        # Analysis data - ADD RECENT PLAYS
-        mood = analyze_music_mood(sp)
-        genre_data = analyze_genre_distribution(sp)
-        recent = analyze_recent_plays(sp)  # ADD THIS LINE
+        # Analysis data
+        data = load_page_sections(snapshot, MUSIC_DNA_SECTIONS)
+        chatter.info("Music DNA data loaded with %s upstream calls", snapshot.upstream_calls)
         
-        return render_template(
-            'music_dna.html',
-            user_info=user_info,
-            mood=mood,
-            genre_data=genre_data,
-            recent=recent,  # ADD THIS LINE
-            active_page='music_dna'
-        )
+        return render_page('music_dna', user_info, data)
     except Exception as e:
-        logger.error(f"Error in music_dna route: {e}", exc_info=True)
+        logger.error("Error in music_dna route: %s", e, exc_info=True)
         return render_template('error.html', error=str(e))
 
+@app.route('/api/section/<name>')
+def page_section(name):
+    """One page section for progressive pages: its slots' HTML and the raw section data"""
+    page = request.args.get('page', 'dashboard')
+    if not is_authenticated():
+        return jsonify({"error": "Not authenticated"}), 401
+    if page not in PAGES or name not in PAGES[page][1]:
+        return jsonify({"error": f"Unknown section {name} for page {page}"}), 404
+    
+    try:
+        sp = get_spotify_client()
+        if not sp:
+            return jsonify({"error": "Not authenticated"}), 401
+        
+        # Usually already computed by the job the page shell started
+        snapshot = UserSnapshot(sp, user_info=get_user_info(sp))
+        user_info = snapshot.me()
+        value = load_page_sections(snapshot, [name])[name]
+        return jsonify({
+            "section": name,
+            "fragments": render_section(page, user_info, name, value),
+            "data": value
+        })
+    except Exception as e:
+        logger.error("Error in page_section for %s: %s", name, e)
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/artist_search')
 def artist_search():
     """Artist search page"""
-    logger.info("Artist search route accessed")
+    chatter.info("Artist search route accessed")
     if not is_authenticated():
-        logger.info("Not authenticated, redirecting to login")
+        chatter.info("Not authenticated, redirecting to login")
         return redirect(url_for('login'))
         
     try:
@@ -361,7 +635,7 @@ def artist_search():
             logger.warning("Failed to get Spotify client, redirecting to login")
             return redirect(url_for('login'))
             
-        user_info = sp.me()
+        user_info = get_user_info(sp)
         
         return render_template(
             'artist_search.html',
@@ -369,14 +643,14 @@ def artist_search():
             active_page='artist_search'
         )
     except Exception as e:
-        logger.error(f"Error in artist_search route: {e}", exc_info=True)
+        logger.error("Error in artist_search route: %s", e, exc_info=True)
         return render_template('error.html', error=str(e))
 
 # API endpoints
 @app.route('/api/search-artist')
 def search_artist():
     """API endpoint to search for artists"""
-    logger.info(f"Search artist API accessed with query: {request.args.get('query')}")
+    chatter.info("Search artist API accessed with query: %s", request.args.get('query'))
     if not is_authenticated():
         return jsonify({"error": "Not authenticated"}), 401
     
@@ -387,37 +661,72 @@ def search_artist():
         if not query:
             return jsonify({"error": "No search query provided"}), 400
             
-        results = sp.search(q=query, type='artist', limit=5)
+        results = search_artists(sp, query, limit=5)
         return jsonify(results)
     except Exception as e:
-        logger.error(f"Error in search_artist: {e}")
+        logger.error("Error in search_artist: %s", e)
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/suggest-artist')
+def suggest_artist():
+    """Type-ahead suggestions from the local artist index; never calls Spotify"""
+    if not is_authenticated():
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    prefix = request.args.get('prefix', '')
+    limit = min(request.args.get('limit', 5, type=int), 20)
+    return jsonify({"artists": artist_index.suggest(prefix, limit=limit)})
+
+def cacheable_json(payload, max_age=ARTIST_MAX_AGE):
+    """JSON response with an ETag and Cache-Control, answering 304 when the client's copy matches"""
+    response = jsonify(payload)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.add_etag()
+    return response.make_conditional(request)
+
+def parse_artist_ids():
+    """Comma-separated ?ids= list for the bulk artist endpoints"""
+    return [artist_id for artist_id in request.args.get('ids', '').split(',') if artist_id]
+
 @app.route('/api/artist/<artist_id>')
 def get_artist_details(artist_id):
     """API endpoint to get artist details"""
-    logger.info(f"Artist details API accessed for ID: {artist_id}")
+    chatter.info("Artist details API accessed for ID: %s", artist_id)
     if not is_authenticated():
         return jsonify({"error": "Not authenticated"}), 401
     
     try:
         sp = get_spotify_client()
-        # Get artist details
-        artist = sp.artist(artist_id)
-        
-        # Get artist's top tracks
-        top_tracks = sp.artist_top_tracks(artist_id)
-        
-        # Get artist's albums
-        albums = sp.artist_albums(artist_id, album_type='album', limit=5)
-        
-        return jsonify({
-            "artist": artist,
-            "top_tracks": top_tracks,
-            "albums": albums
+        details, errors = get_artists_details(sp, [artist_id])
+        if artist_id not in details:
+            return jsonify({"error": errors.get(artist_id, "Artist not found")}), 500
+        return cacheable_json(details[artist_id])
+    except Exception as e:
+        logger.error("Error in get_artist_details: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/artists')
+def get_artists_bulk():
+    """API endpoint to get details for up to 50 artists: /api/artists?ids=id1,id2,..."""
+    artist_ids = parse_artist_ids()
+    chatter.info("Bulk artist details API accessed for %s IDs", len(artist_ids))
+    if not is_authenticated():
+        return jsonify({"error": "Not authenticated"}), 401
+    if not artist_ids:
+        return jsonify({"error": "No artist ids provided"}), 400
+    if len(artist_ids) > MAX_ARTIST_BATCH:
+        return jsonify({"error": f"At most {MAX_ARTIST_BATCH} artist ids per request"}), 400
+    
+    try:
+        sp = get_spotify_client()
+        details, errors = get_artists_details(sp, artist_ids)
+        return cacheable_json({
+            "artists": [details[artist_id] for artist_id in artist_ids if artist_id in details],
+            "errors": errors
         })
     except Exception as e:
-        logger.error(f"Error in get_artist_details: {e}")
+        logger.error("Error in get_artists_bulk: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/health')
@@ -432,9 +741,84 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "environment_variables": env_status,
-        "authenticated": is_authenticated()
+        "authenticated": is_authenticated(),
+        "user_data_cache": user_data_cache.stats(),
+        "http_pool": pool_stats(),
+        "token_refresh": token_refresher.stats(),
+        "scheduler": scheduler.stats(),
+        "resilience": resilience_stats(),
+        "artist_search": search_stats(),
+        "artist_cache": artist_cache.stats(),
+        "audio_features": get_feature_store().stats(),
+        "metadata": metadata_store.stats(),
+        "mood_classifier": mood_classifier.stats(),
+        "listening_history": get_listening_history().stats(),
+        "play_store": get_play_store().stats(),
+        "jobs": job_queue.stats(),
+        "profiling": profiling_stats(),
+        "logging": logging_stats(),
+        "sessions": app.session_interface.stats()
     })
 
+@registry.collector
+def cache_metrics():
+    caches = {'user_data': user_data_cache, 'artist': artist_cache, 'search': search_cache}
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    return [
+        ('spotify_cache_hits_total', 'counter', "Fresh cache hits",
+         [({'cache': name}, s['hits']) for name, s in stats.items()]),
+        ('spotify_cache_stale_hits_total', 'counter', "Stale entries served while revalidating",
+         [({'cache': name}, s['stale_hits']) for name, s in stats.items()]),
+        ('spotify_cache_misses_total', 'counter', "Cache misses",
+         [({'cache': name}, s['misses']) for name, s in stats.items()]),
+        ('spotify_cache_hit_ratio', 'gauge', "Fresh hits over all lookups since the worker started",
+         [({'cache': name}, s['hit_ratio']) for name, s in stats.items()]),
+        ('spotify_cache_bytes', 'gauge', "Approximate size of the cached values",
+         [({'cache': name}, s['bytes']) for name, s in stats.items()]),
+    ]
+
+@registry.collector
+def upstream_metrics():
+    breaker = spotify_breaker.stats()
+    jobs = job_queue.stats()
+    return [
+        ('spotify_circuit_state', 'gauge', "1 for the Spotify circuit breaker's current state",
+         [({'state': state}, int(breaker['state'] == state)) for state in ('closed', 'half_open', 'open')]),
+        ('spotify_circuit_rejected_total', 'counter', "Calls failed fast by the open circuit",
+         [({}, breaker['rejected'])]),
+        ('spotify_jobs_queued', 'gauge', "Background jobs waiting for a worker", [({}, jobs['queued'])]),
+        ('spotify_jobs_running', 'gauge', "Background jobs running", [({}, jobs['running'])]),
+    ]
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint; values are for this worker process"""
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def profiling_authorised():
+    # Header only: a query-string token would end up in access logs and shared links
+    return is_authorised(request.headers.get(PROFILE_HEADER))
+
+@app.route('/admin/profiles')
+def request_profiles():
+    """Saved request profiles, newest first; needs SPOTIFY_PROFILE_TOKEN in the X-Spotify-Profile header"""
+    if not profiling_authorised():
+        return jsonify({"error": "Not found"}), 404
+    profiles = list_profiles()
+    for profile in profiles:
+        profile['url'] = url_for('request_profile', name=profile['name'])
+    return jsonify({"profiles": profiles, "stats": profiling_stats()})
+
+@app.route('/admin/profiles/<name>')
+def request_profile(name):
+    """One profile as collapsed stacks, for flamegraph.pl or speedscope"""
+    if not profiling_authorised():
+        return jsonify({"error": "Not found"}), 404
+    stacks = read_profile(name)
+    if stacks is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return stacks, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
 @app.route('/debug-user')
 def debug_user():
     """Debug endpoint to check current user"""
@@ -443,7 +827,7 @@ def debug_user():
     
     try:
         sp = get_spotify_client()
-        user_info = sp.me()
+        user_info = get_user_info(sp)
         return jsonify({
             "user_id": user_info.get('id'),
             "display_name": user_info.get('display_name'),
@@ -463,7 +847,7 @@ def server_error(e):
 
 @app.errorhandler(Exception)
 def handle_exception(e):
-    logger.error(f"Unhandled exception: {str(e)}", exc_info=True)
+    logger.error("Unhandled exception: %s", e, exc_info=True)
     return render_template('error.html', error=str(e)), 500
 
 if __name__ == '__main__':
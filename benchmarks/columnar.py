@@ -0,0 +1,90 @@
+"""
+Benchmark: per-user analytics as Python loops vs stacked NumPy columns.
+
+    python benchmarks/columnar.py [--users 5000]
+
+Builds synthetic top-artist lists and recent plays for --users users, then
+computes every user's obscurity score and listening-hour histogram with the
+loop-based functions and with one vectorized pass over stacked columns.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from spotify_analysis import columnar, obscurity_score, track_analysis  # noqa: E402
+from spotify_analysis.metadata import metadata_store  # noqa: E402
+
+
+class FakeUser:
+    """Just enough of a Spotify client for the loop-based analyses"""
+
+    def __init__(self, rng, genres, artists):
+        # Interned like UserSnapshot.store() does, so artists are shared between users
+        self.top_artists = metadata_store.intern_page('top_artists', {'items': [
+            {'id': f'artist{i}', 'name': f'Artist {i}', 'popularity': rng.randint(0, 100),
+             'genres': rng.sample(genres, rng.randint(0, 4)), 'followers': {'total': 1000}}
+            for i in rng.sample(range(20000), 50)
+        ]})
+        self.recent = {'items': [
+            {'played_at': f"2024-03-{rng.randint(10, 28)}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00.000Z",
+             'track': {'artists': [{'name': rng.choice(artists)}]}}
+            for _ in range(50)
+        ]}
+
+    def current_user_top_artists(self, limit=20, time_range='medium_term'):
+        return self.top_artists
+
+    def current_user_recently_played(self, limit=50):
+        return self.recent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    genres = [f'genre {i}' for i in range(3000)]
+    artists = [f'Artist {i}' for i in range(2000)]
+    users = [FakeUser(rng, genres, artists) for _ in range(args.users)]
+
+    # Loop-based reference
+    obscurity_score.HAVE_NUMPY = track_analysis.HAVE_NUMPY = False
+    started = time.perf_counter()
+    expected_scores = [obscurity_score.calculate_obscurity_score(user) for user in users]
+    expected_hours = [track_analysis.analyze_recent_plays(user)['hour_distribution'] for user in users]
+    loop_time = time.perf_counter() - started
+
+    def build():
+        return (columnar.ArtistColumns.from_users(user.top_artists['items'] for user in users),
+                columnar.PlayColumns.from_users(user.recent['items'] for user in users))
+
+    # The first build computes every artist's genre codes; later builds reuse them
+    started = time.perf_counter()
+    build()
+    cold_build_time = time.perf_counter() - started
+    started = time.perf_counter()
+    artist_columns, play_columns = build()
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scores = columnar.obscurity_scores(artist_columns)
+    hours = columnar.hour_histograms(play_columns)
+    vector_time = time.perf_counter() - started
+
+    assert scores.tolist() == expected_scores
+    assert [dict(enumerate(row)) for row in hours.tolist()] == expected_hours
+
+    print(f"{args.users} users")
+    print(f"python loops        {loop_time * 1000:9.1f} ms")
+    print(f"build columns       {cold_build_time * 1000:9.1f} ms cold, {build_time * 1000:.1f} ms warm")
+    print(f"vectorized compute  {vector_time * 1000:9.1f} ms  ({loop_time / vector_time:.0f}x vs loops)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+"""
+Local fake of the Spotify Web API and accounts service, for offline benchmarks.
+
+    python benchmarks/fake_spotify.py [--port 8900] [--latency 0.05] [--jitter 0.02]
+        [--error-rate 0] [--throttle-rate 0] [--fixtures recorded.json]
+
+Point the app at it with
+
+    SPOTIFY_API_URL=http://127.0.0.1:8900/v1/ SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8900
+
+/api/token accepts any authorization code and uses it as the user id, so
+simulated users log in through /callback?code=<user> like real ones. Every
+API response waits --latency seconds plus an exponential tail averaging
+--jitter, and fails with a 503 (--error-rate) or a 429 (--throttle-rate)
+at random. Responses come from --fixtures, a JSON object of recorded
+response bodies keyed by endpoint (e.g. "me/top/artists", "artists/{id}"),
+and are otherwise generated deterministically per user.
+
+Used as a module by benchmarks/load_test.py: FakeSpotify(...).start().
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ARTISTS = 2000
+TRACKS = 20000
+PAGE_LIMIT = 50
+
+WORDS = ['Velvet', 'Neon', 'Paper', 'Silver', 'Midnight', 'Golden', 'Electric', 'Hollow', 'Crystal',
+         'Wild', 'Quiet', 'Broken', 'Lunar', 'Static', 'Northern', 'Glass', 'Young', 'Lost']
+NOUNS = ['Owls', 'Rivers', 'Machines', 'Hearts', 'Tigers', 'Ghosts', 'Lights', 'Waves', 'Kings',
+         'Canyons', 'Satellites', 'Wolves', 'Gardens', 'Signals', 'Parades', 'Echoes']
+GENRES = ['indie pop', 'dance rock', 'synthpop', 'bedroom pop', 'shoegaze', 'art pop', 'modern rock',
+          'chillwave', 'neo soul', 'alt z', 'dream pop', 'indie folk', 'hyperpop', 'post-punk']
+
+TOKEN_PREFIX = 'bench-token-'
+REFRESH_PREFIX = 'bench-refresh-'
+
+# Request path (after /v1/) -> endpoint name used for fixtures and call counts
+ENDPOINTS = [
+    (re.compile(r'^me$'), 'me'),
+    (re.compile(r'^me/top/(artists|tracks)$'), None),
+    (re.compile(r'^me/player/recently-played$'), 'me/player/recently-played'),
+    (re.compile(r'^audio-features$'), 'audio-features'),
+    (re.compile(r'^search$'), 'search'),
+    (re.compile(r'^artists$'), 'artists'),
+    (re.compile(r'^artists/[^/]+/top-tracks$'), 'artists/{id}/top-tracks'),
+    (re.compile(r'^artists/[^/]+/albums$'), 'artists/{id}/albums'),
+    (re.compile(r'^artists/[^/]+$'), 'artists/{id}'),
+]
+
+
+def endpoint_name(path):
+    for pattern, name in ENDPOINTS:
+        if pattern.match(path):
+            return name or path
+    return None
+
+
+def artist_name(i):
+    return f"The {WORDS[i % len(WORDS)]} {NOUNS[(i // len(WORDS)) % len(NOUNS)]} {i // (len(WORDS) * len(NOUNS)) or ''}".strip()
+
+
+def artist(i):
+    rng = random.Random(f"artist:{i}")
+    return {
+        'id': f'a{i}',
+        'name': artist_name(i),
+        'type': 'artist',
+        'uri': f'spotify:artist:a{i}',
+        'genres': rng.sample(GENRES, rng.randint(0, 3)),
+        'popularity': rng.randint(5, 95),
+        'followers': {'href': None, 'total': rng.randint(100, 5000000)},
+        'images': [{'url': f'https://i.scdn.co/image/a{i}', 'height': 640, 'width': 640}],
+        'external_urls': {'spotify': f'https://open.spotify.com/artist/a{i}'},
+    }
+
+
+def track(i):
+    rng = random.Random(f"track:{i}")
+    artist_id = i % ARTISTS
+    return {
+        'id': f't{i}',
+        'name': f"{WORDS[rng.randrange(len(WORDS))]} {NOUNS[rng.randrange(len(NOUNS))]}",
+        'type': 'track',
+        'uri': f'spotify:track:t{i}',
+        'artists': [{'id': f'a{artist_id}', 'name': artist_name(artist_id), 'type': 'artist'}],
+        'album': {'id': f'al{i // 10}', 'name': f"Album {i // 10}",
+                  'images': [{'url': f'https://i.scdn.co/image/al{i // 10}', 'height': 640, 'width': 640}]},
+        'popularity': rng.randint(0, 100),
+        'duration_ms': rng.randint(120000, 360000),
+        'external_urls': {'spotify': f'https://open.spotify.com/track/t{i}'},
+    }
+
+
+def audio_features(track_id):
+    rng = random.Random(f"features:{track_id}")
+    return {
+        'id': track_id,
+        'danceability': round(rng.random(), 3),
+        'energy': round(rng.random(), 3),
+        'valence': round(rng.random(), 3),
+        'acousticness': round(rng.random(), 3),
+        'instrumentalness': round(rng.random() ** 3, 3),
+        'tempo': round(rng.uniform(70, 180), 3),
+    }
+
+
+def paging(items, limit, offset, total):
+    return {'items': items, 'limit': limit, 'offset': offset, 'total': total, 'next': None, 'previous': None}
+
+
+def top_items(user, kind, time_range, limit, offset):
+    rng = random.Random(f"{user}:{kind}:{time_range}")
+    ids = rng.sample(range(ARTISTS if kind == 'artists' else TRACKS), PAGE_LIMIT)[offset:offset + limit]
+    return paging([artist(i) if kind == 'artists' else track(i) for i in ids], limit, offset, PAGE_LIMIT)
+
+
+def recently_played(user, limit, after):
+    # One play every 20 minutes up to now, so `after` cursors see new plays over time
+    now_ms = int(time.time() * 1000)
+    latest = now_ms - now_ms % (20 * 60 * 1000)
+    times = []
+    for n in range(limit):
+        played_at = latest - n * 20 * 60 * 1000
+        if after is not None and played_at <= int(after):
+            break
+        times.append(played_at)
+    plays = [{'track': track(random.Random(f"{user}:play:{played_at}").randrange(TRACKS)),
+              'played_at': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(played_at / 1000)),
+              'context': None} for played_at in times]
+    cursors = {'after': str(times[0]), 'before': str(times[-1])} if times else None
+    return {'items': plays, 'limit': limit, 'cursors': cursors, 'next': None}
+
+
+def search(query, limit, offset):
+    words = query.casefold().split()
+    matches = [i for i in range(ARTISTS) if all(word in artist_name(i).casefold() for word in words)]
+    return {'artists': paging([artist(i) for i in matches[offset:offset + limit]], limit, offset, len(matches))}
+
+
+def artist_number(artist_id):
+    digits = artist_id.lstrip('a')
+    return int(digits) % ARTISTS if digits.isdigit() else None
+
+
+class FakeSpotify:
+    """
+    The fake API server: synthetic or recorded responses with injected latency and errors.
+
+    calls counts upstream requests by endpoint name; snapshot it before and
+    after a run to see how many calls the run made.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, fixtures=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.fixtures = fixtures or {}
+        self.calls = Counter()
+        self.last_call = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-spotify', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def call_counts(self):
+        with self._lock:
+            return Counter(self.calls)
+
+    def wait_idle(self, quiet=0.5, timeout=15):
+        """Wait until no request has arrived for `quiet` seconds (e.g. background jobs have settled)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                idle = time.monotonic() - self.last_call
+            if idle >= quiet:
+                return True
+            time.sleep(quiet - idle)
+        return False
+
+    def _record(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            self.last_call = time.monotonic()
+            delay = self.latency + (self._random.expovariate(1 / self.jitter) if self.jitter else 0)
+            roll = self._random.random()
+        return delay, roll
+
+    def respond(self, path, query, user):
+        """(status, body, headers) for an API request"""
+        name = endpoint_name(path)
+        if name is None:
+            return 404, {'error': {'status': 404, 'message': 'Service not found'}}, {}
+        delay, roll = self._record(name)
+        time.sleep(delay)
+        if roll < self.error_rate:
+            return 503, {'error': {'status': 503, 'message': 'Service unavailable'}}, {}
+        if roll < self.error_rate + self.throttle_rate:
+            return 429, {'error': {'status': 429, 'message': 'API rate limit exceeded'}}, {'Retry-After': '1'}
+        if name in self.fixtures:
+            return 200, self.fixtures[name], {}
+        return 200, self._synthetic(path, name, query, user), {}
+
+    def _synthetic(self, path, name, query, user):
+        limit = int(query.get('limit', 20))
+        offset = int(query.get('offset', 0))
+        if name == 'me':
+            return {'id': user, 'display_name': f"Bench {user}", 'email': f"{user}@example.com",
+                    'country': 'US', 'product': 'premium', 'type': 'user'}
+        if name in ('me/top/artists', 'me/top/tracks'):
+            return top_items(user, name.rsplit('/', 1)[1], query.get('time_range', 'medium_term'), limit, offset)
+        if name == 'me/player/recently-played':
+            return recently_played(user, limit, query.get('after'))
+        if name == 'audio-features':
+            return {'audio_features': [audio_features(track_id) for track_id in query.get('ids', '').split(',')]}
+        if name == 'search':
+            return search(query.get('q', ''), limit, offset)
+        if name == 'artists':
+            numbers = [artist_number(artist_id) for artist_id in query.get('ids', '').split(',')]
+            return {'artists': [artist(i) if i is not None else None for i in numbers]}
+        number = artist_number(path.split('/')[1])
+        if name == 'artists/{id}/top-tracks':
+            return {'tracks': [track(number + ARTISTS * n) for n in range(10)] if number is not None else []}
+        if name == 'artists/{id}/albums':
+            albums = [{'id': f'al{number}-{n}', 'name': f"Album {n + 1}", 'album_type': 'album',
+                       'release_date': f"{2010 + n}-01-01", 'images': []} for n in range(limit)]
+            return paging(albums, limit, offset, limit)
+        return artist(number) if number is not None else None
+
+    def token(self, form):
+        """Token endpoint: authorization codes and refresh tokens for simulated users, and app tokens"""
+        self._record('token')
+        if form.get('grant_type') == 'refresh_token':
+            user = form.get('refresh_token', '')[len(REFRESH_PREFIX):]
+        elif form.get('grant_type') == 'client_credentials':
+            user = 'app'
+        else:
+            user = form.get('code', '')
+        if not user:
+            return 400, {'error': 'invalid_grant'}, {}
+        return 200, {
+            'access_token': TOKEN_PREFIX + user,
+            'token_type': 'Bearer',
+            'expires_in': 3600,
+            'refresh_token': REFRESH_PREFIX + user,
+            'scope': form.get('scope', ''),
+        }, {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.startswith('/v1/'):
+            return self._send(404, {'error': {'status': 404, 'message': 'Not found'}}, {})
+        auth = self.headers.get('Authorization', '')
+        if not auth.startswith('Bearer ' + TOKEN_PREFIX):
+            return self._send(401, {'error': {'status': 401, 'message': 'Invalid access token'}}, {})
+        user = auth[len('Bearer ' + TOKEN_PREFIX):]
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self._send(*self.server.fake.respond(url.path[len('/v1/'):].strip('/'), query, user))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        if urlparse(self.path).path != '/api/token':
+            return self._send(404, {'error': 'not_found'}, {})
+        self._send(*self.server.fake.token(form))
+
+    def _send(self, status, body, headers):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def load_fixtures(path):
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every API response")
+    parser.add_argument('--jitter', type=float, default=0.02, help="mean of the extra exponential delay")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of API calls answered 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of API calls answered 429")
+    parser.add_argument('--fixtures', help="JSON file of recorded responses keyed by endpoint")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeSpotify(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                       args.throttle_rate, load_fixtures(args.fixtures), args.seed)
+    print(f"Fake Spotify on {fake.url}: SPOTIFY_API_URL={fake.url}/v1/ SPOTIFY_ACCOUNTS_URL={fake.url}")
+    fake.start()
+    try:
+        while True:
+            time.sleep(10)
+    except KeyboardInterrupt:
+        print(json.dumps(fake.call_counts(), indent=2, sort_keys=True), file=sys.stderr)
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
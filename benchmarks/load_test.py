@@ -0,0 +1,340 @@
+"""
+Benchmark: the app's pages and APIs under load, against a local fake Spotify API.
+
+    python benchmarks/load_test.py [--users 50] [--requests 200] [--concurrency 10]
+        [--latency 0.05] [--error-rate 0] [--env SPOTIFY_PROGRESSIVE_PAGES=1]
+        [--save results.json] [--baseline baseline.json]
+
+Starts benchmarks/fake_spotify.py in this process and the app in a
+subprocess pointed at it: gunicorn with the Procfile's worker settings if
+it is installed, otherwise Flask's threaded development server. --users
+simulated users log in through /callback, then each route is driven in
+turn with --requests requests spread over the users, --concurrency at a
+time.
+
+For each route the report shows latency percentiles, throughput, errors
+and the upstream Spotify calls made per request (counted by the fake
+server, after background jobs settle), plus the app's peak RSS. --save
+writes the results as JSON. --baseline compares against a saved run and
+exits 1 if anything got worse by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.fake_spotify import FakeSpotify, load_fixtures, WORDS, NOUNS, ARTISTS  # noqa: E402
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ROUTES = ['/dashboard', '/basics', '/music_dna', '/api/search-artist', '/api/artist/<id>']
+
+# Metrics compared against a baseline: name -> True if higher is worse
+COMPARED = {'p50': True, 'p95': True, 'p99': True, 'throughput': False, 'upstream_per_request': True}
+# Latency changes smaller than this (seconds) are noise, whatever the ratio
+LATENCY_FLOOR = 0.005
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_app(args, fake, port, workdir):
+    """Run the app in a subprocess configured for the fake API; returns the Popen"""
+    env = dict(os.environ)
+    env.update({
+        'SPOTIFY_API_URL': f"{fake.url}/v1/",
+        'SPOTIFY_ACCOUNTS_URL': fake.url,
+        'SPOTIFY_CLIENT_ID': 'bench-client',
+        'SPOTIFY_CLIENT_SECRET': 'bench-secret',
+        'SPOTIFY_REDIRECT_URI': f"http://127.0.0.1:{port}/callback",
+        'SECRET_KEY': 'bench-secret-key',
+        'LISTENING_HISTORY_DB': os.path.join(workdir, 'history.sqlite3'),
+        'PLAY_STORE_DIR': os.path.join(workdir, 'plays'),
+        'AUDIO_FEATURES_DB': os.path.join(workdir, 'features.sqlite3'),
+        'SPOTIFY_REFRESH_LOCK_DIR': workdir,
+        'PYTHONPATH': os.path.abspath(REPO_ROOT),
+    })
+    env.update(dict(item.split('=', 1) for item in args.env))
+
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f"127.0.0.1:{port}",
+                   '--workers', str(args.workers), '--threads', str(args.threads)] + args.gunicorn_args
+    else:
+        command = [sys.executable, '-c',
+                   f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    # Run from the scratch directory so files the app writes to its cwd stay out of the repo
+    log = open(os.path.join(workdir, 'app.log'), 'w')
+    return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_up(base, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with status {process.returncode} before serving requests")
+        try:
+            if requests.get(f"{base}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App not answering on {base} after {timeout}s")
+
+
+def process_tree(pid):
+    """pid and its descendants (e.g. gunicorn workers), from /proc"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; the fields after it don't
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids = [pid]
+    for parent in pids:
+        pids.extend(children.get(parent, []))
+    return pids
+
+
+def peak_rss_mb(pid):
+    """Largest peak resident set size (VmHWM) among the app's processes, or None off Linux"""
+    if not os.path.isdir('/proc'):
+        return None
+    peaks = []
+    for process in process_tree(pid):
+        try:
+            with open(f'/proc/{process}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peaks.append(int(line.split()[1]) / 1024)
+        except OSError:
+            continue
+    return round(max(peaks), 1) if peaks else None
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoadGenerator:
+    """Simulated users, each with its own session cookie, sharing a pool of keep-alive connections"""
+
+    def __init__(self, base, concurrency, seed):
+        self.base = base
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        self.users = []
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _request(self, path, cookies):
+        session = self._session()
+        started = time.perf_counter()
+        try:
+            response = session.get(self.base + path, cookies=cookies, allow_redirects=False, timeout=60)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, None
+        elapsed = time.perf_counter() - started
+        # Keep each user's cookies their own
+        session.cookies.clear()
+        return elapsed, status, response
+
+    def run(self, requests_list):
+        """Issue (path, cookies) requests; returns (latencies, statuses, responses, wall seconds)"""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            results = list(executor.map(lambda item: self._request(*item), requests_list))
+        wall = time.perf_counter() - started
+        return [r[0] for r in results], [r[1] for r in results], [r[2] for r in results], wall
+
+    def login(self, count):
+        """Log count users in through /callback; returns the login requests' results"""
+        codes = [f"bench-user-{i}" for i in range(count)]
+        results = self.run([(f"/callback?code={code}", None) for code in codes])
+        self.users = [dict(response.cookies) for response in results[2] if response is not None and response.cookies]
+        return results
+
+    def route_requests(self, route, count):
+        """count request paths for a route, round-robin over the users"""
+        paths = []
+        for n in range(count):
+            if route == '/api/search-artist':
+                path = f"/api/search-artist?query={self.random.choice(WORDS)}+{self.random.choice(NOUNS)}"
+            elif route == '/api/artist/<id>':
+                path = f"/api/artist/a{self.random.randrange(ARTISTS)}"
+            else:
+                path = route
+            paths.append((path, self.users[n % len(self.users)]))
+        return paths
+
+
+def summarize(latencies, statuses, wall, upstream):
+    ordered = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': sum(1 for status in statuses if status is None or status >= 400),
+        'p50': round(percentile(ordered, 0.50), 4),
+        'p95': round(percentile(ordered, 0.95), 4),
+        'p99': round(percentile(ordered, 0.99), 4),
+        'mean': round(sum(ordered) / count, 4),
+        'throughput': round(count / wall, 2),
+        'upstream_per_request': round(sum(upstream.values()) / count, 2),
+        'upstream_endpoints': dict(sorted(upstream.items())),
+    }
+
+
+def print_report(results):
+    print(f"{'route':<22}{'reqs':>6}{'errs':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'upstream/req':>14}")
+    for route, stats in results['routes'].items():
+        print(f"{route:<22}{stats['requests']:>6}{stats['errors']:>6}{stats['p50'] * 1000:>9.1f}"
+              f"{stats['p95'] * 1000:>9.1f}{stats['p99'] * 1000:>9.1f}{stats['throughput']:>9.1f}"
+              f"{stats['upstream_per_request']:>14.2f}")
+    print(f"\npeak RSS: {results['peak_rss_mb']} MiB")
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a baseline run; returns the list of regressions"""
+    regressions = []
+    if baseline.get('settings') != results['settings']:
+        print("\nwarning: baseline was run with different settings:", baseline.get('settings'))
+    print(f"\n{'vs baseline':<22}{'metric':<22}{'baseline':>12}{'now':>12}{'change':>9}")
+    for route, stats in results['routes'].items():
+        before = baseline.get('routes', {}).get(route)
+        if before is None:
+            continue
+        for metric, higher_is_worse in COMPARED.items():
+            old, new = before.get(metric), stats.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else float('inf'))
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            if metric in ('p50', 'p95', 'p99') and abs(new - old) < LATENCY_FLOOR:
+                worse = False
+            if worse:
+                regressions.append(f"{route} {metric}")
+            print(f"{route:<22}{metric:<22}{old:>12}{new:>12}{change:>+9.0%}{'  REGRESSION' if worse else ''}")
+    old, new = baseline.get('peak_rss_mb'), results['peak_rss_mb']
+    if old and new:
+        change = (new - old) / old
+        worse = change > tolerance
+        if worse:
+            regressions.append('peak_rss_mb')
+        print(f"{'app':<22}{'peak_rss_mb':<22}{old:>12}{new:>12}{change:>+9.0%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    try:
+        import gunicorn  # noqa: F401
+        default_server = 'gunicorn'
+    except ImportError:
+        default_server = 'flask'
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help="requests per route")
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--routes', nargs='+', default=ROUTES, choices=ROUTES)
+    parser.add_argument('--latency', type=float, default=0.05, help="fake Spotify latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="mean extra exponential latency")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--fixtures', help="JSON file of recorded Spotify responses keyed by endpoint")
+    parser.add_argument('--server', choices=['gunicorn', 'flask'], default=default_server)
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn workers (as in the Procfile)")
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per worker (as in the Procfile)")
+    parser.add_argument('--gunicorn-args', nargs='*', default=[], help="extra gunicorn arguments")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="extra environment for the app, e.g. SPOTIFY_PROGRESSIVE_PAGES=1")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against results saved with --save")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument('--keep-log', action='store_true', help="print the app's log path and keep it")
+    args = parser.parse_args()
+
+    fake = FakeSpotify(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       throttle_rate=args.throttle_rate, fixtures=load_fixtures(args.fixtures),
+                       seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix='spotify-bench-')
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    process = start_app(args, fake, port, workdir)
+    try:
+        wait_until_up(base, process)
+        generator = LoadGenerator(base, args.concurrency, args.seed)
+        results = {
+            'settings': {key: getattr(args, key) for key in
+                         ('users', 'requests', 'concurrency', 'latency', 'jitter', 'error_rate',
+                          'throttle_rate', 'server', 'workers', 'threads', 'env')},
+            'routes': {},
+        }
+        print(f"{args.users} users, {args.requests} requests per route, concurrency {args.concurrency}, "
+              f"Spotify latency {args.latency * 1000:.0f} ms on {args.server}\n")
+
+        phases = [('/callback', lambda: generator.login(args.users))]
+        phases += [(route, lambda route=route: generator.run(generator.route_requests(route, args.requests)))
+                   for route in args.routes]
+        for route, phase in phases:
+            before = fake.call_counts()
+            latencies, statuses, _, wall = phase()
+            if route == '/callback' and not generator.users:
+                raise RuntimeError(f"No user could log in; see {workdir}/app.log")
+            # Background work started by the phase (warm-ups, revalidation) counts towards it
+            fake.wait_idle()
+            results['routes'][route] = summarize(latencies, statuses, wall, fake.call_counts() - before)
+
+        results['peak_rss_mb'] = peak_rss_mb(process.pid)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        fake.stop()
+        if args.keep_log:
+            print(f"app log: {workdir}/app.log")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
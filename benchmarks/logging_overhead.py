@@ -0,0 +1,147 @@
+"""
+Benchmark: request throughput with today's synchronous logging vs the queued logger.
+
+    python benchmarks/logging_overhead.py [--requests 2000] [--concurrency 8]
+        [--write-latency 0.0002] [--routes / /dashboard /login]
+
+Each variant runs in its own process: the app is imported with stdout
+replaced by a sink whose writes take --write-latency seconds (a log pipe
+under backpressure; 0 for a fast disk), then --concurrency threads drive
+the routes through Flask's test client. No Spotify calls are made, so the
+numbers isolate the cost of logging on the request path.
+
+    sync        how the Procfile ran before: every record formatted and
+                written on the request thread at DEBUG level, no rate limit
+    queue       records written by a background thread, chatter unlimited
+    queue+rate  the default: queued, with per-request chatter rate limited
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+UNLIMITED = str(10 ** 9)
+VARIANTS = {
+    'sync': {'SPOTIFY_LOG_QUEUE': '0', 'LOG_LEVEL': 'DEBUG', 'SPOTIFY_LOG_CHATTER_LIMIT': UNLIMITED},
+    'queue': {'SPOTIFY_LOG_QUEUE': '1', 'LOG_LEVEL': 'INFO', 'SPOTIFY_LOG_CHATTER_LIMIT': UNLIMITED},
+    'queue+rate': {'SPOTIFY_LOG_QUEUE': '1', 'LOG_LEVEL': 'INFO'},
+}
+
+
+class SlowSink:
+    """Write-only stream where every write blocks for `latency` seconds"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lines = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:  # One writer at a time, like a pipe
+            if self.latency:
+                time.sleep(self.latency)
+            self.lines += text.count('\n')
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def run_variant(args):
+    """Runs in the child process; prints one JSON result line"""
+    real_stdout = sys.stdout
+    sink = sys.stdout = SlowSink(args.write_latency)
+
+    import app as app_module
+    from spotify_analysis.logs import stop_logging, logging_stats
+
+    per_thread = args.requests // args.concurrency
+    latencies = []
+    lock = threading.Lock()
+
+    def drive(offset):
+        client = app_module.app.test_client()
+        mine = []
+        for i in range(per_thread):
+            path = args.routes[(offset + i) % len(args.routes)]
+            started = time.perf_counter()
+            client.get(path)
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=drive, args=(n,)) for n in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = logging_stats()
+    drain_started = time.perf_counter()
+    stop_logging()
+    drain = time.perf_counter() - drain_started
+
+    real_stdout.write(json.dumps({
+        'requests': len(latencies),
+        'req_per_s': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'lines': sink.lines,
+        'dropped': stats['dropped'],
+        'suppressed': stats['chatter_suppressed'],
+        'drain_s': drain,
+    }) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--write-latency', type=float, default=0.0002,
+                        help="seconds each write to stdout blocks")
+    parser.add_argument('--routes', nargs='+', default=['/', '/dashboard', '/login'])
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--variant', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        return run_variant(args)
+
+    print(f"{args.requests} requests over {args.routes}, concurrency {args.concurrency}, "
+          f"{args.write_latency * 1e6:.0f} us per log write")
+    print(f"\n{'variant':<12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'lines':>7} "
+          f"{'suppressed':>10} {'dropped':>7} {'drain s':>8}")
+    baseline = None
+    for name in args.variants:
+        env = dict(os.environ, SECRET_KEY='bench', SPOTIFY_CLIENT_ID='bench',
+                   SPOTIFY_CLIENT_SECRET='bench', SPOTIFY_REDIRECT_URI='http://127.0.0.1/callback',
+                   SPOTIFY_PROFILE_RATE='0', **VARIANTS[name])
+        command = [sys.executable, os.path.abspath(__file__), '--variant', name,
+                   '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+                   '--write-latency', str(args.write_latency), '--routes'] + args.routes
+        # From a scratch directory so spotipy's token cache file stays out of the repo
+        output = subprocess.run(command, env=env, cwd=tempfile.mkdtemp(), check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        baseline = baseline or result['req_per_s']
+        print(f"{name:<12} {result['req_per_s']:8.0f} {result['p50_ms']:8.2f} {result['p99_ms']:8.2f} "
+              f"{result['lines']:7d} {result['suppressed']:10d} {result['dropped']:7d} "
+              f"{result['drain_s']:8.2f}  {result['req_per_s'] / baseline:4.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark: genre -> mood scoring, nested keyword loops vs MoodClassifier.
+
+    python benchmarks/mood_classifier.py [--genres 20000] [--users 200]
+
+Simulates --users users whose top artists draw on a pool of --genres distinct
+genres, and times scoring every user's genre counts with the old per-keyword
+loops, with a cold classifier (first sight of every genre) and with a warm one.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from spotify_analysis.mood_classifier import MoodClassifier, DEFAULT_MOOD_KEYWORDS  # noqa: E402
+
+WORDS = ['pop', 'indie', 'dance', 'rock', 'metal', 'death', 'punk', 'hardcore', 'soul', 'blues',
+         'emo', 'chill', 'ambient', 'lofi', 'acoustic', 'jazz', 'trap', 'house', 'techno', 'folk',
+         'country', 'rap', 'hip hop', 'edm', 'sad', 'happy', 'r&b', 'drill', 'grunge', 'shoegaze']
+PLACES = ['uk', 'german', 'brazilian', 'k', 'j', 'latin', 'nordic', 'australian', 'canadian', 'french']
+
+
+def legacy_scores(genres):
+    """The keyword loops analyze_mood_from_genres used before MoodClassifier"""
+    mood_scores = {mood: 0 for mood in DEFAULT_MOOD_KEYWORDS}
+    for genre, count in genres.items():
+        for mood, keywords in DEFAULT_MOOD_KEYWORDS.items():
+            for keyword in keywords:
+                if keyword in genre.lower():
+                    mood_scores[mood] += count
+    return mood_scores
+
+
+def make_genres(n, rng):
+    genres = set()
+    while len(genres) < n:
+        words = rng.sample(WORDS, rng.randint(1, 3))
+        genres.add(' '.join([rng.choice(PLACES)] + words + [str(rng.randint(0, 99))]))
+    return sorted(genres)
+
+
+def timed(fn, workload, repeat, setup=None):
+    """Best time of `repeat` runs of fn over the workload, and the last run's results"""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            fn = setup()
+        started = time.perf_counter()
+        results = [fn(genres) for genres in workload]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--genres', type=int, default=20000, help="distinct genres in the pool")
+    parser.add_argument('--users', type=int, default=200, help="users to score")
+    parser.add_argument('--per-user', type=int, default=150, help="genre occurrences per user")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per variant; the best is reported")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    pool = make_genres(args.genres, rng)
+    # Every genre is seen at least once, then users overlap on a popular head
+    workload = [{genre: 1 for genre in pool[i:i + 100]} for i in range(0, len(pool), 100)]
+    for _ in range(args.users):
+        counts = {}
+        for _ in range(args.per_user):
+            genre = pool[min(int(rng.paretovariate(1.2)) - 1, len(pool) - 1)]
+            counts[genre] = counts.get(genre, 0) + 1
+        workload.append(counts)
+
+    legacy_time, expected = timed(legacy_scores, workload, args.repeat)
+    cold_time, cold = timed(None, workload, args.repeat, setup=lambda: MoodClassifier().score)
+    classifier = MoodClassifier()
+    warm_time, warm = timed(classifier.score, workload, args.repeat + 1)
+    assert cold == expected and warm == expected, "classifier scores differ from the keyword loops"
+
+    lookups = sum(len(genres) for genres in workload)
+    print(f"{len(pool)} distinct genres, {len(workload)} score calls, {lookups} genre lookups")
+    for name, elapsed in (('keyword loops', legacy_time), ('classifier (cold)', cold_time),
+                          ('classifier (warm)', warm_time)):
+        print(f"{name:<20} {elapsed * 1000:9.1f} ms  {elapsed / lookups * 1e6:6.2f} us/genre  "
+              f"{legacy_time / elapsed:5.1f}x")
+    print(f"cache: {classifier.stats()}")
+
+
+if __name__ == '__main__':
+    main()
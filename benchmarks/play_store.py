@@ -0,0 +1,112 @@
+"""
+Benchmark: date-range queries over a long play history, row-oriented vs the columnar play store.
+
+    python benchmarks/play_store.py [--plays 1000000]
+
+Builds one user's history of --plays plays over three years and answers
+"listening hours for the last year" and "top artists of the last 90 days"
+three ways: loading a JSON file of play rows, scanning the SQLite listening
+history, and slicing the memory-mapped play store by its time index.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from spotify_analysis.history import ListeningHistory  # noqa: E402
+from spotify_analysis.play_store import PlayStore  # noqa: E402
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def summarize(rows, top=5):
+    """The loop analyze_play_history() falls back to, over (played_at, track_id, artist) rows"""
+    hour_distribution = {i: 0 for i in range(24)}
+    artist_frequency = {}
+    for played_at, track_id, artist in rows:
+        hour_distribution[(played_at // 3600000) % 24] += 1
+        artist_frequency[artist] = artist_frequency.get(artist, 0) + 1
+    return {
+        'hour_distribution': hour_distribution,
+        'peak_listening_hour': max(hour_distribution.items(), key=lambda x: x[1])[0] if rows else None,
+        'top_recent_artists': sorted(artist_frequency.items(), key=lambda x: x[1], reverse=True)[:top],
+        'total_plays': len(rows)
+    }
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--plays', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    artists = [f'Artist {i}' for i in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(artists))]
+    end = 1735689600000  # 2025-01-01
+    start = end - 3 * 365 * DAY_MS
+    played_at = sorted(rng.sample(range(start, end, 1000), args.plays))
+    rows = [(ms, f'track{rng.randrange(50000)}', artist)
+            for ms, artist in zip(played_at, rng.choices(artists, weights, k=args.plays))]
+    queries = {
+        'hours, last year': (end - 365 * DAY_MS, end),
+        'artists, last 90 days': (end - 90 * DAY_MS, end),
+    }
+
+    workdir = tempfile.mkdtemp()
+    try:
+        json_path = os.path.join(workdir, 'plays.json')
+        with open(json_path, 'w') as f:
+            json.dump(rows, f)
+
+        history = ListeningHistory(os.path.join(workdir, 'history.sqlite3'))
+        conn = history._connect()
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO plays (user_id, played_at, track_id, artist) VALUES ('me', ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+
+        store_dir = os.path.join(workdir, 'store')
+        _, append_time = timed(lambda: PlayStore(store_dir).append('me', *zip(*rows)))
+        size = sum(os.path.getsize(os.path.join(dirpath, name))
+                   for dirpath, _, names in os.walk(store_dir) for name in names)
+        print(f"{args.plays} plays: JSON {os.path.getsize(json_path) / 2 ** 20:.0f} MiB, "
+              f"play store {size / 2 ** 20:.0f} MiB (appended in {append_time:.1f} s)\n")
+
+        store = PlayStore(store_dir)
+        store.open('me')
+        for label, (lo, hi) in queries.items():
+            def from_json():
+                with open(json_path) as f:
+                    return summarize([row for row in json.load(f) if lo <= row[0] < hi])
+
+            expected, json_time = timed(from_json)
+            from_sqlite, sqlite_time = timed(lambda: summarize(history.plays('me', after=lo - 1, before=hi)))
+            # A new store reopens the memory maps, like a worker's first query
+            cold, cold_time = timed(lambda: PlayStore(store_dir).plays('me', lo, hi).summary())
+            warm, warm_time = timed(lambda: store.plays('me', lo, hi).summary())
+            assert [json.loads(json.dumps(result)) for result in (from_sqlite, cold, warm)] == \
+                [json.loads(json.dumps(expected))] * 3
+
+            print(f"{label} ({expected['total_plays']} plays)")
+            print(f"  json rows      {json_time * 1000:9.1f} ms")
+            print(f"  sqlite rows    {sqlite_time * 1000:9.1f} ms")
+            print(f"  play store     {cold_time * 1000:9.1f} ms cold, {warm_time * 1000:.1f} ms warm "
+                  f"({json_time / warm_time:.0f}x vs json)")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
 from .track_analysis import get_top_tracks, analyze_recent_plays
 from .artist_analysis import get_top_artists, analyze_genre_distribution
-from .mood_analysis import analyze_music_mood
\ No newline at end of file
+from .mood_analysis import analyze_music_mood
+from .snapshot import UserSnapshot
\ No newline at end of file
@@ -1,21 +1,36 @@
+from .metadata import metadata_store
+from .columnar import HAVE_NUMPY, ArtistColumns, genre_distribution
+from .metrics import traced
+
+@traced
 def get_top_artists(spotify_client, time_range='medium_term', limit=20):
     results = spotify_client.current_user_top_artists(time_range=time_range, limit=limit)
     artists = []
     
     for i, item in enumerate(results['items']):
+        # Display strings are computed once per artist and shared by every user
+        display = metadata_store.derived('artist', item, 'display', artist_display)
         artist = {
             'name': item['name'],
             'rank': i + 1,
-            'genres': ', '.join(item['genres'][:3]) if item['genres'] else 'No genres available',
+            'genres': display['genres'],
             'popularity': item['popularity'],
-            'followers': format_number(item['followers']['total']),
+            'followers': display['followers'],
             'id': item['id']
         }
         artists.append(artist)
     
     return artists
 
+def artist_display(item):
+    """Top-3 genre string and formatted follower count for an artist"""
+    return {
+        'genres': ', '.join(item['genres'][:3]) if item['genres'] else 'No genres available',
+        'followers': format_number(item['followers']['total'])
+    }
+
 # Look for this function and update it:
+@traced
 def analyze_genre_distribution(sp):
     """Analyze the distribution of genres in a user's top artists"""
     # ISSUE: artists_data is being treated as an iterable, but it's the Spotify client
@@ -27,6 +42,13 @@ def analyze_genre_distribution(sp):
     # Get the user's top artists from different time ranges
     time_ranges = ['short_term', 'medium_term', 'long_term']
     
+    if HAVE_NUMPY:
+        # Vectorized path over genre-id codes; same results as the loop below
+        items = []
+        for time_range in time_ranges:
+            items += sp.current_user_top_artists(time_range=time_range, limit=50)['items']
+        return genre_distribution(ArtistColumns.from_items(items))
+    
     for time_range in time_ranges:
         # Correctly get artists data from the Spotify client
         results = sp.current_user_top_artists(time_range=time_range, limit=50)
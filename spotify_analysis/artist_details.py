@@ -0,0 +1,76 @@
+import os
+
+from .cache import TTLCache
+from .fanout import run_concurrently
+from .search import artist_index
+from .metrics import traced
+
+ARTIST_CACHE_TTL = int(os.environ.get('SPOTIFY_ARTIST_CACHE_TTL', 6 * 3600))
+ARTIST_CACHE_MAX_BYTES = int(os.environ.get('SPOTIFY_ARTIST_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Spotify's multi-artist endpoint accepts at most 50 ids
+MAX_BATCH = 50
+
+# Artist pages are catalog data, identical for every user
+artist_cache = TTLCache(max_bytes=ARTIST_CACHE_MAX_BYTES, default_ttl=ARTIST_CACHE_TTL)
+
+
+@traced
+def get_artists_details(spotify_client, artist_ids):
+    """
+    Artist metadata, top tracks and albums for up to 50 artists.
+
+    Cached artists are served from the shared cache. For the rest, metadata
+    comes from one multi-artist call, and the top-tracks and album calls are
+    fanned out concurrently.
+
+    Returns:
+        (details, errors): details maps artist id -> {"artist", "top_tracks", "albums"};
+        errors maps artist id -> message for artists that could not be loaded
+    """
+    artist_ids = list(dict.fromkeys(artist_ids))[:MAX_BATCH]
+    details = {}
+    missing = []
+    for artist_id in artist_ids:
+        cached = artist_cache.get(artist_id)
+        if cached is None:
+            missing.append(artist_id)
+        else:
+            details[artist_id] = cached
+    if not missing:
+        return details, {}
+
+    artists = spotify_client.artists(missing)['artists']
+
+    tasks = {}
+    for artist_id in missing:
+        tasks[(artist_id, 'top_tracks')] = lambda artist_id=artist_id: spotify_client.artist_top_tracks(artist_id)
+        tasks[(artist_id, 'albums')] = lambda artist_id=artist_id: spotify_client.artist_albums(
+            artist_id, album_type='album', limit=5)
+    results, failures = run_concurrently(tasks)
+
+    return _assemble(missing, artists, results, failures, details)
+
+
+def _assemble(missing, artists, results, failures, details):
+    """Combine per-artist responses, caching only artists that loaded completely"""
+    errors = {}
+    for artist_id, artist in zip(missing, artists):
+        if artist is None:
+            errors[artist_id] = "Artist not found"
+            continue
+        failed = [str(failures[key]) for key in ((artist_id, 'top_tracks'), (artist_id, 'albums'))
+                  if key in failures]
+        if failed:
+            errors[artist_id] = '; '.join(failed)
+            continue
+
+        entry = {
+            "artist": artist,
+            "top_tracks": results[(artist_id, 'top_tracks')],
+            "albums": results[(artist_id, 'albums')]
+        }
+        artist_cache.set(artist_id, entry)
+        artist_index.add(artist)
+        details[artist_id] = entry
+    return details, errors
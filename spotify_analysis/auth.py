@@ -1,12 +1,33 @@
 import os
 import spotipy
+from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.cache_handler import MemoryCacheHandler
 from flask import session, current_app
 from functools import wraps
 
+from .client import SpotifyClient
+from .transport import ACCOUNTS_URL
+
 def get_spotify_client():
     """Get an authenticated Spotify client from current user's session token"""
     if 'token_info' not in session:
         return None
         
     token_info = session.get('token_info')
-    return spotipy.Spotify(auth=token_info['access_token'])
\ No newline at end of file
+    return spotipy.Spotify(auth=token_info['access_token'])
+
+def get_cli_client():
+    """
+    Spotify client for command-line use, authorised as the app (client credentials).
+
+    Needs SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET. It can look up the
+    catalogue (e.g. artist search) but has no access to a user's data.
+    """
+    client_id = os.environ.get('SPOTIFY_CLIENT_ID')
+    client_secret = os.environ.get('SPOTIFY_CLIENT_SECRET')
+    if not client_id or not client_secret:
+        raise RuntimeError("Set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET to look up artists on Spotify")
+    credentials = SpotifyClientCredentials(client_id=client_id, client_secret=client_secret,
+                                           cache_handler=MemoryCacheHandler())
+    credentials.OAUTH_TOKEN_URL = f"{ACCOUNTS_URL}/api/token"
+    return SpotifyClient(auth_manager=credentials)
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Seconds each kind of per-user payload stays fresh
+CACHE_TTLS = {
+    'top_artists': int(os.environ.get('SPOTIFY_CACHE_TTL_TOP_ITEMS', 6 * 3600)),
+    'top_tracks': int(os.environ.get('SPOTIFY_CACHE_TTL_TOP_ITEMS', 6 * 3600)),
+    'recently_played': int(os.environ.get('SPOTIFY_CACHE_TTL_RECENT', 5 * 60)),
+}
+
+# Hard cap on the estimated size of everything held in the per-user cache
+CACHE_MAX_BYTES = int(os.environ.get('SPOTIFY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Seconds past its TTL a per-user payload may still be served while it is refetched
+CACHE_STALE_WINDOW = int(os.environ.get('SPOTIFY_CACHE_STALE_WINDOW', 24 * 3600))
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with per-entry TTLs and a memory cap.
+
+    Entries are evicted least-recently-used first once the estimated size of
+    all values goes over max_bytes. Hit, miss, expiry and eviction counts are
+    kept for monitoring.
+
+    With stale_ttl, an entry past its TTL is kept that many seconds longer:
+    get() no longer returns it, but get_stale() does, so callers can serve
+    it while they fetch a fresh value.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, default_ttl=300, stale_ttl=0):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, fresh_until, expires_at, size)
+        self._lock = threading.Lock()
+
+    def _lookup(self, key, allow_stale):
+        """(value, fresh), or (None, False) for a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            value, fresh_until, expires_at, size = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None, False
+            fresh = fresh_until > now
+            if not fresh and not allow_stale:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return value, fresh
+
+    def get(self, key, default=None):
+        value, fresh = self._lookup(key, allow_stale=False)
+        return value if fresh else default
+
+    def get_stale(self, key):
+        """(value, fresh) for an entry that is fresh or within its stale window, else (None, False)"""
+        return self._lookup(key, allow_stale=True)
+
+    def set(self, key, value, ttl=None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        fresh_until = time.time() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, fresh_until, fresh_until + self.stale_ttl, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key):
+        size = self._entries.pop(key)[-1]
+        self.current_bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+            }
+
+
+def estimate_size(value):
+    """Rough memory footprint of a JSON-like value, measured as its serialized length"""
+    try:
+        return len(json.dumps(value, separators=(',', ':')))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+# Per-user Spotify payloads, keyed by (user id, endpoint, time_range, limit)
+user_data_cache = TTLCache(stale_ttl=CACHE_STALE_WINDOW)
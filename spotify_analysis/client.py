@@ -0,0 +1,81 @@
+import threading
+
+import spotipy
+from spotipy.exceptions import SpotifyException
+
+from .transport import get_session, is_shared_session, API_PREFIX
+from .scheduler import scheduler
+from .resilience import spotify_breaker, hedged
+from .metrics import call_upstream
+
+
+class TokenManager:
+    """
+    Holds one user's token_info and refreshes it on demand.
+
+    Used as a spotipy auth_manager so the token is only checked against
+    Spotify lazily: when a real API call comes back 401, the client calls
+    refresh() and retries. `refreshed` tells the caller to persist the new
+    token_info (e.g. back into the session).
+    """
+
+    def __init__(self, token_info, refresh_token_info):
+        self.token_info = token_info
+        # callable(refresh_token, stale_access_token) -> token_info
+        self.refresh_token_info = refresh_token_info
+        self.refreshed = False
+        self._lock = threading.Lock()
+
+    def get_access_token(self, as_dict=True):
+        return self.token_info if as_dict else self.token_info['access_token']
+
+    def refresh(self, stale_access_token):
+        """Refresh the token unless another thread already replaced stale_access_token"""
+        with self._lock:
+            if self.token_info['access_token'] == stale_access_token:
+                self.token_info = self.refresh_token_info(self.token_info['refresh_token'],
+                                                          stale_access_token)
+                self.refreshed = True
+            return self.token_info
+
+
+class SpotifyClient(spotipy.Spotify):
+    """
+    spotipy client that refreshes the access token and retries once on a 401.
+
+    Uses the worker's shared pooled session unless another requests_session
+    is given, so creating one per request is cheap. Every call goes through
+    the worker's RequestScheduler, which budgets calls and handles 429s, and
+    its circuit breaker, which fails calls fast while Spotify is down.
+    """
+
+    def __init__(self, *args, requests_session=None, **kwargs):
+        if requests_session is None:
+            requests_session = get_session()
+        super().__init__(*args, requests_session=requests_session, **kwargs)
+        self.prefix = API_PREFIX
+
+    def __del__(self):
+        # spotipy closes its session on garbage collection; the shared pool must stay open
+        if not is_shared_session(getattr(self, '_session', None)):
+            super().__del__()
+
+    def _internal_call(self, method, url, payload, params):
+        manager = self.auth_manager if isinstance(self.auth_manager, TokenManager) else None
+        access_token = manager.get_access_token(as_dict=False) if manager else None
+        call = super()._internal_call
+
+        def send():
+            # spotipy mutates params, so each attempt gets its own copy
+            attempt = lambda: scheduler.call(spotify_breaker.call, call_upstream,
+                                             call, url, method, url, payload, dict(params))
+            # GETs are idempotent, so a slow one may be raced by a second copy
+            return hedged(attempt) if method == 'GET' else attempt()
+
+        try:
+            return send()
+        except SpotifyException as e:
+            if e.http_status != 401 or manager is None:
+                raise
+            manager.refresh(access_token)
+            return send()
@@ -0,0 +1,191 @@
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # The analyses fall back to their pure-Python loops
+    np = None
+
+HAVE_NUMPY = np is not None
+
+
+class Vocabulary:
+    """
+    Thread-safe string -> integer code mapping.
+
+    Each batch of columns builds its own, so codes (and memory) don't
+    outlive the computation that needed them.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._names = []
+        self._lock = threading.Lock()
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(name)
+                if code is None:
+                    code = self._codes[name] = len(self._names)
+                    self._names.append(name)
+        return code
+
+    def codes(self, names):
+        get = self._codes.get
+        codes = [get(name) for name in names]
+        if None in codes:
+            codes = [self.code(name) if code is None else code for name, code in zip(names, codes)]
+        return codes
+
+    def names(self, codes):
+        return [self._names[code] for code in codes]
+
+    def __len__(self):
+        return len(self._names)
+
+
+class ArtistColumns:
+    """
+    Columnar view of one or more users' top-artist lists.
+
+    popularity holds one entry per artist. genre_codes holds every genre of
+    every artist in list order, so first occurrences keep the order the
+    loop-based analyses see them in, and genres maps them back to names.
+    user_starts / genre_user_starts mark where each user's rows begin.
+    """
+
+    def __init__(self, popularity, genre_codes, user_starts, genre_user_starts, genres):
+        self.popularity = popularity
+        self.genre_codes = genre_codes
+        self.user_starts = user_starts
+        self.genre_user_starts = genre_user_starts
+        self.genres = genres
+
+    @classmethod
+    def from_items(cls, items):
+        """Build from Spotify artist objects, e.g. the concatenated items of several pages"""
+        return cls.from_users([items])
+
+    @classmethod
+    def from_users(cls, item_lists):
+        """Stack several users' artist lists for batch computations"""
+        popularity = []
+        genre_codes = []
+        user_starts = []
+        genre_user_starts = []
+        genres = Vocabulary()
+        for items in item_lists:
+            user_starts.append(len(popularity))
+            genre_user_starts.append(len(genre_codes))
+            for item in items:
+                popularity.append(item['popularity'])
+                if 'genres' in item:
+                    genre_codes.extend(genres.codes(item['genres']))
+        return cls(
+            np.array(popularity, dtype=np.int64),
+            np.array(genre_codes, dtype=np.int64),
+            np.array(user_starts, dtype=np.int64),
+            np.array(genre_user_starts, dtype=np.int64),
+            genres
+        )
+
+
+class PlayColumns:
+    """Columnar view of recently played items: UTC hour and artist code per play"""
+
+    def __init__(self, hours, artist_codes, user_starts, artists):
+        self.hours = hours
+        self.artist_codes = artist_codes
+        self.user_starts = user_starts
+        self.artists = artists
+
+    @classmethod
+    def from_items(cls, items):
+        return cls.from_users([items])
+
+    @classmethod
+    def from_users(cls, item_lists):
+        hours = []
+        artist_names = []
+        user_starts = []
+        for items in item_lists:
+            user_starts.append(len(hours))
+            for item in items:
+                # played_at is ISO 8601 UTC ("2024-01-31T21:04:05.123Z")
+                hours.append(int(item['played_at'].split('T')[1].split(':')[0]))
+                artist_names.append(item['track']['artists'][0]['name'])
+        artists = Vocabulary()
+        return cls(
+            np.array(hours, dtype=np.int64),
+            np.array(artists.codes(artist_names), dtype=np.int64),
+            np.array(user_starts, dtype=np.int64),
+            artists
+        )
+
+
+def _counts_in_first_seen_order(codes):
+    """Unique codes and their counts, ordered by first occurrence (like filling a dict)"""
+    unique, first, counts = np.unique(codes, return_index=True, return_counts=True)
+    order = np.argsort(first, kind='stable')
+    return unique[order], counts[order]
+
+
+def _rank_desc(values):
+    """Indices sorting values descending; ties keep their current order, as sorted() does"""
+    return np.argsort(-values, kind='stable')
+
+
+def genre_distribution(columns, top=20):
+    """analyze_genre_distribution() over ArtistColumns"""
+    codes, counts = _counts_in_first_seen_order(columns.genre_codes)
+    names = columns.genres.names(codes.tolist())
+    percentages = (counts / counts.sum()) * 100 if len(counts) else counts.astype(np.float64)
+
+    ranked = _rank_desc(percentages)[:top]
+    return {
+        'genre_counts': dict(zip(names, counts.tolist())),
+        'genre_percentages': dict(zip(names, percentages.tolist())),
+        'sorted_genres': [(names[i], percentages[i].item()) for i in ranked.tolist()]
+    }
+
+
+def obscurity_score(columns):
+    """calculate_obscurity_score() over ArtistColumns"""
+    if not len(columns.popularity):
+        return 50
+    return int(100 - int(columns.popularity.sum()) / len(columns.popularity))
+
+
+def obscurity_scores(stacked):
+    """Obscurity score of every user in stacked ArtistColumns, as an int array"""
+    ends = np.append(stacked.user_starts[1:], len(stacked.popularity))
+    sizes = ends - stacked.user_starts
+    # Per-user sums as differences of a running total, so empty users anywhere are fine
+    totals = np.concatenate(([0], np.cumsum(stacked.popularity)))
+    sums = totals[ends] - totals[stacked.user_starts]
+    scores = np.full(len(sizes), 50, dtype=np.int64)
+    has_artists = sizes > 0
+    # Users without artists keep the default
+    scores[has_artists] = (100 - sums[has_artists] / sizes[has_artists]).astype(np.int64)
+    return scores
+
+
+def recent_plays_summary(columns, top=5):
+    """analyze_recent_plays() over PlayColumns"""
+    histogram = np.bincount(columns.hours, minlength=24)
+    artists, counts = _counts_in_first_seen_order(columns.artist_codes)
+    ranked = _rank_desc(counts)[:top]
+    names = columns.artists.names(artists[ranked].tolist())
+    return {
+        'hour_distribution': dict(enumerate(histogram.tolist())),
+        'peak_listening_hour': int(np.argmax(histogram)),
+        'top_recent_artists': list(zip(names, counts[ranked].tolist()))
+    }
+
+
+def hour_histograms(stacked):
+    """24-bucket listening-hour histogram per user in stacked PlayColumns, shape (users, 24)"""
+    users = len(stacked.user_starts)
+    user_ids = np.repeat(np.arange(users), np.diff(np.append(stacked.user_starts, len(stacked.hours))))
+    return np.bincount(user_ids * 24 + stacked.hours, minlength=users * 24).reshape(users, 24)
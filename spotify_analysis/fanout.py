@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .metrics import bind
+from .profiling import follow
+
+# Shared, bounded pool used to issue a page's independent Spotify fetches in parallel.
+# Set SPOTIFY_FANOUT_WORKERS=0 to run everything sequentially on the request thread.
+MAX_WORKERS = int(os.environ.get('SPOTIFY_FANOUT_WORKERS', 10))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class SectionTimeout(Exception):
+    """Raised in place of a result when a task misses the page deadline"""
+
+
+def get_executor():
+    """Return the process-wide fan-out pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix='spotify-fanout')
+        return _executor
+
+
+def run_concurrently(tasks, deadline=None):
+    """
+    Run independent zero-argument callables and collect their results.
+
+    Parameters:
+        tasks (dict): name -> callable
+        deadline (float, optional): seconds to wait for the whole batch
+
+    Returns:
+        (results, errors): results maps name -> return value for tasks that
+        finished; errors maps name -> the exception raised, or SectionTimeout
+        for tasks still running when the deadline passed.
+    """
+    results = {}
+    errors = {}
+
+    if MAX_WORKERS <= 0:
+        started = time.monotonic()
+        for name, task in tasks.items():
+            if deadline is not None and time.monotonic() - started > deadline:
+                errors[name] = SectionTimeout(name)
+                continue
+            try:
+                results[name] = task()
+            except Exception as e:
+                errors[name] = e
+        return results, errors
+
+    executor = get_executor()
+    futures = {executor.submit(follow(bind(task))): name for name, task in tasks.items()}
+    done, not_done = wait(futures, timeout=deadline)
+
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            errors[name] = e
+
+    for future in not_done:
+        # Queued work is dropped; calls already in flight finish in the background
+        future.cancel()
+        errors[futures[future]] = SectionTimeout(futures[future])
+
+    return results, errors
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+
+from spotipy.exceptions import SpotifyException
+
+from .metrics import traced
+
+logger = logging.getLogger(__name__)
+
+# Shared by every worker on the host; audio features are global per track
+FEATURE_DB_PATH = os.environ.get(
+    'AUDIO_FEATURES_DB', os.path.join(tempfile.gettempdir(), 'spotify_audio_features.sqlite3'))
+
+# The audio-features endpoint accepts at most 100 ids per call
+BATCH_SIZE = 100
+# After the endpoint fails (e.g. 403 for apps without access), stop asking for a while
+UNAVAILABLE_BACKOFF = int(os.environ.get('AUDIO_FEATURES_BACKOFF', 600))
+
+
+class AudioFeatureStore:
+    """
+    Persistent SQLite store of Spotify audio features keyed by track id.
+
+    Tracks Spotify has no features for are stored too, so they aren't
+    requested again. Only misses go upstream, in full 100-id batches.
+    """
+
+    def __init__(self, path=FEATURE_DB_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self._unavailable_until = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS audio_features ("
+            " track_id TEXT PRIMARY KEY,"
+            " features TEXT,"
+            " fetched_at REAL NOT NULL)")
+
+    def _connect(self):
+        # One connection per thread; WAL lets several workers read while one writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, track_ids):
+        """Stored features for the given ids: id -> features dict, or None if Spotify has none"""
+        found = {}
+        conn = self._connect()
+        for i in range(0, len(track_ids), 500):
+            chunk = track_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f"SELECT track_id, features FROM audio_features WHERE track_id IN ({placeholders})", chunk)
+            for track_id, features in rows:
+                found[track_id] = json.loads(features) if features else None
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(set(track_ids)) - len(found)
+        return found
+
+    def save(self, features_by_id):
+        now = time.time()
+        rows = [(track_id, json.dumps(features) if features else None, now)
+                for track_id, features in features_by_id.items()]
+        self._connect().executemany(
+            "INSERT OR REPLACE INTO audio_features (track_id, features, fetched_at) VALUES (?, ?, ?)", rows)
+
+    def missing(self, track_ids):
+        """Track ids (deduplicated, in order) that still need fetching, and what's already known"""
+        track_ids = list(dict.fromkeys(track_ids))
+        known = self.lookup(track_ids)
+        return [track_id for track_id in track_ids if track_id not in known], known
+
+    def available(self):
+        return time.time() >= self._unavailable_until
+
+    def _batches(self, track_ids):
+        """Store misses in 100-id batches, plus what's already known; none while backing off"""
+        to_fetch, known = self.missing(track_ids)
+        if not self.available():
+            to_fetch = []
+        return [to_fetch[i:i + BATCH_SIZE] for i in range(0, len(to_fetch), BATCH_SIZE)], known
+
+    def _record(self, batch, results, known):
+        with self._lock:
+            self.upstream_calls += 1
+        fetched = dict(zip(batch, results or []))
+        self.save(fetched)
+        known.update(fetched)
+
+    def _unavailable(self, error):
+        """Back off after a 403/404: the app has no access to audio features"""
+        if getattr(error, 'http_status', None) not in (403, 404):
+            return False
+        logger.warning("Audio features unavailable, backing off %ss: %s", UNAVAILABLE_BACKOFF, error)
+        self._unavailable_until = time.time() + UNAVAILABLE_BACKOFF
+        return True
+
+    @traced
+    def get_features(self, spotify_client, track_ids):
+        """
+        Audio features for track_ids, fetching only store misses in 100-id batches.
+
+        Returns:
+            dict: track id -> features dict (None when Spotify has no features);
+            ids missing from the dict could not be fetched
+        """
+        batches, known = self._batches(track_ids)
+        for batch in batches:
+            try:
+                results = spotify_client.audio_features(batch)
+            except SpotifyException as e:
+                if self._unavailable(e):
+                    break
+                raise
+            self._record(batch, results, known)
+        return known
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'upstream_calls': self.upstream_calls,
+                'available': self.available(),
+            }
+        stats['tracks'] = self._connect().execute("SELECT COUNT(*) FROM audio_features").fetchone()[0]
+        try:
+            stats['bytes'] = os.path.getsize(self.path)
+        except OSError:
+            stats['bytes'] = None
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_feature_store():
+    """The process-wide feature store, opened on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AudioFeatureStore()
+        return _store
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from datetime import datetime
+
+from .metrics import traced
+
+logger = logging.getLogger(__name__)
+
+LISTENING_HISTORY_DB = os.environ.get(
+    'LISTENING_HISTORY_DB', os.path.join(tempfile.gettempdir(), 'spotify_listening_history.sqlite3'))
+# Don't ask Spotify for new plays more often than this per user
+HISTORY_MIN_INTERVAL = int(os.environ.get('LISTENING_HISTORY_MIN_INTERVAL', 60))
+# Pages of 50 followed after the watermark in one ingest
+HISTORY_MAX_PAGES = int(os.environ.get('LISTENING_HISTORY_MAX_PAGES', 5))
+PAGE_SIZE = 50
+
+
+def played_at_ms(played_at):
+    """Milliseconds since the epoch for a Spotify played_at timestamp"""
+    return int(datetime.fromisoformat(played_at.replace('Z', '+00:00')).timestamp() * 1000)
+
+
+class ListeningHistory:
+    """
+    Per-user listening history kept in SQLite, grown incrementally.
+
+    Each ingest appends only plays newer than the user's watermark and
+    updates running aggregates (plays per hour, plays per artist) in the same
+    transaction, so summaries cost O(1) in history length and concurrent
+    ingests from several workers never count a play twice.
+    """
+
+    def __init__(self, path=LISTENING_HISTORY_DB):
+        self.path = path
+        self.ingests = 0
+        self.new_plays = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connect().executescript(
+            "CREATE TABLE IF NOT EXISTS plays ("
+            " user_id TEXT NOT NULL,"
+            " played_at INTEGER NOT NULL,"
+            " track_id TEXT,"
+            " artist TEXT,"
+            " PRIMARY KEY (user_id, played_at));"
+            "CREATE TABLE IF NOT EXISTS history_state ("
+            " user_id TEXT PRIMARY KEY,"
+            " watermark INTEGER,"
+            " first_played_at INTEGER,"
+            " total_plays INTEGER NOT NULL,"
+            " hour_counts TEXT NOT NULL,"
+            " ingested_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS artist_plays ("
+            " user_id TEXT NOT NULL,"
+            " artist TEXT NOT NULL,"
+            " plays INTEGER NOT NULL,"
+            " first_played_at INTEGER NOT NULL,"
+            " PRIMARY KEY (user_id, artist));"
+            "CREATE INDEX IF NOT EXISTS artist_plays_top"
+            " ON artist_plays (user_id, plays DESC, first_played_at);")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _state(self, conn, user_id):
+        row = conn.execute(
+            "SELECT watermark, first_played_at, total_plays, hour_counts, ingested_at"
+            " FROM history_state WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        watermark, first_played_at, total_plays, hour_counts, ingested_at = row
+        return {
+            'watermark': watermark,
+            'first_played_at': first_played_at,
+            'total_plays': total_plays,
+            'hour_counts': json.loads(hour_counts),
+            'ingested_at': ingested_at,
+        }
+
+    def watermark(self, user_id):
+        """played_at (ms) of the newest stored play, or None for a new user"""
+        state = self._state(self._connect(), user_id)
+        return state['watermark'] if state else None
+
+    def due(self, user_id):
+        """Whether it's time to look for new plays for this user"""
+        state = self._state(self._connect(), user_id)
+        return state is None or time.time() - state['ingested_at'] >= HISTORY_MIN_INTERVAL
+
+    def record(self, user_id, items):
+        """Append recently-played items newer than the watermark; returns how many were new"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = self._state(conn, user_id) or {
+                'watermark': None, 'first_played_at': None, 'total_plays': 0,
+                'hour_counts': [0] * 24,
+            }
+            previous_watermark = state['watermark']
+            added = 0
+            for item in items:
+                played_at = played_at_ms(item['played_at'])
+                if previous_watermark is not None and played_at <= previous_watermark:
+                    continue
+                track = item['track']
+                artist = track['artists'][0]['name']
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO plays (user_id, played_at, track_id, artist) VALUES (?, ?, ?, ?)",
+                    (user_id, played_at, track.get('id'), artist)).rowcount
+                if not inserted:
+                    continue
+                added += 1
+                hour = int(item['played_at'].split('T')[1].split(':')[0])
+                state['hour_counts'][hour] += 1
+                conn.execute(
+                    "INSERT INTO artist_plays (user_id, artist, plays, first_played_at) VALUES (?, ?, 1, ?)"
+                    " ON CONFLICT (user_id, artist) DO UPDATE SET plays = plays + 1,"
+                    " first_played_at = MIN(first_played_at, excluded.first_played_at)",
+                    (user_id, artist, played_at))
+                state['total_plays'] += 1
+                state['watermark'] = max(state['watermark'] or 0, played_at)
+                state['first_played_at'] = min(state['first_played_at'] or played_at, played_at)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO history_state (user_id, watermark, first_played_at, total_plays,"
+                " hour_counts, ingested_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, state['watermark'], state['first_played_at'], state['total_plays'],
+                 json.dumps(state['hour_counts']), time.time()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._lock:
+            self.ingests += 1
+            self.new_plays += added
+        return added
+
+    def summary(self, user_id, top=5):
+        """analyze_recent_plays()-style summary of the user's whole stored history"""
+        conn = self._connect()
+        state = self._state(conn, user_id)
+        if state is None or not state['total_plays']:
+            return {'hour_distribution': {}, 'peak_listening_hour': None, 'top_recent_artists': [],
+                    'total_plays': 0, 'since': None}
+
+        hour_distribution = dict(enumerate(state['hour_counts']))
+        return {
+            'hour_distribution': hour_distribution,
+            'peak_listening_hour': max(hour_distribution.items(), key=lambda x: x[1])[0],
+            # Most played first; ties go to the artist heard first
+            'top_recent_artists': conn.execute(
+                "SELECT artist, plays FROM artist_plays WHERE user_id = ?"
+                " ORDER BY plays DESC, first_played_at LIMIT ?", (user_id, top)).fetchall(),
+            'total_plays': state['total_plays'],
+            'since': datetime.utcfromtimestamp(state['first_played_at'] / 1000).strftime('%Y-%m-%d'),
+        }
+
+    def plays(self, user_id, after=None, before=None):
+        """(played_at, track_id, artist) rows with after < played_at < before, oldest first"""
+        return self._connect().execute(
+            "SELECT played_at, track_id, artist FROM plays WHERE user_id = ?"
+            " AND played_at > ? AND played_at < ? ORDER BY played_at",
+            (user_id, -1 if after is None else after, 2 ** 62 if before is None else before)).fetchall()
+
+    def stats(self):
+        conn = self._connect()
+        users, plays = conn.execute("SELECT COUNT(*), COALESCE(SUM(total_plays), 0) FROM history_state").fetchone()
+        with self._lock:
+            return {'users': users, 'plays': plays, 'ingests': self.ingests, 'new_plays': self.new_plays}
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_listening_history():
+    """The process-wide history store, opened on first use"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = ListeningHistory()
+        return _history
+
+
+def _next_after(results):
+    """Cursor for the page after this one, or None when there are no more new plays"""
+    if len(results.get('items', [])) < PAGE_SIZE:
+        return None
+    cursors = results.get('cursors') or {}
+    if cursors.get('after'):
+        return int(cursors['after'])
+    return max(played_at_ms(item['played_at']) for item in results['items'])
+
+
+@traced
+def ingest(spotify_client, user_id):
+    """
+    Fetch plays newer than the user's watermark and append them to the history.
+
+    A new user starts from the regular 50-play page (shared with the other
+    page sections); after that only the `after` cursor is used, which is
+    usually one small response.
+    """
+    history = get_listening_history()
+    if not history.due(user_id):
+        return 0
+    after = history.watermark(user_id)
+    if after is None:
+        return history.record(user_id, spotify_client.current_user_recently_played(limit=PAGE_SIZE)['items'])
+
+    added = 0
+    for _ in range(HISTORY_MAX_PAGES):
+        results = spotify_client.current_user_recently_played(limit=PAGE_SIZE, after=after)
+        added += history.record(user_id, results['items'])
+        after = _next_after(results)
+        if after is None:
+            break
+    return added
+
+
+@traced
+def analyze_listening_history(spotify_client):
+    """Listening-time and artist stats over everything ingested for the current user"""
+    user_id = spotify_client.me()['id']
+    try:
+        ingest(spotify_client, user_id)
+    except Exception as e:
+        logger.warning("Error updating listening history: %s", e)
+    return get_listening_history().summary(user_id)
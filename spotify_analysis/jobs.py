@@ -0,0 +1,194 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, wait
+
+from .metrics import bind
+from .profiling import follow
+
+logger = logging.getLogger(__name__)
+
+# Background threads per worker process, and jobs allowed to wait for one
+JOB_WORKERS = int(os.environ.get('SPOTIFY_JOB_WORKERS', 8))
+JOB_QUEUE_SIZE = int(os.environ.get('SPOTIFY_JOB_QUEUE_SIZE', 100))
+# Seconds a finished job's result is handed out before the job can run again
+JOB_RESULT_TTL = float(os.environ.get('SPOTIFY_JOB_RESULT_TTL', 120))
+# Recent jobs kept for the latency percentiles in stats()
+LATENCY_SAMPLES = 256
+
+
+class _Job:
+    def __init__(self, key, fn, args):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.finished_at = None
+
+
+class JobQueue:
+    """
+    Local background job queue with deduplication by key.
+
+    Submitting a key that is already queued, running or finished less than
+    result_ttl seconds ago returns the existing job's future instead of
+    running it again, so a request can pick up (or wait on) work that was
+    started for it earlier. Worker threads start on first use, i.e. after
+    gunicorn has forked.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self._waits = deque(maxlen=LATENCY_SAMPLES)
+        self._runtimes = deque(maxlen=LATENCY_SAMPLES)
+        self._jobs = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        """The job for key if it is pending or its result is still fresh. Caller holds _lock."""
+        job = self._jobs.get(key)
+        if job is not None and job.finished_at is not None and now - job.finished_at > self.result_ttl:
+            del self._jobs[key]
+            return None
+        return job
+
+    def submit(self, key, fn, *args):
+        """Queue fn(*args) under key; returns its Future, or None if the queue is full"""
+        with self._lock:
+            job = self._live(key, time.monotonic())
+            if job is not None:
+                self.deduplicated += 1
+                return job.future
+            # Upstream calls made by the job count towards the route that queued it,
+            # and a profile of that request samples the job too
+            job = _Job(key, follow(bind(fn)), args)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                return None
+            self._jobs[key] = job
+            self.submitted += 1
+            self._start_workers()
+        return job.future
+
+    def get(self, key):
+        """Future of the pending or recently finished job for key, or None"""
+        with self._lock:
+            job = self._live(key, time.monotonic())
+        return job.future if job is not None else None
+
+    def futures(self, keys):
+        """key -> Future of the pending or recently finished job, for the keys that have one"""
+        futures = {}
+        for key in keys:
+            future = self.get(key)
+            if future is not None:
+                futures[key] = future
+        return futures
+
+    def _start_workers(self):
+        """Caller holds _lock"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"spotify-job-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            started = time.monotonic()
+            with self._lock:
+                self.running += 1
+                self._waits.append(started - job.enqueued_at)
+            if not job.future.set_running_or_notify_cancel():
+                with self._lock:
+                    self.running -= 1
+                    if self._jobs.get(job.key) is job:
+                        del self._jobs[job.key]
+                continue
+            try:
+                result = job.fn(*job.args)
+            except Exception as e:
+                logger.warning("Background job %s failed: %r", job.key, e)
+                job.future.set_exception(e)
+                failed = True
+            else:
+                job.future.set_result(result)
+                failed = False
+            finished = time.monotonic()
+            with self._lock:
+                self.running -= 1
+                self.failed += failed
+                self.completed += not failed
+                self._runtimes.append(finished - started)
+                job.finished_at = finished
+                if failed and self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]  # Let the next request try again
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'queued': self._queue.qsize(),
+                'running': self.running,
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+                'queue_wait_p50': _percentile(self._waits, 0.5),
+                'queue_wait_p95': _percentile(self._waits, 0.95),
+                'run_time_p50': _percentile(self._runtimes, 0.5),
+                'run_time_p95': _percentile(self._runtimes, 0.95),
+            }
+
+
+def wait_for(futures, timeout=None):
+    """
+    Wait up to timeout for a dict of job futures; returns (results, errors).
+
+    errors maps keys whose job failed to its exception, and keys whose job
+    isn't done in time to None. Those jobs keep running for the next request.
+    """
+    if futures:
+        wait(futures.values(), timeout=timeout)
+    return _outcomes(futures)
+
+
+def _outcomes(futures):
+    results = {}
+    errors = {}
+    for key, future in futures.items():
+        if not future.done() or future.cancelled():
+            errors[key] = None
+        elif future.exception() is not None:
+            errors[key] = future.exception()
+        else:
+            results[key] = future.result()
+    return results, errors
+
+
+def _percentile(samples, fraction):
+    """Nearest-rank percentile of recent samples in seconds, or None without samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+
+# Shared by every request in this worker
+job_queue = JobQueue()
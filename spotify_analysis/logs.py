@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Hand records to a background thread for formatting and writing (0 writes on the calling thread)
+LOG_QUEUE = os.environ.get('SPOTIFY_LOG_QUEUE', '1').lower() in ('1', 'true', 'yes')
+# Records buffered for the writer thread; past this, new records are dropped rather than waited on
+LOG_QUEUE_SIZE = int(os.environ.get('SPOTIFY_LOG_QUEUE_SIZE', 10000))
+# 'text', or 'json' for one object per line with any `extra` fields
+LOG_FORMAT = os.environ.get('SPOTIFY_LOG_FORMAT', 'text').lower()
+# Per-request chatter: at most CHATTER_LIMIT records per message per CHATTER_WINDOW seconds
+CHATTER_LIMIT = int(os.environ.get('SPOTIFY_LOG_CHATTER_LIMIT', 10))
+CHATTER_WINDOW = float(os.environ.get('SPOTIFY_LOG_CHATTER_WINDOW', 60))
+# One line per request from the app, in place of gunicorn's synchronous access log
+ACCESS_LOG = os.environ.get('SPOTIFY_ACCESS_LOG', '1').lower() in ('1', 'true', 'yes')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else came from `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks or formats on the logging thread.
+
+    The stock handler renders the message before queueing it; here the
+    record is queued as is, so the writer thread does the %-formatting.
+    Log arguments should therefore not be mutated after the call.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room instead of failing when stopping with a full queue
+        self.queue.put(self._sentinel)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `limit` records per message template per `window` seconds.
+
+    The first record let through after some were dropped says how many.
+    Templates are keyed on the unformatted message, so callers should pass
+    values as arguments rather than building the message with an f-string.
+    """
+
+    MAX_TEMPLATES = 1000
+
+    def __init__(self, limit=CHATTER_LIMIT, window=CHATTER_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.suppressed = 0
+        self._windows = {}  # message template -> [window start, records let through, records dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._windows.get(record.msg)
+            dropped = 0
+            if entry is None or now - entry[0] >= self.window:
+                if entry is not None:
+                    dropped = entry[2]
+                elif len(self._windows) >= self.MAX_TEMPLATES:
+                    self._windows.clear()
+                entry = self._windows[record.msg] = [now, 0, 0]
+            if entry[1] >= self.limit:
+                entry[2] += 1
+                self.suppressed += 1
+                return False
+            entry[1] += 1
+        if dropped and isinstance(record.args, tuple):
+            record.msg = f"{record.msg} (%d similar suppressed)"
+            record.args = record.args + (dropped,)
+        return True
+
+
+_handler = None
+_queue_handler = None
+_listener = None
+_lock = threading.Lock()
+chatter_filter = RateLimitFilter()
+
+
+def configure_logging(level=LOG_LEVEL, stream=None):
+    """Send the root logger's records through a queue to a writer thread; safe to call again"""
+    global _handler, _queue_handler
+    with _lock:
+        if _handler is not None:
+            return
+        _handler = logging.StreamHandler(stream or sys.stdout)
+        _handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+        root = logging.getLogger()
+        root.setLevel(level)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        if not LOG_QUEUE:
+            root.addHandler(_handler)
+            return
+        _queue_handler = BackgroundQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        root.addHandler(_queue_handler)
+        _start_listener()
+        atexit.register(stop_logging)
+        # The writer thread doesn't survive a fork (e.g. gunicorn --preload); give the child its own
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def _start_listener():
+    global _listener
+    _listener = _Listener(_queue_handler.queue, _handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_in_child():
+    _queue_handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _start_listener()
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def chatter_logger(name):
+    """Logger for per-request chatter (route hits, redirects), rate limited per message"""
+    logger = logging.getLogger(f"{name}.requests")
+    if chatter_filter not in logger.filters:
+        logger.addFilter(chatter_filter)
+    return logger
+
+
+def logging_stats():
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler is not None else 0,
+        'dropped': _queue_handler.dropped if _queue_handler is not None else 0,
+        'chatter_suppressed': chatter_filter.suppressed,
+    }
@@ -3,7 +3,9 @@ from tabulate import tabulate
 from .artist_analysis import get_top_artists, analyze_genre_distribution
 from .track_analysis import get_top_tracks, analyze_recent_plays
 from .mood_analysis import analyze_music_mood
-from .auth import get_spotify_client  # Explicitly import from auth.py
+from .auth import get_spotify_client, get_cli_client  # Explicitly import from auth.py
+from .streaming_history import import_streaming_history, resolve_artist_genres
+from .play_store import import_export
 
 def main(sp=None):
     """
@@ -66,5 +68,57 @@ def main(sp=None):
     for artist, count in recent['top_recent_artists']:
         print(f"{artist}: {count} plays")
 
+def analyze_export(paths, workers=None, with_genres=False, store_user=None):
+    """
+    Analyze Extended Streaming History export files offline.
+    
+    Parameters:
+        paths (list): Streaming_History_Audio_*.json files from the export
+        workers (int, optional): Processes to parse files with (0 = this process)
+        with_genres (bool): Look up genres of the top artists on Spotify (needs the app's
+            SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET)
+        store_user (str, optional): Also add the plays to this user's play store
+    """
+    history = import_streaming_history(paths, workers=workers)
+    summary = history.recent_plays_summary(top=20)
+    print(f"Imported {summary['total_plays']} plays ({summary['hours_played']} hours) "
+          f"from {summary['since']} to {summary['until']}, skipped {history.skipped}\n")
+    
+    print("===== Listening Hours (UTC) =====")
+    hours = [(f"{hour:02d}:00", count) for hour, count in summary['hour_distribution'].items()]
+    print(tabulate(hours, headers=['Hour', 'Plays'], tablefmt='grid'))
+    print(f"Peak listening hour: {summary['peak_listening_hour']}:00")
+    
+    print("\n===== Most Played Artists =====")
+    print(tabulate(summary['top_recent_artists'], headers=['Artist', 'Plays'], tablefmt='grid'))
+    
+    if with_genres:
+        print("\n===== Top Genres =====")
+        sp = get_cli_client()
+        top_artists = sorted(history.artist_counts, key=history.artist_counts.get, reverse=True)[:50]
+        genres = history.genre_distribution(resolve_artist_genres(sp, top_artists))
+        for genre, percentage in genres['sorted_genres'][:10]:
+            print(f"{genre}: {percentage:.1f}%")
+    
+    if store_user:
+        added = import_export(store_user, paths)
+        print(f"\nAdded {added} new plays to the play store for {store_user}")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Analyze your Spotify listening")
+    parser.add_argument('--history', nargs='+', metavar='FILE',
+                        help="Analyze Extended Streaming History JSON files offline instead")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processes used to parse history files (default: one per file)")
+    parser.add_argument('--genres', action='store_true',
+                        help="With --history, look up top artists' genres on Spotify")
+    parser.add_argument('--store-user', metavar='USER_ID',
+                        help="With --history, keep the plays in this Spotify user's play store")
+    args = parser.parse_args()
+    
+    if args.history:
+        analyze_export(args.history, workers=args.workers, with_genres=args.genres, store_user=args.store_user)
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,159 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from .cache import estimate_size
+
+# Seconds before a stored artist/track is replaced by the next copy Spotify returns
+METADATA_MAX_AGE = int(os.environ.get('SPOTIFY_METADATA_MAX_AGE', 24 * 3600))
+# Per kind (artists, tracks); least recently used objects are dropped first
+METADATA_MAX_ITEMS = int(os.environ.get('SPOTIFY_METADATA_MAX_ITEMS', 100000))
+# Per kind, on the estimated size of the stored objects, as for the per-user cache
+METADATA_MAX_BYTES = int(os.environ.get('SPOTIFY_METADATA_MAX_BYTES', 32 * 1024 * 1024))
+
+_MISSING = object()
+
+# Which kind of object each cached endpoint's items hold
+PAGE_KINDS = {
+    'top_artists': 'artist',
+    'top_tracks': 'track',
+    'recently_played': 'track',
+}
+
+
+class MetadataStore:
+    """
+    Process-wide store of Spotify artist and track objects, keyed by id.
+
+    Popular artists and tracks show up in many users' top lists; the store
+    keeps one copy of each, so per-user cache entries only need ids and the
+    analyses share the same objects. Values derived from an object (e.g. its
+    display strings) are computed once and kept alongside it. An object older
+    than max_age is replaced by the next fresh copy from Spotify.
+
+    Each kind is capped at max_items objects and max_bytes of estimated
+    size (see cache.estimate_size), least recently used first.
+    """
+
+    def __init__(self, max_age=METADATA_MAX_AGE, max_items=METADATA_MAX_ITEMS, max_bytes=METADATA_MAX_BYTES):
+        self.max_age = max_age
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.deduplicated = 0
+        self.refreshed = 0
+        self.evictions = 0
+        # id -> [object, stored_at, derived, size]
+        self._entries = {'artist': OrderedDict(), 'track': OrderedDict()}
+        self._bytes = {'artist': 0, 'track': 0}
+        self._lock = threading.Lock()
+
+    def intern(self, kind, obj):
+        """Return the stored copy of obj, storing obj itself if it is new or the copy is stale"""
+        object_id = obj.get('id') if obj else None
+        if not object_id:
+            return obj
+
+        entries = self._entries[kind]
+        now = time.time()
+        with self._lock:
+            entry = entries.get(object_id)
+            if entry is not None:
+                entries.move_to_end(object_id)
+                if now - entry[1] < self.max_age:
+                    self.deduplicated += 1
+                    return entry[0]
+                self.refreshed += 1
+        # Sized outside the lock; only new and refreshed objects pay for it
+        size = estimate_size(obj)
+        with self._lock:
+            # Also drops a copy another thread stored meanwhile
+            previous = entries.pop(object_id, None)
+            if previous is not None:
+                self._bytes[kind] -= previous[3]
+            if size > self.max_bytes:
+                return obj
+            entries[object_id] = [obj, now, {}, size]
+            self._bytes[kind] += size
+            while len(entries) > self.max_items or self._bytes[kind] > self.max_bytes:
+                self._bytes[kind] -= entries.popitem(last=False)[1][3]
+                self.evictions += 1
+        return obj
+
+    def get(self, kind, object_id):
+        with self._lock:
+            entry = self._entries[kind].get(object_id)
+            if entry is None:
+                return None
+            self._entries[kind].move_to_end(object_id)
+            return entry[0]
+
+    def derived(self, kind, obj, name, compute):
+        """compute(obj), memoised on the stored object; computed afresh for objects not in the store"""
+        # Hits skip the lock; single dict lookups are atomic
+        entry = self._entries[kind].get(obj.get('id'))
+        if entry is not None and entry[0] is obj:
+            value = entry[2].get(name, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        value = compute(obj)
+        if entry is not None and entry[0] is obj:
+            with self._lock:
+                entry[2][name] = value
+        return value
+
+    def intern_page(self, endpoint, payload):
+        """Copy of a paging object whose items are the stored artist/track objects"""
+        kind = PAGE_KINDS[endpoint]
+        page = dict(payload)
+        if endpoint == 'recently_played':
+            page['items'] = [dict(item, track=self.intern(kind, item['track'])) for item in payload['items']]
+        else:
+            page['items'] = [self.intern(kind, item) for item in payload['items']]
+        return page
+
+    def compact_page(self, endpoint, payload):
+        """Paging object with each artist/track replaced by its id, for per-user caching"""
+        page = dict(payload)
+        if endpoint == 'recently_played':
+            page['items'] = [dict(item, track=_ref(item['track'])) for item in payload['items']]
+        else:
+            page['items'] = [_ref(item) for item in payload['items']]
+        return page
+
+    def rehydrate_page(self, endpoint, compact):
+        """Inverse of compact_page(); None if any object has since left the store"""
+        kind = PAGE_KINDS[endpoint]
+        page = dict(compact)
+        items = []
+        for item in compact['items']:
+            ref = item['track'] if endpoint == 'recently_played' else item
+            obj = ref if isinstance(ref, dict) else self.get(kind, ref)
+            if obj is None:
+                return None
+            items.append(dict(item, track=obj) if endpoint == 'recently_played' else obj)
+        page['items'] = items
+        return page
+
+    def stats(self):
+        with self._lock:
+            return {
+                'artists': len(self._entries['artist']),
+                'tracks': len(self._entries['track']),
+                'artist_bytes': self._bytes['artist'],
+                'track_bytes': self._bytes['track'],
+                'max_bytes': self.max_bytes,
+                'deduplicated': self.deduplicated,
+                'refreshed': self.refreshed,
+                'evictions': self.evictions,
+            }
+
+
+def _ref(obj):
+    # Objects without an id (e.g. local files) stay inline
+    return obj['id'] if obj.get('id') else obj
+
+
+# Shared by every user in this worker
+metadata_store = MetadataStore()
@@ -0,0 +1,265 @@
+import re
+import time
+import bisect
+import logging
+import functools
+import threading
+import contextvars
+from functools import lru_cache
+
+from spotipy.exceptions import SpotifyException
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Labels for the upstream calls made in this context: the Flask endpoint being
+# served and the outermost analysis function running
+_route = contextvars.ContextVar('spotify_metrics_route', default=None)
+_caller = contextvars.ContextVar('spotify_metrics_caller', default=None)
+
+# Path segments after these are ids, replaced by {id} in endpoint labels
+_ID_AFTER = re.compile(r'\b(artists|albums|tracks|playlists|users|shows|episodes)/[^/?]+')
+
+
+class _Metric:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+
+    def _labels(self, values):
+        return dict(zip(self.labelnames, values))
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(values), value) for values, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), sum
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            entries = [(values, list(counts), total) for values, (counts, total) in self._values.items()]
+        samples = []
+        for values, counts, total in entries:
+            labels = self._labels(values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((self.name + '_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Metrics of this worker process, rendered in the Prometheus text format.
+
+    Metrics are updated as things happen; collectors are called at scrape
+    time for values that already live elsewhere (e.g. cache stats).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        Register fn() -> [(name, type, help, [(labels, value), ...]), ...]; usable as a decorator.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            _render_family(lines, metric.name, metric.type, metric.documentation, metric.samples())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.warning("Error collecting metrics from %s: %s", collect.__name__, e)
+                continue
+            for name, kind, documentation, samples in families:
+                _render_family(lines, name, kind, documentation,
+                               [(name, labels, value) for labels, value in samples])
+        return '\n'.join(lines) + '\n'
+
+
+def _render_family(lines, name, kind, documentation, samples):
+    lines.append(f"# HELP {name} {documentation}")
+    lines.append(f"# TYPE {name} {kind}")
+    for sample_name, labels, value in samples:
+        if value is None:
+            continue
+        if labels:
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+            lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+        else:
+            lines.append(f"{sample_name} {_format_value(value)}")
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+registry = Registry()
+
+UPSTREAM_SECONDS = registry.register(Histogram(
+    'spotify_upstream_request_seconds',
+    "Spotify API calls by endpoint, response status and the analysis function that made them",
+    ['endpoint', 'status', 'caller']))
+UPSTREAM_BY_ROUTE = registry.register(Counter(
+    'spotify_upstream_requests_by_route_total',
+    "Spotify API calls by the app route that started them (including its background jobs)",
+    ['route']))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge(
+    'spotify_upstream_in_flight',
+    "Spotify API calls currently waiting on a response"))
+ROUTE_SECONDS = registry.register(Histogram(
+    'http_request_duration_seconds',
+    "Time to serve app requests by route, method and status",
+    ['route', 'method', 'status']))
+
+
+def traced(fn):
+    """
+    Attribute the Spotify calls made while fn runs to fn.
+
+    Only the outermost traced function counts, so calls made by helpers
+    (e.g. the feature store inside the mood analysis) are charged to the
+    analysis that needed them.
+    """
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _caller.get() is not None:
+            return fn(*args, **kwargs)
+        token = _caller.set(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _caller.reset(token)
+    return wrapper
+
+
+def bind(fn):
+    """fn wrapped to run with this context's route and caller, for work handed to another thread"""
+    route, caller = _route.get(), _caller.get()
+    if route is None and caller is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        route_token = _route.set(route)
+        caller_token = _caller.set(caller)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _caller.reset(caller_token)
+            _route.reset(route_token)
+    return bound
+
+
+def set_route(route):
+    """Label upstream calls made in this context with the app route; returns a token for reset_route()"""
+    return _route.set(route)
+
+
+def reset_route(token):
+    _route.reset(token)
+
+
+@lru_cache(maxsize=1024)
+def endpoint_template(url):
+    """'https://api.spotify.com/v1/artists/0OdUWJ0/top-tracks?country=US' -> 'artists/{id}/top-tracks'"""
+    path = url.split('?', 1)[0]
+    if '/v1/' in path:
+        path = path.split('/v1/', 1)[1]
+    return _ID_AFTER.sub(r'\1/{id}', path.strip('/')) or '/'
+
+
+def error_status(error):
+    """Status label for a failed call: the HTTP status, or the kind of transport failure"""
+    if isinstance(error, SpotifyException):
+        return str(error.http_status)
+    if 'Timeout' in type(error).__name__:
+        return 'timeout'
+    return 'error'
+
+
+def span_started():
+    """Start timing an upstream call; pass the result to span_finished()"""
+    UPSTREAM_IN_FLIGHT.inc()
+    return time.perf_counter()
+
+
+def span_finished(started, url, status):
+    elapsed = time.perf_counter() - started
+    UPSTREAM_IN_FLIGHT.dec()
+    UPSTREAM_SECONDS.observe(elapsed, endpoint_template(url), str(status), _caller.get() or 'none')
+    UPSTREAM_BY_ROUTE.inc(_route.get() or 'background')
+
+
+def call_upstream(fn, url, *args, **kwargs):
+    """Run one upstream HTTP call as a span"""
+    started = span_started()
+    status = 200
+    try:
+        return fn(*args, **kwargs)
+    except BaseException as e:
+        status = error_status(e)
+        raise
+    finally:
+        span_finished(started, url, status)
+
+
+def observe_route(route, method, status, seconds):
+    ROUTE_SECONDS.observe(seconds, route, method, str(status))
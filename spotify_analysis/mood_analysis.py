@@ -1,17 +1,23 @@
-from .track_analysis import get_top_tracks
+from .track_analysis import get_top_tracks_with_audio_features
+from .mood_classifier import mood_classifier
+from .metrics import traced
 
+@traced
 def analyze_music_mood(spotify_client, time_range='medium_term'):
-    """Analyze the 'mood' of your music based on genres instead of audio features"""
+    """Analyze the 'mood' of your music from audio features, falling back to genres"""
     try:
         # Get top tracks with audio features
-        tracks = get_top_tracks(spotify_client, time_range=time_range, limit=50)
+        tracks = get_top_tracks_with_audio_features(spotify_client, time_range=time_range, limit=50)
         
         # Try to calculate averages, but fall back to genre analysis if needed
         try:
-            # Calculate averages if audio features are available
-            avg_valence = sum(t.get('valence', 0) for t in tracks) / len(tracks)
-            avg_energy = sum(t.get('energy', 0) for t in tracks) / len(tracks)
-            avg_danceability = sum(t.get('danceability', 0) for t in tracks) / len(tracks)
+            # Average over the tracks that have audio features
+            tracks = [t for t in tracks if 'valence' in t]
+            if not tracks:
+                raise KeyError('valence')
+            avg_valence = sum(t['valence'] for t in tracks) / len(tracks)
+            avg_energy = sum(t['energy'] for t in tracks) / len(tracks)
+            avg_danceability = sum(t['danceability'] for t in tracks) / len(tracks)
             
             # Interpret mood
             if avg_valence > 0.6 and avg_energy > 0.6:
@@ -41,6 +47,7 @@ def analyze_music_mood(spotify_client, time_range='medium_term'):
         print(f"Error in mood analysis: {e}")
         return analyze_mood_from_genres(spotify_client, time_range)
 
+@traced
 def analyze_mood_from_genres(spotify_client, time_range='medium_term'):
     """Alternative mood analysis based on genres when audio features aren't available"""
     artists_results = spotify_client.current_user_top_artists(time_range=time_range, limit=20)
@@ -51,33 +58,8 @@ def analyze_mood_from_genres(spotify_client, time_range='medium_term'):
         for genre in artist['genres']:
             genres[genre] = genres.get(genre, 0) + 1
     
-    # Analyze mood based on genre keywords
-    happy_keywords = ['pop', 'dance', 'edm', 'happy']
-    angry_keywords = ['metal', 'hardcore', 'punk', 'death']
-    sad_keywords = ['sad', 'blues', 'emo', 'soul']
-    chill_keywords = ['chill', 'ambient', 'lofi', 'acoustic']
-    
-    mood_scores = {
-        'happy': 0,
-        'angry': 0,
-        'sad': 0,
-        'chill': 0
-    }
-    
-    # Calculate mood scores based on genre keywords
-    for genre, count in genres.items():
-        for keyword in happy_keywords:
-            if keyword in genre.lower():
-                mood_scores['happy'] += count
-        for keyword in angry_keywords:
-            if keyword in genre.lower():
-                mood_scores['angry'] += count
-        for keyword in sad_keywords:
-            if keyword in genre.lower():
-                mood_scores['sad'] += count
-        for keyword in chill_keywords:
-            if keyword in genre.lower():
-                mood_scores['chill'] += count
+    # Calculate mood scores based on genre keywords (one cached lookup per genre)
+    mood_scores = mood_classifier.score(genres)
     
     # Determine dominant mood
     dominant_mood = max(mood_scores.items(), key=lambda x: x[1])[0] if any(mood_scores.values()) else 'balanced'
@@ -92,7 +74,7 @@ def analyze_mood_from_genres(spotify_client, time_range='medium_term'):
     }
     
     return {
-        'mood': mood_descriptions[dominant_mood],
+        'mood': mood_descriptions.get(dominant_mood, dominant_mood.title()),
         'average_valence': 0.5,  # Placeholder
         'average_energy': 0.5,   # Placeholder
         'average_danceability': 0.5,  # Placeholder
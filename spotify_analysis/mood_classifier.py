@@ -0,0 +1,103 @@
+import os
+import re
+import json
+from functools import lru_cache
+
+# Distinct genre strings whose mood vectors are remembered, across all users
+GENRE_CACHE_SIZE = int(os.environ.get('MOOD_GENRE_CACHE_SIZE', 50000))
+# Optional JSON file replacing the keyword table: {"mood": {"keyword": weight, ...}, ...}
+MOOD_KEYWORDS_FILE = os.environ.get('MOOD_KEYWORDS_FILE')
+
+# Mood -> {keyword: weight}; a genre containing the keyword adds the weight to the mood
+DEFAULT_MOOD_KEYWORDS = {
+    'happy': {'pop': 1, 'dance': 1, 'edm': 1, 'happy': 1},
+    'angry': {'metal': 1, 'hardcore': 1, 'punk': 1, 'death': 1},
+    'sad': {'sad': 1, 'blues': 1, 'emo': 1, 'soul': 1},
+    'chill': {'chill': 1, 'ambient': 1, 'lofi': 1, 'acoustic': 1},
+}
+
+
+class MoodClassifier:
+    """
+    Scores genres against weighted mood keyword tables.
+
+    All keywords are compiled into one regex, so a genre is scanned once
+    rather than once per keyword. Each keyword counts once per genre,
+    wherever it appears, as with a plain `keyword in genre` test. A genre's
+    mood vector is memoised in a bounded LRU cache shared by every user.
+    """
+
+    def __init__(self, keywords=DEFAULT_MOOD_KEYWORDS, cache_size=GENRE_CACHE_SIZE):
+        self.moods = list(keywords)
+        self._weights = {}  # keyword -> [(mood, weight), ...]
+        for mood, table in keywords.items():
+            for keyword, weight in table.items():
+                self._weights.setdefault(keyword.lower(), []).append((mood, weight))
+
+        # Longest first, so the match at a position is the longest keyword there;
+        # any shorter keyword found at the same position is a prefix of it
+        ordered = sorted(self._weights, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(map(re.escape, ordered))) if ordered else None
+        # Only keywords that have shorter keywords as prefixes need expanding
+        self._prefixes = {}
+        for keyword in ordered:
+            prefixes = [k for k in ordered if k != keyword and keyword.startswith(k)]
+            if prefixes:
+                self._prefixes[keyword] = prefixes
+        # Mood vector of each keyword on its own
+        self._vectors = {keyword: tuple(_merge([pairs])) for keyword, pairs in self._weights.items()}
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, genre):
+        """Mood vector of one genre, as a tuple of (mood, score) pairs"""
+        if self._pattern is None:
+            return ()
+        genre = genre.lower()
+        found = set()
+        match = self._pattern.search(genre)
+        while match:
+            found.add(match.group())
+            # Resume one character in, so overlapping keywords are found too
+            match = self._pattern.search(genre, match.start() + 1)
+        for keyword in [k for k in found if k in self._prefixes]:
+            found.update(self._prefixes[keyword])
+        if len(found) <= 1:
+            return self._vectors[found.pop()] if found else ()
+        return tuple(_merge(self._vectors[keyword] for keyword in found))
+
+    def score(self, genre_counts):
+        """Mood scores for a {genre: count} mapping, in keyword-table order"""
+        mood_scores = {mood: 0 for mood in self.moods}
+        for genre, count in genre_counts.items():
+            for mood, score in self.classify(genre):
+                mood_scores[mood] += score * count
+        return mood_scores
+
+    def stats(self):
+        info = self.classify.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'genres': info.currsize,
+            'max_genres': info.maxsize,
+            'hit_ratio': round(info.hits / lookups, 3) if lookups else None,
+        }
+
+
+def _merge(vectors):
+    """Sum (mood, score) pairs per mood"""
+    scores = {}
+    for vector in vectors:
+        for mood, score in vector:
+            scores[mood] = scores.get(mood, 0) + score
+    return scores.items()
+
+
+def load_keyword_table(path):
+    """Read a {mood: {keyword: weight}} table from a JSON file"""
+    with open(path) as f:
+        return json.load(f)
+
+
+# Shared by every user in this worker
+mood_classifier = MoodClassifier(load_keyword_table(MOOD_KEYWORDS_FILE) if MOOD_KEYWORDS_FILE
+                                 else DEFAULT_MOOD_KEYWORDS)
@@ -1,3 +1,7 @@
+from .columnar import HAVE_NUMPY, ArtistColumns, obscurity_score as columnar_obscurity_score
+from .metrics import traced
+
+@traced
 def calculate_obscurity_score(spotify_client):
     """Calculate how unique/obscure the user's music taste is"""
     # Get user's top artists
@@ -6,6 +10,9 @@ def calculate_obscurity_score(spotify_client):
     # Calculate average popularity (Spotify's popularity is 0-100)
     if not top_artists['items']:
         return 50  # Default value if no artists
+    
+    if HAVE_NUMPY:
+        return columnar_obscurity_score(ArtistColumns.from_items(top_artists['items']))
         
     total_popularity = sum(artist['popularity'] for artist in top_artists['items'])
     avg_popularity = total_popularity / len(top_artists['items'])
@@ -0,0 +1,370 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialised within the process
+    fcntl = None
+
+from .columnar import np, _rank_desc
+from .history import get_listening_history
+from .streaming_history import iter_plays, MIN_MS_PLAYED
+
+PLAY_STORE_DIR = os.environ.get(
+    'PLAY_STORE_DIR', os.path.join(tempfile.gettempdir(), 'spotify_play_store'))
+# Every INDEX_STRIDE-th timestamp is kept in the time index, so a range
+# lookup reads one stride of the timestamp column instead of bisecting all of it
+INDEX_STRIDE = 4096
+# Users whose memory maps are kept open per worker
+PLAY_STORE_OPEN_USERS = int(os.environ.get('PLAY_STORE_OPEN_USERS', 256))
+MS_PER_HOUR = 3600 * 1000
+
+# Fixed-width little-endian columns, one file each
+COLUMNS = {
+    'played_at': '<i8',  # ms since the epoch, ascending
+    'track': '<i4',      # code into tracks.jsonl, -1 when the play has no track id
+    'artist': '<i4',     # code into artists.jsonl
+}
+
+
+class PlayRange:
+    """
+    A time-ordered slice of one user's plays.
+
+    The columns are views into the memory-mapped files, so slicing by date
+    copies nothing and only the pages a computation touches are read.
+    """
+
+    def __init__(self, played_at, track_codes, artist_codes, tracks, artists):
+        self.played_at = played_at
+        self.track_codes = track_codes
+        self.artist_codes = artist_codes
+        self.tracks = tracks
+        self.artists = artists
+
+    def __len__(self):
+        return len(self.played_at)
+
+    def hour_distribution(self):
+        """Plays per UTC hour, as a 24-entry array"""
+        return np.bincount((self.played_at // MS_PER_HOUR) % 24, minlength=24)
+
+    def _top(self, codes, names, top):
+        """Most frequent codes; ties go to the one played first in the range"""
+        codes = codes[codes >= 0]
+        counts = np.bincount(codes, minlength=len(names))
+        first = np.full(len(names), len(codes))
+        np.minimum.at(first, codes, np.arange(len(codes)))
+        heard = np.flatnonzero(counts)
+        heard = heard[np.argsort(first[heard], kind='stable')]
+        ranked = heard[_rank_desc(counts[heard])[:top]]
+        return [(names[code], count) for code, count in zip(ranked.tolist(), counts[ranked].tolist())]
+
+    def top_artists(self, top=5):
+        return self._top(self.artist_codes, self.artists, top)
+
+    def top_tracks(self, top=5):
+        return self._top(self.track_codes, self.tracks, top)
+
+    def summary(self, top=5):
+        """Same shape as analyze_recent_plays(), plus the number of plays"""
+        histogram = self.hour_distribution()
+        return {
+            'hour_distribution': dict(enumerate(histogram.tolist())),
+            'peak_listening_hour': int(np.argmax(histogram)) if len(self) else None,
+            'top_recent_artists': self.top_artists(top),
+            'total_plays': len(self),
+        }
+
+
+class UserPlays:
+    """All stored plays of one user plus the sparse time index over them"""
+
+    def __init__(self, columns, index, tracks, artists, synced_through=None):
+        self.columns = columns
+        self.index = index
+        self.tracks = tracks
+        self.artists = artists
+        self.synced_through = synced_through
+
+    def __len__(self):
+        return len(self.columns['played_at'])
+
+    def _position(self, ms):
+        """Index of the first play at or after ms"""
+        played_at = self.columns['played_at']
+        # index[block - 1] < ms <= index[block], so the answer lies in one stride
+        block = int(np.searchsorted(self.index, ms))
+        lo = max(block - 1, 0) * INDEX_STRIDE
+        hi = min(block * INDEX_STRIDE, len(played_at))
+        return lo + int(np.searchsorted(played_at[lo:hi], ms))
+
+    def between(self, start=None, end=None):
+        """Plays with start <= played_at < end (ms; None leaves that side open)"""
+        lo = 0 if start is None else self._position(start)
+        hi = len(self) if end is None else self._position(end)
+        hi = max(lo, hi)
+        return PlayRange(self.columns['played_at'][lo:hi], self.columns['track'][lo:hi],
+                         self.columns['artist'][lo:hi], self.tracks, self.artists)
+
+
+def _read_vocabulary(path, size):
+    """The first `size` bytes of a JSON-lines vocabulary file, as a list"""
+    if not size:
+        return []
+    with open(path, 'rb') as f:
+        # One value per line, so the lines joined with commas form a JSON array
+        return json.loads(b'[' + f.read(size).rstrip(b'\n').replace(b'\n', b',') + b']')
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared with other worker processes"""
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class PlayStore:
+    """
+    Columnar on-disk play history, one directory per user.
+
+    Each user has a fixed-width file per column (see COLUMNS), sorted by
+    played_at, plus JSON-lines vocabularies for track ids and artist names.
+    meta.json records how many rows, vocabulary bytes and index entries are
+    committed; it is replaced atomically after the data is written, so
+    readers (in any worker) never see a torn append. Plays newer than the
+    last stored one are appended in place; older ones (e.g. importing an
+    export after ingesting recent plays) rewrite the columns as a new
+    generation.
+    """
+
+    def __init__(self, root=PLAY_STORE_DIR, max_open=PLAY_STORE_OPEN_USERS):
+        self.root = root
+        self.max_open = max_open
+        self.appended = 0
+        self.rewrites = 0
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _user_dir(self, user_id):
+        return os.path.join(self.root, hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:20])
+
+    def _column_path(self, path, name, generation):
+        return os.path.join(path, f"{name}.{generation}.{COLUMNS[name][1:]}")
+
+    def _read_meta(self, path):
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'generation': 0, 'plays': 0, 'index': [], 'tracks_bytes': 0, 'artists_bytes': 0,
+                    'synced_through': None}
+
+    def _write_meta(self, path, meta):
+        tmp = os.path.join(path, f"meta.json.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, 'meta.json'))
+
+    def _load(self, path, meta):
+        plays = meta['plays']
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            if plays:
+                columns[name] = np.memmap(self._column_path(path, name, meta['generation']),
+                                          dtype=dtype, mode='r', shape=(plays,))
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        return UserPlays(
+            columns,
+            np.array(meta['index'], dtype=np.int64),
+            _read_vocabulary(os.path.join(path, 'tracks.jsonl'), meta['tracks_bytes']),
+            _read_vocabulary(os.path.join(path, 'artists.jsonl'), meta['artists_bytes']),
+            meta.get('synced_through')
+        )
+
+    def open(self, user_id):
+        """The user's plays as committed right now; reopened only after an append"""
+        path = self._user_dir(user_id)
+        try:
+            stat = os.stat(os.path.join(path, 'meta.json'))
+            version = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            version = None
+        with self._lock:
+            cached = self._views.get(path)
+            if cached is not None and cached[0] == version:
+                self._views.move_to_end(path)
+                return cached[1]
+
+        try:
+            view = self._load(path, self._read_meta(path))
+        except FileNotFoundError:  # A rewrite removed the generation we read about; read the new one
+            view = self._load(path, self._read_meta(path))
+        with self._lock:
+            self._views[path] = (version, view)
+            self._views.move_to_end(path)
+            while len(self._views) > self.max_open:
+                self._views.popitem(last=False)
+        return view
+
+    def plays(self, user_id, start=None, end=None):
+        """PlayRange of the user's plays with start <= played_at < end (ms)"""
+        return self.open(user_id).between(start, end)
+
+    def append(self, user_id, played_at, track_ids, artists, synced_through=None):
+        """
+        Add plays (parallel sequences; played_at in ms) and return how many were new.
+
+        A play is identified by its played_at, like in the listening history,
+        so re-adding a play is a no-op.
+        """
+        played_at = np.asarray(played_at, dtype=np.int64)
+        path = self._user_dir(user_id)
+        os.makedirs(path, exist_ok=True)
+        with self._write_lock, _file_lock(os.path.join(path, 'lock')):
+            meta = self._read_meta(path)
+            current = self._load(path, meta)
+            track_codes = self._extend_vocabulary(path, meta, 'tracks', current.tracks,
+                                             [track_id for track_id in track_ids if track_id is not None])
+            artist_codes = self._extend_vocabulary(path, meta, 'artists', current.artists, artists)
+            new = {
+                'played_at': played_at,
+                'track': np.array([-1 if track_id is None else track_codes[track_id] for track_id in track_ids],
+                                  dtype=np.int32),
+                'artist': np.array([artist_codes[artist] for artist in artists], dtype=np.int32),
+            }
+
+            order = np.argsort(played_at, kind='stable')
+            new = {name: column[order] for name, column in new.items()}
+            # Keep the first of several plays with the same played_at
+            keep = np.ones(len(order), dtype=bool)
+            keep[1:] = np.diff(new['played_at']) != 0
+            new = {name: column[keep] for name, column in new.items()}
+
+            stored = meta['plays']
+            existing = current.columns['played_at']
+            if not stored or not len(new['played_at']) or new['played_at'][0] > existing[-1]:
+                added = self._append_columns(path, meta, new)
+                # Earlier index entries don't move; add the ones falling in the new rows
+                first = -(-stored // INDEX_STRIDE) * INDEX_STRIDE
+                meta['index'] += new['played_at'][first - stored::INDEX_STRIDE].tolist()
+            else:
+                added, played_at = self._rewrite_columns(path, meta, current.columns, new)
+                meta['index'] = played_at[::INDEX_STRIDE].tolist()
+            if synced_through is not None:
+                meta['synced_through'] = max(meta.get('synced_through') or 0, synced_through)
+            self._write_meta(path, meta)
+            self.appended += added
+        return added
+
+    def _extend_vocabulary(self, path, meta, name, names, new_names):
+        """Codes for every name, appending unseen names to the vocabulary file"""
+        codes = {value: code for code, value in enumerate(names)}
+        unseen = []
+        for value in new_names:
+            if value not in codes:
+                codes[value] = len(codes)
+                unseen.append(value)
+        if unseen:
+            with open(os.path.join(path, f"{name}.jsonl"), 'ab') as f:
+                f.truncate(meta[f"{name}_bytes"])  # Drop anything a crashed writer left behind
+                f.write(''.join(json.dumps(value) + '\n' for value in unseen).encode('utf-8'))
+                meta[f"{name}_bytes"] = f.tell()
+        return codes
+
+    def _append_columns(self, path, meta, new):
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(path, name, meta['generation']), 'ab') as f:
+                f.truncate(meta['plays'] * np.dtype(dtype).itemsize)
+                f.write(new[name].astype(dtype).tobytes())
+        added = len(new['played_at'])
+        meta['plays'] += added
+        return added
+
+    def _rewrite_columns(self, path, meta, columns, new):
+        merged = {name: np.concatenate([columns[name], new[name]]) for name in COLUMNS}
+        order = np.argsort(merged['played_at'], kind='stable')
+        merged = {name: column[order] for name, column in merged.items()}
+        # Stored plays sort before new ones with the same played_at and win
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = np.diff(merged['played_at']) != 0
+        played_at = merged['played_at'][keep]
+        added = len(played_at) - meta['plays']
+        if not added:
+            return 0, played_at
+
+        previous = meta['generation']
+        meta['generation'] += 1
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(path, name, meta['generation']), 'wb') as f:
+                f.write(merged[name][keep].astype(dtype).tobytes())
+        meta['plays'] += added
+        # Old generation files stay readable for open memory maps until they're closed
+        for name in COLUMNS:
+            try:
+                os.remove(self._column_path(path, name, previous))
+            except FileNotFoundError:
+                pass
+        self.rewrites += 1
+        return added, played_at
+
+    def stats(self):
+        with self._lock:
+            return {'open_users': len(self._views), 'appended': self.appended, 'rewrites': self.rewrites}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_play_store():
+    """The process-wide play store, opened on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PlayStore()
+        return _store
+
+
+def sync_listening_history(user_id, store=None):
+    """Copy plays ingested into the listening history since the last sync"""
+    store = store or get_play_store()
+    rows = get_listening_history().plays(user_id, after=store.open(user_id).synced_through)
+    if not rows:
+        return 0
+    played_at, track_ids, artists = zip(*rows)
+    return store.append(user_id, played_at, track_ids, artists, synced_through=played_at[-1])
+
+
+def import_export(user_id, paths, store=None, min_ms_played=MIN_MS_PLAYED):
+    """Add the plays of Extended Streaming History files to the user's store, one file at a time"""
+    store = store or get_play_store()
+    added = 0
+    for path in paths:
+        timestamps, track_ids, artists = [], [], []
+        for play in iter_plays(path):
+            artist = play.get('master_metadata_album_artist_name')
+            if not artist or (play.get('ms_played') or 0) < min_ms_played:
+                continue
+            uri = play.get('spotify_track_uri')
+            timestamps.append(play['ts'].rstrip('Z'))
+            track_ids.append(uri.rsplit(':', 1)[-1] if uri else None)
+            artists.append(artist)
+        if timestamps:
+            played_at = np.array(timestamps, dtype='datetime64[ms]').astype(np.int64)
+            added += store.append(user_id, played_at, track_ids, artists)
+    return added
@@ -0,0 +1,267 @@
+import os
+import re
+import sys
+import hmac
+import time
+import random
+import logging
+import tempfile
+import functools
+import threading
+import contextvars
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests profiled (0 turns random sampling off)
+PROFILE_RATE = float(os.environ.get('SPOTIFY_PROFILE_RATE', 0))
+# Requests sending this value in PROFILE_HEADER are always profiled; it also
+# guards the admin endpoints. Unset disables both.
+PROFILE_TOKEN = os.environ.get('SPOTIFY_PROFILE_TOKEN') or None
+PROFILE_HEADER = 'X-Spotify-Profile'
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.environ.get('SPOTIFY_PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = os.environ.get(
+    'SPOTIFY_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'spotify_profiles'))
+# Newest profiles kept on disk (shared by every worker on the host)
+PROFILE_KEEP = int(os.environ.get('SPOTIFY_PROFILE_KEEP', 200))
+MAX_DEPTH = 128
+
+ENABLED = PROFILE_RATE > 0 or PROFILE_TOKEN is not None
+
+# <time>-<pid>-<seq>-<route>-<ms>ms.collapsed
+_PROFILE_NAME = re.compile(r'^(\d{8}T\d{6})-(\d+)-(\d+)-([\w.]+)-(\d+)ms\.collapsed$')
+
+_current = contextvars.ContextVar('spotify_profile', default=None)
+
+
+class Profile:
+    """Stack samples of the threads working on one request"""
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.monotonic()
+        self.stacks = Counter()
+        self.samples = 0
+        self.token = None  # Resets the context's current profile on stop_profile()
+        self._threads = {}  # thread ident -> [thread name, attach depth]
+        self._lock = threading.Lock()
+
+    def attach(self):
+        thread = threading.current_thread()
+        with self._lock:
+            entry = self._threads.setdefault(thread.ident, [thread.name, 0])
+            entry[1] += 1
+
+    def detach(self):
+        ident = threading.get_ident()
+        with self._lock:
+            entry = self._threads.get(ident)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._threads[ident]
+
+    def sample(self, frames):
+        with self._lock:
+            threads = [(ident, name) for ident, (name, _) in self._threads.items()]
+        for ident, name in threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                self.stacks[collapse(frame, name)] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format, readable by flamegraph.pl and speedscope"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Sampler:
+    """
+    One background thread sampling the stacks of every attached thread.
+
+    It only runs while at least one profile is active, so a worker that
+    isn't profiling pays nothing beyond the thread's idle wait.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._profiles = set()
+        self._wakeup = threading.Condition()
+        self._thread = None
+
+    def add(self, profile):
+        with self._wakeup:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='spotify-profiler', daemon=True)
+                self._thread.start()
+            self._wakeup.notify()
+
+    def remove(self, profile):
+        with self._wakeup:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            # Sampling under the lock means remove() returns only once a profile is no longer written to
+            with self._wakeup:
+                while not self._profiles:
+                    self._wakeup.wait()
+                frames = sys._current_frames()
+                for profile in self._profiles:
+                    profile.sample(frames)
+                del frames
+            time.sleep(self.interval)
+
+
+_labels = {}
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        parts = code.co_filename.replace('\\', '/').split('/')
+        label = _labels[code] = f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+    return label
+
+
+def collapse(frame, thread_name):
+    """'thread;outer (file:line);...;inner (file:line)' for a frame and its callers"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ';'.join(reversed(labels))
+
+
+sampler = Sampler()
+_seq = 0
+_seq_lock = threading.Lock()
+profile_stats = {'profiled': 0, 'written': 0}
+
+
+def wants_profile(header_value=None):
+    """Whether to profile a request: its header carries the token, or it's in the sampled fraction"""
+    if header_value and is_authorised(header_value):
+        return True
+    return PROFILE_RATE > 0 and random.random() < PROFILE_RATE
+
+
+def is_authorised(token):
+    return PROFILE_TOKEN is not None and bool(token) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def start_profile(route):
+    """Profile the current thread (and threads it hands work to via follow()) until stop_profile()"""
+    profile = Profile(route)
+    profile.attach()
+    profile.token = _current.set(profile)
+    sampler.add(profile)
+    return profile
+
+
+def stop_profile(profile):
+    """Stop sampling and write the profile; returns the file name, or None if nothing was sampled"""
+    sampler.remove(profile)
+    profile.detach()
+    _current.reset(profile.token)
+    with _seq_lock:
+        profile_stats['profiled'] += 1
+    if not profile.stacks:
+        return None
+    try:
+        return save(profile)
+    except OSError as e:
+        logger.warning("Error saving profile for %s: %s", profile.route, e)
+        return None
+
+
+def follow(fn):
+    """
+    fn wrapped so the active profile also samples the thread that runs it.
+
+    The profile is taken from where fn is wrapped (for work handed to a pool)
+    or, failing that, from where it is called.
+    """
+    if not ENABLED:
+        return fn
+    captured = _current.get()
+
+    @functools.wraps(fn)
+    def followed(*args, **kwargs):
+        profile = captured or _current.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        profile.attach()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.detach()
+    return followed
+
+
+def save(profile):
+    global _seq
+    elapsed_ms = int((time.monotonic() - profile.started) * 1000)
+    with _seq_lock:
+        _seq += 1
+        seq = _seq
+    route = re.sub(r'[^\w.]', '_', profile.route)
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{seq}-{route}-{elapsed_ms}ms.collapsed"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(profile.collapsed())
+    os.replace(path + '.tmp', path)
+    with _seq_lock:
+        profile_stats['written'] += 1
+    _prune()
+    return name
+
+
+def _saved_names():
+    """Names of the saved profiles, oldest first"""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    matches = [match for match in map(_PROFILE_NAME.match, names) if match]
+    matches.sort(key=lambda m: (m.group(1), int(m.group(2)), int(m.group(3))))
+    return [match.group(0) for match in matches]
+
+
+def _prune():
+    names = _saved_names()
+    for name in names[:max(0, len(names) - PROFILE_KEEP)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass  # Another worker pruned it first
+
+
+def list_profiles():
+    """Saved profiles, newest first"""
+    profiles = []
+    for name in reversed(_saved_names()):
+        stamp, pid, _, route, elapsed_ms = _PROFILE_NAME.match(name).groups()
+        profiles.append({'name': name, 'time': stamp, 'pid': int(pid), 'route': route,
+                         'duration_ms': int(elapsed_ms)})
+    return profiles
+
+
+def read_profile(name):
+    """Collapsed stacks of a saved profile, or None for an unknown name"""
+    if not _PROFILE_NAME.match(name):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, name), encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def profiling_stats():
+    return dict(profile_stats, enabled=ENABLED, rate=PROFILE_RATE, interval=PROFILE_INTERVAL,
+                saved=len(_saved_names()) if ENABLED else 0)
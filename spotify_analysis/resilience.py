@@ -0,0 +1,222 @@
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+
+from spotipy.exceptions import SpotifyException
+
+from .scheduler import is_rate_limited
+
+# Circuit breaker: recent calls looked at, and how many of them must be bad to open it
+BREAKER_WINDOW = int(os.environ.get('SPOTIFY_BREAKER_WINDOW', 20))
+BREAKER_MIN_CALLS = int(os.environ.get('SPOTIFY_BREAKER_MIN_CALLS', 5))
+BREAKER_FAILURE_RATIO = float(os.environ.get('SPOTIFY_BREAKER_FAILURE_RATIO', 0.5))
+# A call slower than this counts as bad even if it succeeds
+BREAKER_SLOW_CALL = float(os.environ.get('SPOTIFY_BREAKER_SLOW_CALL', 3))
+# Seconds an open breaker fails calls fast before letting one probe through
+BREAKER_COOLDOWN = float(os.environ.get('SPOTIFY_BREAKER_COOLDOWN', 30))
+
+# Start a second copy of a GET still unanswered after this many seconds (0 disables hedging)
+HEDGE_AFTER = float(os.environ.get('SPOTIFY_HEDGE_AFTER', 0))
+HEDGE_WORKERS = int(os.environ.get('SPOTIFY_HEDGE_WORKERS', 32))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(SpotifyException):
+    """Raised instead of calling Spotify while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(503, -1, "Spotify unavailable: circuit breaker open",
+                         headers={'Retry-After': str(max(1, round(retry_after)))})
+
+
+def is_upstream_failure(error):
+    """
+    Whether an exception from a Spotify call says Spotify itself is failing.
+
+    Client errors (401, 404, 429, ...) mean Spotify answered; server errors,
+    timeouts, connection failures and spotipy's header-less "Max Retries"
+    429 count against the breaker.
+    """
+    if isinstance(error, SpotifyException):
+        if error.http_status == 429:
+            return not is_rate_limited(error)
+        return not 400 <= error.http_status < 500
+    return True
+
+
+class CircuitBreaker:
+    """
+    Per-worker circuit breaker for Spotify calls.
+
+    Opens once at least min_calls of the last `window` calls were recorded
+    and failure_ratio of them failed or took longer than slow_call seconds.
+    While open every call raises CircuitOpenError without going upstream,
+    so pages fall back to cached data at once instead of waiting on
+    timeouts. After cooldown seconds one probe call is let through: if it
+    is good the breaker closes, otherwise it stays open for another cooldown.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS,
+                 failure_ratio=BREAKER_FAILURE_RATIO, slow_call=BREAKER_SLOW_CALL,
+                 cooldown=BREAKER_COOLDOWN):
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened = 0
+        self.rejected = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.calls = 0
+        self._outcomes = deque(maxlen=window)  # True for a bad call
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allows_calls(self):
+        """False while open and still cooling down; used to skip optional background calls"""
+        with self._lock:
+            return self.state != OPEN or time.monotonic() - self._opened_at >= self.cooldown
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may go upstream now.
+
+        Returns True for the half-open probe, whose outcome decides whether
+        the breaker closes; pass it on to record().
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(remaining)
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(1)
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok, elapsed, probe=False):
+        """Record the outcome of a call let through by before_call()"""
+        slow = elapsed > self.slow_call
+        bad = not ok or slow
+        with self._lock:
+            self.calls += 1
+            self.failures += not ok
+            self.slow_calls += ok and slow
+            if probe:
+                self._probing = False
+                if bad:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            if self.state != CLOSED:
+                return  # Finished after the breaker opened; the probe decides
+            self._outcomes.append(bad)
+            if (len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) >= self.failure_ratio * len(self._outcomes)):
+                self._open()
+
+    def _open(self):
+        """Caller holds _lock"""
+        self.state = OPEN
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def call(self, fn, *args, **kwargs):
+        """Run one upstream call under the breaker"""
+        probe = self.before_call()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.record(not is_upstream_failure(e), time.monotonic() - started, probe)
+            raise
+        self.record(True, time.monotonic() - started, probe)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'calls': self.calls,
+                'failures': self.failures,
+                'slow_calls': self.slow_calls,
+                'recent_bad': sum(self._outcomes),
+                'recent_calls': len(self._outcomes),
+                'retry_in': round(max(0.0, self._opened_at + self.cooldown - time.monotonic()), 3)
+                            if self.state == OPEN else 0,
+            }
+
+
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+hedge_stats = {'hedged': 0, 'hedge_won': 0}
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS,
+                                                 thread_name_prefix='spotify-hedge')
+        return _hedge_executor
+
+
+def hedged(fn, delay=None):
+    """
+    Call fn, racing a second attempt if the first is still running after delay seconds.
+
+    Only for idempotent calls. Returns the first attempt to succeed and
+    raises the first attempt's error if both fail. No hedge is sent while
+    the breaker is not closed. delay defaults to SPOTIFY_HEDGE_AFTER; with
+    delay <= 0 this is just fn().
+    """
+    if delay is None:
+        delay = HEDGE_AFTER
+    if delay <= 0:
+        return fn()
+
+    executor = _get_hedge_executor()
+    # Each attempt runs in a copy of the caller's context (e.g. its scheduler priority)
+    first = executor.submit(contextvars.copy_context().run, fn)
+    done, _ = wait([first], timeout=delay, return_when=FIRST_COMPLETED)
+    if done or spotify_breaker.state != CLOSED:
+        return first.result()
+
+    second = executor.submit(contextvars.copy_context().run, fn)
+    with _hedge_lock:
+        hedge_stats['hedged'] += 1
+    for future in as_completed([first, second]):
+        if future.exception() is None:
+            if future is second:
+                with _hedge_lock:
+                    hedge_stats['hedge_won'] += 1
+            return future.result()
+    return first.result()
+
+
+def resilience_stats():
+    with _hedge_lock:
+        hedges = dict(hedge_stats)
+    return dict(spotify_breaker.stats(), hedge_after=HEDGE_AFTER, **hedges)
+
+
+# Shared by every Spotify client in this worker
+spotify_breaker = CircuitBreaker()
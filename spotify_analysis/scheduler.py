@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+from spotipy.exceptions import SpotifyException
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Per-worker request budget: sustained calls per second and burst size
+RATE_LIMIT = float(os.environ.get('SPOTIFY_RATE_LIMIT', 20))
+RATE_BURST = int(os.environ.get('SPOTIFY_RATE_BURST', 40))
+# Give up instead of queueing an interactive call for longer than this
+MAX_WAIT = float(os.environ.get('SPOTIFY_SCHEDULER_MAX_WAIT', 10))
+MAX_THROTTLE_RETRIES = int(os.environ.get('SPOTIFY_THROTTLE_RETRIES', 3))
+DEFAULT_RETRY_AFTER = 1.0
+
+_priority = contextvars.ContextVar('spotify_request_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def background_priority():
+    """Mark Spotify calls made in this context as background work"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class RequestScheduler:
+    """
+    Token-bucket scheduler for every Spotify call made by a worker.
+
+    Calls wait for a token before going upstream. A 429 blocks the whole
+    worker until its Retry-After has passed, and the call is re-queued.
+    Background calls only get tokens while no interactive call is waiting.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, max_wait=MAX_WAIT,
+                 max_retries=MAX_THROTTLE_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.tokens = float(burst)
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.calls = 0
+        self.queued_seconds = 0.0
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_acquire(self, priority):
+        """Take a token if allowed now; otherwise return how long to wait. Caller holds _cond."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if priority == BACKGROUND and self._waiting[INTERACTIVE]:
+            return 0.05
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def _check_deadline(self, priority, started, delay):
+        if priority == INTERACTIVE and time.monotonic() - started + delay > self.max_wait:
+            raise SpotifyException(429, -1, "Spotify rate limit: request would queue too long")
+
+    def acquire(self, priority=None):
+        """Block until this call may go upstream"""
+        priority = _priority.get() if priority is None else priority
+        started = time.monotonic()
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    delay = self._try_acquire(priority)
+                    if not delay:
+                        break
+                    self._check_deadline(priority, started, delay)
+                    self._cond.wait(delay)
+            finally:
+                self._waiting[priority] -= 1
+            self.calls += 1
+            self.queued_seconds += time.monotonic() - started
+
+    def throttle(self, retry_after):
+        """Record a 429 and hold every caller until Retry-After has passed"""
+        with self._cond:
+            self.throttled += 1
+            self.throttled_seconds += retry_after
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def call(self, fn, *args, **kwargs):
+        """Run a Spotify call under the budget, re-queueing it after each 429 Spotify sent"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except SpotifyException as e:
+                if not is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                self.throttle(parse_retry_after(e.headers))
+
+    def stats(self):
+        with self._cond:
+            return {
+                'calls': self.calls,
+                'queued_seconds': round(self.queued_seconds, 3),
+                'waiting_interactive': self._waiting[INTERACTIVE],
+                'waiting_background': self._waiting[BACKGROUND],
+                'throttled_responses': self.throttled,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+                'blocked_for': round(max(0.0, self.blocked_until - time.monotonic()), 3),
+                'tokens': round(self.tokens, 2),
+            }
+
+
+def is_rate_limited(error):
+    """
+    Whether a SpotifyException is a 429 response from Spotify.
+
+    spotipy also reports a transport that ran out of retries as a 429, but
+    without response headers; that is an upstream failure, not throttling.
+    """
+    return error.http_status == 429 and bool(error.headers)
+
+
+def parse_retry_after(headers):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    value = (headers or {}).get('Retry-After')
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+# Shared by every Spotify client in this worker
+scheduler = RequestScheduler()
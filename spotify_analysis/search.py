@@ -0,0 +1,106 @@
+import os
+import bisect
+import threading
+
+from .cache import TTLCache
+from .metrics import traced
+
+SEARCH_CACHE_TTL = int(os.environ.get('SPOTIFY_SEARCH_CACHE_TTL', 3600))
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get('SPOTIFY_SEARCH_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+ARTIST_INDEX_MAX = int(os.environ.get('ARTIST_INDEX_MAX', 200000))
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a search string"""
+    return ' '.join(query.casefold().split())
+
+
+class ArtistIndex:
+    """
+    In-memory prefix index of every artist the app has seen.
+
+    Each artist is indexed under its full normalized name and under every
+    later word in it ("the beatles" is found by "the b" and by "beat"). Keys
+    live in one sorted list, so a prefix lookup is a bisect plus a short scan.
+    """
+
+    def __init__(self, max_artists=ARTIST_INDEX_MAX):
+        self.max_artists = max_artists
+        self._keys = []     # sorted (key, artist_id)
+        self._artists = {}  # artist_id -> summary dict
+        self._lock = threading.Lock()
+
+    def add(self, artist):
+        """Index a Spotify artist object (from search results or top lists)"""
+        artist_id = artist.get('id')
+        name = artist.get('name')
+        if not artist_id or not name:
+            return
+
+        images = artist.get('images') or []
+        summary = {
+            'id': artist_id,
+            'name': name,
+            'popularity': artist.get('popularity', 0),
+            'image': images[0]['url'] if images else None,
+        }
+
+        with self._lock:
+            if artist_id in self._artists:
+                self._artists[artist_id] = summary
+                return
+            if len(self._artists) >= self.max_artists:
+                return
+            self._artists[artist_id] = summary
+            words = normalize_query(name).split(' ')
+            for i in range(len(words)):
+                bisect.insort(self._keys, (' '.join(words[i:]), artist_id))
+
+    def add_many(self, artists):
+        for artist in artists:
+            self.add(artist)
+
+    def suggest(self, prefix, limit=5):
+        """Most popular indexed artists with a name (or later word) starting with prefix"""
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            start = bisect.bisect_left(self._keys, (prefix,))
+            matches = {}
+            # Look past `limit` so popular artists further down the range still win
+            for key, artist_id in self._keys[start:start + limit * 20]:
+                if not key.startswith(prefix):
+                    break
+                matches[artist_id] = self._artists[artist_id]
+
+        return sorted(matches.values(), key=lambda a: a['popularity'], reverse=True)[:limit]
+
+    def __len__(self):
+        return len(self._artists)
+
+    def stats(self):
+        with self._lock:
+            return {'artists': len(self._artists), 'keys': len(self._keys)}
+
+
+# Shared by all users: search results and artist names are not user-specific
+search_cache = TTLCache(max_bytes=SEARCH_CACHE_MAX_BYTES, default_ttl=SEARCH_CACHE_TTL)
+artist_index = ArtistIndex()
+
+
+@traced
+def search_artists(spotify_client, query, limit=5):
+    """Artist search with a shared TTL cache keyed by the normalized query"""
+    key = ('artist', normalize_query(query), limit)
+    results = search_cache.get(key)
+    if results is None:
+        results = spotify_client.search(q=query, type='artist', limit=limit)
+        search_cache.set(key, results)
+        artist_index.add_many(results.get('artists', {}).get('items', []))
+    return results
+
+
+def search_stats():
+    return {'cache': search_cache.stats(), 'index': artist_index.stats()}
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import secrets
+import sqlite3
+import logging
+import tempfile
+import threading
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from .jobs import job_queue
+
+logger = logging.getLogger(__name__)
+
+# 'sqlite' is shared by every worker on the host; 'memory' only works with a single worker
+SESSION_STORE = os.environ.get('SPOTIFY_SESSION_STORE', 'sqlite').lower()
+SESSION_DB_PATH = os.environ.get(
+    'SPOTIFY_SESSION_DB', os.path.join(tempfile.gettempdir(), 'spotify_sessions.sqlite3'))
+# Seconds a session lives without being used
+SESSION_LIFETIME = int(os.environ.get('SPOTIFY_SESSION_LIFETIME', 30 * 24 * 3600))
+# Seconds between sweeps of expired sessions
+SESSION_SWEEP_INTERVAL = int(os.environ.get('SPOTIFY_SESSION_SWEEP_INTERVAL', 600))
+
+SID_BYTES = 32
+
+
+class MemorySessionStore:
+    """Sessions kept in this process, as JSON so they behave like the SQLite store's"""
+
+    def __init__(self):
+        self._sessions = {}  # sid -> (data JSON, expires_at)
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        """(data, expires_at) for a live session, or None"""
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return json.loads(entry[0]), entry[1]
+
+    def save(self, sid, data, expires_at):
+        entry = (json.dumps(data), expires_at)
+        with self._lock:
+            self._sessions[sid] = entry
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (entry[0], expires_at)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def sweep(self):
+        """Drop expired sessions; returns how many"""
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SqliteSessionStore:
+    """
+    Sessions in a SQLite file shared by every worker on the host.
+
+    A login served by one gunicorn worker is seen by the others, and
+    sessions survive worker restarts.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        # Sessions hold OAuth tokens, so the file is private to this user (SQLite's -wal/-shm follow it)
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def _connect(self):
+        # One connection per thread; WAL lets several workers read while one writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._connect().execute(
+            "SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?",
+            (sid, time.time())).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, sid, data, expires_at):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+            (sid, json.dumps(data), expires_at))
+
+    def touch(self, sid, expires_at):
+        self._connect().execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (expires_at, sid))
+
+    def delete(self, sid):
+        self._connect().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def sweep(self):
+        return self._connect().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data held by the server; the cookie only carries `sid`"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = new
+        self.modified = False
+        # Set by clear() so the next save moves the data to a fresh id (e.g. at login)
+        self.regenerate = False
+
+    def clear(self):
+        super().clear()
+        self.regenerate = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface storing sessions in a MemorySessionStore or SqliteSessionStore"""
+
+    def __init__(self, store, lifetime=SESSION_LIFETIME, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.store = store
+        self.lifetime = lifetime
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.created = 0
+        self.swept = 0
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and len(sid) < 100:
+            entry = self.store.load(sid)
+            if entry is not None:
+                data, expires_at = entry
+                return ServerSideSession(data, sid=sid, expires_at=expires_at)
+        return ServerSideSession(sid=new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        self._maybe_sweep()
+
+        if not session:
+            if session.modified and not session.new:
+                # Emptied (e.g. logout): forget it on both sides
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        now = time.time()
+        if session.modified:
+            if session.regenerate and not session.new:
+                self.store.delete(session.sid)
+                session.sid = new_sid()
+            self.store.save(session.sid, dict(session), now + self.lifetime)
+            if session.new or session.regenerate:
+                self.created += 1
+        elif session.expires_at is not None and session.expires_at - now < self.lifetime / 2:
+            # Extend sessions in use, without a write on every request
+            self.store.touch(session.sid, now + self.lifetime)
+        else:
+            return
+
+        response.vary.add('Cookie')
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        job_queue.submit(('sessions', 'sweep'), self._sweep)
+
+    def _sweep(self):
+        removed = self.store.sweep()
+        self.swept += removed
+        return removed
+
+    def stats(self):
+        return {
+            'store': type(self.store).__name__,
+            'sessions': len(self.store),
+            'created': self.created,
+            'swept': self.swept,
+            'lifetime': self.lifetime,
+        }
+
+
+def new_sid():
+    return secrets.token_urlsafe(SID_BYTES)
+
+
+def create_session_interface(kind=SESSION_STORE):
+    """Session interface for the configured store, falling back to memory if SQLite can't be opened"""
+    if kind == 'sqlite':
+        try:
+            return ServerSideSessionInterface(SqliteSessionStore())
+        except sqlite3.Error as e:
+            logger.warning("Session database unavailable, keeping sessions in memory: %s", e)
+    return ServerSideSessionInterface(MemorySessionStore())
@@ -0,0 +1,193 @@
+import threading
+
+from .cache import user_data_cache, CACHE_TTLS
+from .search import artist_index
+from .metadata import metadata_store, PAGE_KINDS
+from .jobs import job_queue
+from .scheduler import background_priority
+from .resilience import spotify_breaker
+from .metrics import traced
+
+TIME_RANGES = ['short_term', 'medium_term', 'long_term']
+
+# Largest page Spotify returns for the top-items and recently-played endpoints
+MAX_LIMIT = 50
+
+
+class UserSnapshot:
+    """Fetch-once view of a user's Spotify data, shared by every analysis on a page.
+
+    Exposes the same methods as the spotipy client for the endpoints the
+    analysis functions use, so a snapshot can be passed anywhere a client is
+    expected. Each distinct (endpoint, time_range) is fetched once at the
+    maximum page size and sliced locally for smaller requests.
+
+    Top items and recent plays are also kept in a per-user TTL cache shared
+    across requests, so repeat page views don't go upstream until it expires.
+    Past their TTL, payloads within the cache's stale window are still served
+    straight away and refetched in a background job (stale-while-revalidate),
+    so a slow or unavailable Spotify doesn't hold up pages it has served
+    before. Pass cache=None to always fetch fresh data.
+    """
+
+    def __init__(self, spotify_client, user_info=None, cache=user_data_cache):
+        self.spotify_client = spotify_client
+        self.cache = cache
+        self.upstream_calls = 0
+        self._data = {}
+        if user_info is not None:
+            # Profile already fetched by the caller (e.g. during token validation)
+            self._data[('me',)] = user_info
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, key):
+        """Return the payload for key, going upstream on first use unless the shared cache has it"""
+        with self._lock:
+            if key in self._data:
+                return self._data[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one caller per key goes upstream; the others wait for its result
+        with key_lock:
+            with self._lock:
+                if key in self._data:
+                    return self._data[key]
+            result, fresh = self.lookup(key)
+            if result is not None and not fresh:
+                self.revalidate(key)
+            if result is None:
+                result = self.store(key, fetch_key(self.spotify_client, key))
+                with self._lock:
+                    self.upstream_calls += 1
+            with self._lock:
+                self._data[key] = result
+            return result
+
+    def _cache_key(self, key):
+        """Shared-cache key (user id, endpoint, time_range, limit), or None if not cacheable"""
+        if self.cache is None or key[0] not in CACHE_TTLS:
+            return None
+        user_id = self.me().get('id')
+        if not user_id:
+            return None
+        time_range = key[1] if len(key) > 1 else None
+        return (user_id, key[0], time_range, MAX_LIMIT)
+
+    def lookup(self, key):
+        """(payload, fresh) from the shared cache for a snapshot key; (None, False) if it has none"""
+        cache_key = self._cache_key(key)
+        if cache_key is None:
+            return None, False
+        compact, fresh = self.cache.get_stale(cache_key)
+        if compact is None:
+            return None, False
+        return metadata_store.rehydrate_page(key[0], compact), fresh
+
+    def cached(self, key):
+        """Return the fresh shared-cache payload for a snapshot key, or None"""
+        payload, fresh = self.lookup(key)
+        return payload if fresh else None
+
+    def revalidate(self, key):
+        """
+        Refetch a key in a background job, so the shared cache is fresh for the next request.
+
+        Skipped while the circuit breaker is failing calls fast.
+        """
+        cache_key = self._cache_key(key)
+        if cache_key is None or not spotify_breaker.allows_calls():
+            return
+        job_queue.submit(('revalidate',) + cache_key, self._revalidate, self.spotify_client, key)
+
+    @traced
+    def _revalidate(self, client, key):
+        with background_priority():
+            self.store(key, fetch_key(client, key))
+
+    def store(self, key, payload):
+        """
+        Save a freshly fetched payload in the shared cache.
+
+        Artists and tracks go to the shared metadata store; the per-user entry
+        only keeps their ids. Returns the payload built from the stored objects.
+        """
+        if key[0] not in PAGE_KINDS:
+            return payload
+        payload = metadata_store.intern_page(key[0], payload)
+        if key[0] == 'top_artists':
+            # Top artists also feed the type-ahead artist search
+            artist_index.add_many(payload.get('items', []))
+        cache_key = self._cache_key(key)
+        if cache_key is not None:
+            self.cache.set(cache_key, metadata_store.compact_page(key[0], payload), ttl=CACHE_TTLS[key[0]])
+        return payload
+
+    def _passthrough(self, method, *args, **kwargs):
+        """Call the underlying client directly, without caching"""
+        with self._lock:
+            self.upstream_calls += 1
+        return getattr(self.spotify_client, method)(*args, **kwargs)
+
+    def me(self):
+        return self._fetch(('me',))
+
+    def current_user(self):
+        return self.me()
+
+    def current_user_top_artists(self, limit=20, offset=0, time_range='medium_term'):
+        if offset + limit > MAX_LIMIT:
+            return self._passthrough('current_user_top_artists',
+                                     limit=limit, offset=offset, time_range=time_range)
+        results = self._fetch(('top_artists', time_range))
+        return _slice_page(results, offset, limit)
+
+    def current_user_top_tracks(self, limit=20, offset=0, time_range='medium_term'):
+        if offset + limit > MAX_LIMIT:
+            return self._passthrough('current_user_top_tracks',
+                                     limit=limit, offset=offset, time_range=time_range)
+        results = self._fetch(('top_tracks', time_range))
+        return _slice_page(results, offset, limit)
+
+    def current_user_recently_played(self, limit=50, after=None, before=None):
+        # Cursor queries are not part of the shared page data
+        if after is not None or before is not None or limit > MAX_LIMIT:
+            return self._passthrough('current_user_recently_played',
+                                     limit=limit, after=after, before=before)
+        results = self._fetch(('recently_played',))
+        return _slice_page(results, 0, limit)
+
+    def __getattr__(self, name):
+        # Any other client method is forwarded as-is and counted
+        if name.startswith('_') or name == 'spotify_client':
+            raise AttributeError(name)
+        attr = getattr(self.spotify_client, name)
+        if not callable(attr):
+            return attr
+
+        def counted(*args, **kwargs):
+            return self._passthrough(name, *args, **kwargs)
+        return counted
+
+
+def fetch_key(client, key):
+    """Fetch a snapshot key from a spotipy client, at the maximum page size"""
+    endpoint = key[0]
+    if endpoint == 'me':
+        return client.me()
+    if endpoint == 'top_artists':
+        return client.current_user_top_artists(limit=MAX_LIMIT, time_range=key[1])
+    if endpoint == 'top_tracks':
+        return client.current_user_top_tracks(limit=MAX_LIMIT, time_range=key[1])
+    if endpoint == 'recently_played':
+        return client.current_user_recently_played(limit=MAX_LIMIT)
+    raise ValueError(f"Unknown snapshot key: {key}")
+
+
+def _slice_page(results, offset, limit):
+    """Return a copy of a paging object holding items[offset:offset + limit]"""
+    page = dict(results)
+    page['items'] = results['items'][offset:offset + limit]
+    page['limit'] = limit
+    page['offset'] = offset
+    return page
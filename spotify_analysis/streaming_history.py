@@ -0,0 +1,198 @@
+import os
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from .search import search_artists
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# A single play is ~1 KB; anything this large means the file is malformed
+MAX_PLAY_SIZE = 1024 * 1024
+# Plays shorter than this don't count as a stream (Spotify's own threshold)
+MIN_MS_PLAYED = 30000
+
+_decoder = json.JSONDecoder()
+
+
+class StreamingHistoryError(ValueError):
+    """The file is not a JSON array of objects"""
+
+
+def iter_plays(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield the play objects of one Extended Streaming History file.
+
+    Each file (Streaming_History_Audio_*.json) is one JSON array of plays and
+    can be gigabytes. It is read in chunks and decoded one play at a time,
+    so memory stays bounded by the chunk size, not the file size.
+    """
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        # Leading whitespace may run past the first chunk
+        while not buffer:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer = chunk.lstrip()
+        if not buffer.startswith('['):
+            raise StreamingHistoryError(f"{path}: expected a JSON array")
+        pos = 1
+        eof = False
+        while True:
+            # Skip whitespace and the comma between elements
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer, pos, eof = _refill(f, buffer, pos, chunk_size)
+
+            if pos >= len(buffer):
+                raise StreamingHistoryError(f"{path}: unexpected end of file")
+            if buffer[pos] == ']':
+                return
+
+            try:
+                play, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or len(buffer) - pos > MAX_PLAY_SIZE:
+                    raise StreamingHistoryError(f"{path}: malformed play")
+                # The object continues in the next chunk
+                buffer, pos, eof = _refill(f, buffer, pos, chunk_size)
+                continue
+            pos = end
+            yield play
+
+
+def _refill(f, buffer, pos, chunk_size):
+    """Drop consumed text and append the next chunk; returns (buffer, pos, eof)"""
+    chunk = f.read(chunk_size)
+    return buffer[pos:] + chunk, 0, not chunk
+
+
+class HistoryAggregate:
+    """
+    Running totals over a stream of plays, mergeable across files.
+
+    Holds the same aggregates analyze_recent_plays() reports (plays per UTC
+    hour, plays per artist in first-heard order) plus play time.
+    """
+
+    def __init__(self):
+        self.hour_counts = [0] * 24
+        self.artist_counts = {}
+        self.plays = 0
+        self.ms_played = 0
+        self.skipped = 0  # podcasts, short plays
+        self.first_ts = None
+        self.last_ts = None
+
+    def add(self, play, min_ms_played=MIN_MS_PLAYED):
+        artist = play.get('master_metadata_album_artist_name')
+        ms_played = play.get('ms_played') or 0
+        if not artist or ms_played < min_ms_played:
+            self.skipped += 1
+            return
+
+        ts = play['ts']
+        self.hour_counts[int(ts.split('T')[1].split(':')[0])] += 1
+        self.artist_counts[artist] = self.artist_counts.get(artist, 0) + 1
+        self.plays += 1
+        self.ms_played += ms_played
+        # ISO 8601 UTC timestamps compare correctly as strings
+        if self.first_ts is None or ts < self.first_ts:
+            self.first_ts = ts
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+    def merge(self, other):
+        for hour, count in enumerate(other.hour_counts):
+            self.hour_counts[hour] += count
+        for artist, count in other.artist_counts.items():
+            self.artist_counts[artist] = self.artist_counts.get(artist, 0) + count
+        self.plays += other.plays
+        self.ms_played += other.ms_played
+        self.skipped += other.skipped
+        if other.first_ts and (self.first_ts is None or other.first_ts < self.first_ts):
+            self.first_ts = other.first_ts
+        if other.last_ts and (self.last_ts is None or other.last_ts > self.last_ts):
+            self.last_ts = other.last_ts
+        return self
+
+    def recent_plays_summary(self, top=5):
+        """Same shape as analyze_recent_plays(), over the whole export"""
+        hour_distribution = dict(enumerate(self.hour_counts))
+        return {
+            'hour_distribution': hour_distribution,
+            'peak_listening_hour': max(hour_distribution.items(), key=lambda x: x[1])[0] if self.plays else None,
+            'top_recent_artists': sorted(self.artist_counts.items(), key=lambda x: x[1], reverse=True)[:top],
+            'total_plays': self.plays,
+            'hours_played': round(self.ms_played / 3600000, 1),
+            'since': self.first_ts,
+            'until': self.last_ts,
+        }
+
+    def genre_distribution(self, artist_genres, top=20):
+        """
+        Same shape as analyze_genre_distribution(), with genres weighted by plays.
+
+        The export has no genres; artist_genres maps artist name -> list of
+        genres (e.g. from resolve_artist_genres()). Unknown artists are left out.
+        """
+        genre_counts = {}
+        for artist, plays in self.artist_counts.items():
+            for genre in artist_genres.get(artist) or []:
+                genre_counts[genre] = genre_counts.get(genre, 0) + plays
+        total_genres = sum(genre_counts.values())
+
+        genre_percentages = {genre: (count / total_genres) * 100
+                             for genre, count in genre_counts.items()}
+        return {
+            'genre_counts': genre_counts,
+            'genre_percentages': genre_percentages,
+            'sorted_genres': sorted(genre_percentages.items(), key=lambda x: x[1], reverse=True)[:top]
+        }
+
+
+def aggregate_file(path, min_ms_played=MIN_MS_PLAYED):
+    """Stream one export file into a HistoryAggregate"""
+    aggregate = HistoryAggregate()
+    for play in iter_plays(path):
+        aggregate.add(play, min_ms_played)
+    return aggregate
+
+
+def import_streaming_history(paths, workers=None, min_ms_played=MIN_MS_PLAYED):
+    """
+    Aggregate several export files in parallel, one process per file.
+
+    Results are merged in path order, so artist ties rank the same way on
+    every run. workers=0 runs in the current process.
+    """
+    paths = list(paths)
+    if workers == 0 or len(paths) <= 1:
+        aggregates = [aggregate_file(path, min_ms_played) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1)) as pool:
+            aggregates = list(pool.map(aggregate_file, paths, [min_ms_played] * len(paths)))
+
+    total = HistoryAggregate()
+    for aggregate in aggregates:
+        total.merge(aggregate)
+    return total
+
+
+def resolve_artist_genres(spotify_client, artist_names):
+    """Genres for artists named in an export, via the (cached) artist search"""
+    genres = {}
+    for name in artist_names:
+        try:
+            items = search_artists(spotify_client, name, limit=1).get('artists', {}).get('items', [])
+        except Exception as e:
+            logger.warning("Error looking up genres for %s: %s", name, e)
+            continue
+        if items:
+            genres[name] = items[0].get('genres', [])
+    return genres
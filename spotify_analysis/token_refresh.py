@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # No cross-worker locking on platforms without flock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Refresh synchronously when the token has less than this many seconds left...
+REFRESH_MARGIN = 60
+# ...and in the background when it has less than this many
+PROACTIVE_REFRESH_WINDOW = int(os.environ.get('SPOTIFY_PROACTIVE_REFRESH_SECONDS', 300))
+
+# Directory for per-token lock and result files shared by all workers on the host
+REFRESH_LOCK_DIR = os.environ.get('SPOTIFY_REFRESH_LOCK_DIR')
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TokenRefresher:
+    """
+    Single-flight OAuth token refresh, keyed by refresh token.
+
+    Concurrent callers refreshing the same token wait on one in-flight
+    refresh and share its result. Recent results are remembered, so a
+    request still carrying the old token (e.g. an old session cookie) picks
+    up the new one instead of refreshing again. With a lock directory,
+    workers on the same host also coalesce through flock and a shared
+    result file.
+    """
+
+    def __init__(self, refresh_fn, lock_dir=REFRESH_LOCK_DIR):
+        self.refresh_fn = refresh_fn  # callable(refresh_token) -> token_info
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.refreshes = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._results = {}  # refresh token -> newest token_info
+        self._lock = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='token-refresh')
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, mode=0o700, exist_ok=True)
+
+    def peek(self, refresh_token):
+        """Newest token_info already obtained for this refresh token, if still usable"""
+        with self._lock:
+            token_info = self._results.get(refresh_token)
+        if token_info and token_info['expires_at'] - time.time() > REFRESH_MARGIN:
+            return token_info
+        return None
+
+    def refresh(self, refresh_token, stale_access_token=None):
+        """
+        Return a fresh token_info for refresh_token, sharing any refresh in flight.
+
+        stale_access_token is the token the caller saw rejected or about to
+        expire; a remembered result carrying that same token is not reused.
+        """
+        known = self.peek(refresh_token)
+        if known and known['access_token'] != stale_access_token:
+            return known
+
+        with self._lock:
+            flight = self._flights.get(refresh_token)
+            leader = flight is None
+            if leader:
+                flight = self._flights[refresh_token] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._refresh_shared(refresh_token, stale_access_token)
+            with self._lock:
+                self._prune_results()
+                self._results[refresh_token] = flight.result
+                self.refreshes += 1
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[refresh_token]
+            flight.done.set()
+
+    def _prune_results(self):
+        now = time.time()
+        for key in [key for key, token_info in self._results.items() if token_info['expires_at'] <= now]:
+            del self._results[key]
+
+    def refresh_in_background(self, refresh_token, stale_access_token):
+        """
+        Start a refresh without waiting for it; no-op if one is already running.
+
+        stale_access_token is the caller's token that is close to expiry; as in
+        refresh(), a remembered or shared result carrying it is not reused.
+        """
+        with self._lock:
+            if refresh_token in self._flights:
+                return
+        self._background.submit(self._background_refresh, refresh_token, stale_access_token)
+
+    def _background_refresh(self, refresh_token, stale_access_token):
+        try:
+            self.refresh(refresh_token, stale_access_token)
+        except Exception as e:
+            logger.warning("Background token refresh failed: %s", e)
+
+    def _refresh_shared(self, refresh_token, stale_access_token):
+        """Refresh under the cross-worker file lock when one is configured"""
+        if not self.lock_dir:
+            return self.refresh_fn(refresh_token)
+
+        name = hashlib.sha256(refresh_token.encode()).hexdigest()
+        lock_path = os.path.join(self.lock_dir, name + '.lock')
+        result_path = os.path.join(self.lock_dir, name + '.json')
+
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another worker may have refreshed while we waited for the lock
+                shared = _read_token_file(result_path)
+                if (shared and shared['access_token'] != stale_access_token
+                        and shared['expires_at'] - time.time() > REFRESH_MARGIN):
+                    return shared
+
+                token_info = self.refresh_fn(refresh_token)
+                _write_token_file(result_path, token_info)
+                return token_info
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'refreshes': self.refreshes,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights),
+            }
+
+
+def _read_token_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_token_file(path, token_info):
+    tmp_path = path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(token_info, f)
+    os.replace(tmp_path, path)
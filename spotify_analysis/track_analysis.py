@@ -1,4 +1,15 @@
+import logging
+from datetime import timezone
+from .feature_store import get_feature_store
+from .mood_classifier import mood_classifier
+from .columnar import HAVE_NUMPY, PlayColumns, recent_plays_summary
+from .history import get_listening_history
+from .play_store import get_play_store, sync_listening_history
+from .metrics import traced
 
+logger = logging.getLogger(__name__)
+
+@traced
 def analyze_music_mood(spotify_client, time_range='medium_term'):
     """Analyze the 'mood' of your music based on genres instead of audio features"""
     tracks = get_top_tracks(spotify_client, time_range=time_range, limit=50)
@@ -12,33 +23,8 @@ def analyze_music_mood(spotify_client, time_range='medium_term'):
         for genre in artist['genres']:
             genres[genre] = genres.get(genre, 0) + 1
     
-    # Analyze mood based on genre keywords
-    happy_keywords = ['pop', 'dance', 'edm', 'happy']
-    angry_keywords = ['metal', 'hardcore', 'punk', 'death']
-    sad_keywords = ['sad', 'blues', 'emo', 'soul']
-    chill_keywords = ['chill', 'ambient', 'lofi', 'acoustic']
-    
-    mood_scores = {
-        'happy': 0,
-        'angry': 0,
-        'sad': 0,
-        'chill': 0
-    }
-    
-    # Calculate mood scores based on genre keywords
-    for genre, count in genres.items():
-        for keyword in happy_keywords:
-            if keyword in genre.lower():
-                mood_scores['happy'] += count
-        for keyword in angry_keywords:
-            if keyword in genre.lower():
-                mood_scores['angry'] += count
-        for keyword in sad_keywords:
-            if keyword in genre.lower():
-                mood_scores['sad'] += count
-        for keyword in chill_keywords:
-            if keyword in genre.lower():
-                mood_scores['chill'] += count
+    # Calculate mood scores based on genre keywords (one cached lookup per genre)
+    mood_scores = mood_classifier.score(genres)
     
     # Determine dominant mood
     dominant_mood = max(mood_scores.items(), key=lambda x: x[1])[0] if any(mood_scores.values()) else 'balanced'
@@ -53,7 +39,7 @@ def analyze_music_mood(spotify_client, time_range='medium_term'):
     }
     
     return {
-        'mood': mood_descriptions[dominant_mood],
+        'mood': mood_descriptions.get(dominant_mood, dominant_mood.title()),
         'genre_analysis': {
             'top_genres': sorted(genres.items(), key=lambda x: x[1], reverse=True)[:5],
             'mood_scores': mood_scores
@@ -61,6 +47,7 @@ def analyze_music_mood(spotify_client, time_range='medium_term'):
         'danceability_interpretation': "Likely danceable" if dominant_mood in ['happy', 'chill'] else "Less danceable"
     }
 
+@traced
 def get_top_tracks(spotify_client, time_range='medium_term', limit=20):
     """Get user's top tracks with audio features"""
     results = spotify_client.current_user_top_tracks(time_range=time_range, limit=limit)
@@ -78,65 +65,49 @@ def get_top_tracks(spotify_client, time_range='medium_term', limit=20):
     
     return tracks_data
 
+@traced
 def get_top_tracks_with_audio_features(spotify_client, time_range='medium_term', limit=20):
-    """Get user's top tracks with audio features - safely handles API limits"""
+    """Get user's top tracks with audio features - served from the shared feature store"""
     results = spotify_client.current_user_top_tracks(time_range=time_range, limit=limit)
+    items = results['items'][:limit]
     
-    tracks_data = []
-    batch_size = 5  # Process in small batches to avoid API limitations
+    try:
+        # Only tracks no user has looked up before go upstream, 100 ids per call
+        features_by_id = get_feature_store().get_features(spotify_client, [item['id'] for item in items])
+    except Exception as e:
+        logger.warning("Error fetching audio features: %s", e)
+        features_by_id = {}
     
-    for i in range(0, min(len(results['items']), limit), batch_size):
-        batch_items = results['items'][i:i+batch_size]
-        track_ids = [item['id'] for item in batch_items]
-        
-        try:
-            audio_features = spotify_client.audio_features(track_ids)
-            
-            # Process this batch of tracks with their audio features
-            for j, (item, features) in enumerate(zip(batch_items, audio_features)):
-                if features:  # Check if features is not None
-                    track_info = {
-                        'rank': i + j + 1,
-                        'title': item['name'],
-                        'artist': item['artists'][0]['name'],
-                        'album': item['album']['name'],
-                        'popularity': item['popularity'],
-                        'danceability': features['danceability'],
-                        'energy': features['energy'],
-                        'tempo': int(features['tempo']),
-                        'valence': features['valence']
-                    }
-                else:
-                    # Use basic info if audio features aren't available
-                    track_info = {
-                        'rank': i + j + 1,
-                        'title': item['name'],
-                        'artist': item['artists'][0]['name'],
-                        'album': item['album']['name'],
-                        'popularity': item['popularity']
-                    }
-                tracks_data.append(track_info)
-        
-        except Exception as e:
-            print(f"Error fetching audio features: {e}")
-            # Add tracks with basic info when audio features fail
-            for j, item in enumerate(batch_items):
-                track_info = {
-                    'rank': i + j + 1,
-                    'title': item['name'],
-                    'artist': item['artists'][0]['name'],
-                    'album': item['album']['name'],
-                    'popularity': item['popularity']
-                }
-                tracks_data.append(track_info)
+    tracks_data = []
+    for i, item in enumerate(items):
+        track_info = {
+            'rank': i + 1,
+            'title': item['name'],
+            'artist': item['artists'][0]['name'],
+            'album': item['album']['name'],
+            'popularity': item['popularity']
+        }
+        features = features_by_id.get(item['id'])
+        if features:  # Use basic info if audio features aren't available
+            track_info.update({
+                'danceability': features['danceability'],
+                'energy': features['energy'],
+                'tempo': int(features['tempo']),
+                'valence': features['valence']
+            })
+        tracks_data.append(track_info)
     
     return tracks_data
 
+@traced
 def analyze_recent_plays(spotify_client, limit=50):
     """Analyze recently played tracks"""
     try:
         results = spotify_client.current_user_recently_played(limit=limit)
         
+        if HAVE_NUMPY:
+            return recent_plays_summary(PlayColumns.from_items(results['items']))
+        
         # Analyze by time of day
         hour_distribution = {i: 0 for i in range(24)}
         artist_frequency = {}
@@ -162,4 +133,46 @@ def analyze_recent_plays(spotify_client, limit=50):
             'hour_distribution': {},
             'peak_listening_hour': None,
             'top_recent_artists': []
-        }
\ No newline at end of file
+        }
+
+def _epoch_ms(moment):
+    """Milliseconds since the epoch for a datetime; naive datetimes are taken as UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+def analyze_play_history(user_id, start=None, end=None, top=5):
+    """
+    Analyze a user's stored plays between two datetimes (end exclusive, None = open),
+    e.g. the listening hours of 2025 or the top artists of the last 90 days
+    """
+    start_ms = None if start is None else _epoch_ms(start)
+    end_ms = None if end is None else _epoch_ms(end)
+    try:
+        if HAVE_NUMPY:
+            # Slices the memory-mapped columns; only the range's pages are read
+            sync_listening_history(user_id)
+            return get_play_store().plays(user_id, start_ms, end_ms).summary(top)
+        
+        rows = get_listening_history().plays(
+            user_id, after=None if start_ms is None else start_ms - 1, before=end_ms)
+        hour_distribution = {i: 0 for i in range(24)}
+        artist_frequency = {}
+        for played_at, track_id, artist in rows:
+            hour_distribution[(played_at // 3600000) % 24] += 1
+            artist_frequency[artist] = artist_frequency.get(artist, 0) + 1
+        
+        return {
+            'hour_distribution': hour_distribution,
+            'peak_listening_hour': max(hour_distribution.items(), key=lambda x: x[1])[0] if rows else None,
+            'top_recent_artists': sorted(artist_frequency.items(), key=lambda x: x[1], reverse=True)[:top],
+            'total_plays': len(rows)
+        }
+    except Exception as e:
+        logger.warning("Error analyzing play history: %s", e)
+        return {
+            'hour_distribution': {},
+            'peak_listening_hour': None,
+            'top_recent_artists': [],
+            'total_plays': 0
+        }
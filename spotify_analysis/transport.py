@@ -0,0 +1,88 @@
+import os
+import threading
+
+import requests
+import urllib3
+
+# Spotify Web API and accounts service; benchmarks point these at a local fake (benchmarks/fake_spotify.py)
+API_PREFIX = os.environ.get('SPOTIFY_API_URL', 'https://api.spotify.com/v1/')
+ACCOUNTS_URL = os.environ.get('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com')
+
+# Per-worker connection pool shared by every per-user Spotify client
+POOL_SIZE = int(os.environ.get('SPOTIFY_POOL_SIZE', 20))
+HTTP_RETRIES = int(os.environ.get('SPOTIFY_HTTP_RETRIES', 3))
+RETRY_BACKOFF = float(os.environ.get('SPOTIFY_RETRY_BACKOFF', 0.3))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return the process-wide keep-alive requests.Session for api.spotify.com.
+
+    Only the Authorization header differs between users, and spotipy sends
+    it per request, so one pooled session can serve every client in the
+    worker and TLS connections are reused instead of re-handshaked.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+def is_shared_session(session):
+    return session is not None and session is _session
+
+
+def _build_session():
+    # spotipy's retry policy, minus 429: rate limiting is handled by the
+    # shared RequestScheduler so one Retry-After pauses the whole worker.
+    # Once 5xx retries run out the last response is returned rather than
+    # raising RetryError, which spotipy would report as a header-less 429;
+    # callers (and the circuit breaker) see the real 5xx instead.
+    retry = urllib3.Retry(
+        total=HTTP_RETRIES,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=HTTP_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(500, 502, 503, 504),
+        raise_on_status=False,
+        respect_retry_after_header=False)
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=POOL_SIZE,
+        max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def pool_stats():
+    """Connection reuse and utilisation for each host the shared session talks to"""
+    if _session is None:
+        return {}
+
+    stats = {}
+    adapter = _session.get_adapter('https://')
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        # The pool queue holds idle connections plus empty slots; the rest are in use
+        in_use = pool.pool.maxsize - pool.pool.qsize() if pool.pool is not None else 0
+        stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+            'max_size': pool.pool.maxsize if pool.pool is not None else 0,
+            'in_use': in_use,
+            'connections_opened': pool.num_connections,
+            'requests': pool.num_requests,
+            'reuse_ratio': round(1 - pool.num_connections / pool.num_requests, 3) if pool.num_requests else None,
+        }
+    return stats
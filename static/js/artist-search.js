@@ -8,12 +8,27 @@ document.addEventListener('DOMContentLoaded', function() {
     const searchForm = document.getElementById('artistSearchForm');
     const searchInput = document.getElementById('artistSearchInput');
     const resultsContainer = document.getElementById('searchResults');
+    const suggestionList = document.getElementById('artistSuggestions');
+    
+    // Suggested artist name -> id, so picking a suggestion skips the search call
+    let suggestedArtists = {};
+    let suggestTimer = null;
     
     if (!searchForm) {
         console.error("Search form not found in the DOM");
         return;
     }
     
+    // Type-ahead: suggestions come from the server's local artist index
+    searchInput.addEventListener('input', function() {
+        clearTimeout(suggestTimer);
+        const prefix = searchInput.value.trim();
+        if (!prefix || !suggestionList) {
+            return;
+        }
+        suggestTimer = setTimeout(() => suggestArtists(prefix), 150);
+    });
+    
     // Form submission handler
     searchForm.addEventListener('submit', function(event) {
         event.preventDefault();
@@ -22,13 +37,34 @@ document.addEventListener('DOMContentLoaded', function() {
         const query = searchInput.value.trim();
         console.log("Search query:", query);
         
-        if (query) {
+        if (query && suggestedArtists[query]) {
+            getArtistDetails(suggestedArtists[query]);
+        } else if (query) {
             searchArtist(query);
         } else {
             console.error("Empty search query");
         }
     });
     
+    async function suggestArtists(prefix) {
+        try {
+            const response = await fetch(`/api/suggest-artist?prefix=${encodeURIComponent(prefix)}`);
+            const data = await response.json();
+            const artists = data.artists || [];
+            
+            suggestedArtists = {};
+            suggestionList.innerHTML = '';
+            artists.forEach(artist => {
+                suggestedArtists[artist.name] = artist.id;
+                const option = document.createElement('option');
+                option.value = artist.name;
+                suggestionList.appendChild(option);
+            });
+        } catch (error) {
+            console.error("Suggestion error:", error);
+        }
+    }
+    
     async function searchArtist(query) {
         console.log("Searching for artist:", query);
         // Show loading state
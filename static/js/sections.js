@@ -0,0 +1,134 @@
+// Page sections: charts drawn from section data, and progressive loading of
+// the sections a page shell left as placeholders (.section-slot.pending)
+
+function featurePercent(mood, feature) {
+    return feature in mood ? mood[feature] * 100 : 50;
+}
+
+function drawAudioFeaturesChart(mood) {
+    const radarCtx = document.getElementById('audioFeaturesChart').getContext('2d');
+    new Chart(radarCtx, {
+        type: 'radar',
+        data: {
+            labels: ['Energy', 'Danceability', 'Acousticness', 'Instrumentalness', 'Valence', 'Tempo'],
+            datasets: [{
+                label: 'Your Music',
+                data: [
+                    featurePercent(mood, 'average_energy'),
+                    featurePercent(mood, 'average_danceability'),
+                    featurePercent(mood, 'average_acousticness'),
+                    featurePercent(mood, 'average_instrumentalness'),
+                    featurePercent(mood, 'average_valence'),
+                    'average_tempo' in mood ? mood.average_tempo / 200 * 100 : 50
+                ],
+                fill: true,
+                backgroundColor: 'rgba(29, 185, 84, 0.2)',
+                borderColor: '#1DB954',
+                pointBackgroundColor: '#1DB954',
+                pointBorderColor: '#fff',
+                pointHoverBackgroundColor: '#fff',
+                pointHoverBorderColor: '#1DB954',
+                pointRadius: 4
+            }]
+        },
+        options: {
+            scales: {
+                r: {
+                    beginAtZero: true,
+                    max: 100,
+                    ticks: {
+                        display: false
+                    }
+                }
+            },
+            plugins: {
+                legend: {
+                    display: false
+                }
+            }
+        }
+    });
+}
+
+function drawListeningClock(recent) {
+    // Plays per 3-hour block, from the per-hour distribution
+    const hours = recent.hour_distribution || {};
+    const blocks = [0, 1, 2, 3, 4, 5, 6, 7].map(block =>
+        (hours[block * 3] || 0) + (hours[block * 3 + 1] || 0) + (hours[block * 3 + 2] || 0));
+
+    const clockCtx = document.getElementById('listeningClockChart').getContext('2d');
+    new Chart(clockCtx, {
+        type: 'bar',
+        data: {
+            labels: ['12am', '3am', '6am', '9am', '12pm', '3pm', '6pm', '9pm'],
+            datasets: [{
+                label: 'Listening Activity',
+                data: blocks,
+                backgroundColor: '#1DB954'
+            }]
+        },
+        options: {
+            responsive: true,
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    title: {
+                        display: true,
+                        text: 'Number of Plays'
+                    }
+                },
+                x: {
+                    title: {
+                        display: true,
+                        text: 'Time of Day'
+                    }
+                }
+            },
+            plugins: {
+                legend: {
+                    display: false
+                }
+            }
+        }
+    });
+}
+
+function loadSections(page, handlers, sectionData) {
+    // Sections rendered with the page: hand their data straight to the handlers
+    Object.entries(sectionData).forEach(([name, data]) => {
+        if (data !== null && handlers[name]) {
+            handlers[name](data);
+        }
+    });
+
+    // Sections left as placeholders: fetch each one independently
+    const pending = new Set();
+    document.querySelectorAll('.section-slot.pending').forEach(slot => {
+        pending.add(slot.dataset.slot.split('__')[0]);
+    });
+
+    pending.forEach(async name => {
+        const slots = document.querySelectorAll(`.section-slot[data-slot^="${name}__"]`);
+        try {
+            const response = await fetch(`/api/section/${encodeURIComponent(name)}?page=${encodeURIComponent(page)}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const section = await response.json();
+
+            slots.forEach(slot => {
+                slot.innerHTML = section.fragments[slot.dataset.slot] || '';
+                slot.classList.remove('pending');
+            });
+            if (handlers[name]) {
+                handlers[name](section.data);
+            }
+        } catch (error) {
+            console.error(`Error loading section ${name}:`, error);
+            slots.forEach(slot => {
+                slot.classList.remove('pending');
+                slot.classList.add('failed');
+            });
+        }
+    });
+}
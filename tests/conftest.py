@@ -0,0 +1,2 @@
+# Configures the app for tests before any test module imports it; see support.py
+import support  # noqa: F401
@@ -0,0 +1,41 @@
+"""
+Test settings shared by every test module, applied before the app is imported.
+
+Settings are read when spotify_analysis modules are first imported, so
+conftest.py imports this module ahead of the tests. The app talks to a
+local fake Spotify (benchmarks/fake_spotify.py) and keeps its stores in a
+scratch directory.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from fake_spotify import FakeSpotify  # noqa: E402
+
+SCRATCH = tempfile.mkdtemp(prefix='spotify-tests-')
+# spotipy's token cache file is written to the working directory; keep it out of the repo
+os.chdir(SCRATCH)
+
+# Shared by the app-level tests; reset its counters with fake_spotify.calls.clear()
+fake_spotify = FakeSpotify().start()
+
+os.environ.update({
+    'SPOTIFY_API_URL': f"{fake_spotify.url}/v1/",
+    'SPOTIFY_ACCOUNTS_URL': fake_spotify.url,
+    'SPOTIFY_CLIENT_ID': 'test-client',
+    'SPOTIFY_CLIENT_SECRET': 'test-secret',
+    'SPOTIFY_REDIRECT_URI': 'http://localhost/callback',
+    'SECRET_KEY': 'test-secret-key',
+    'SPOTIFY_SESSION_STORE': 'memory',
+    'LISTENING_HISTORY_DB': os.path.join(SCRATCH, 'history.sqlite3'),
+    'PLAY_STORE_DIR': os.path.join(SCRATCH, 'plays'),
+    'AUDIO_FEATURES_DB': os.path.join(SCRATCH, 'features.sqlite3'),
+    'SPOTIFY_REFRESH_LOCK_DIR': os.path.join(SCRATCH, 'locks'),
+    'SPOTIFY_PROFILE_DIR': os.path.join(SCRATCH, 'profiles'),
+    # No transport backoff, so exhausted retries are quick
+    'SPOTIFY_RETRY_BACKOFF': '0',
+})
@@ -0,0 +1,107 @@
+"""
+Artist details: batched metadata, fanned-out top tracks and albums, the shared cache and ETags.
+
+    python -m pytest tests
+"""
+import unittest
+from unittest import mock
+
+from support import fake_spotify
+
+import app as app_module
+from spotify_analysis import artist_details
+from spotify_analysis.artist_details import get_artists_details, MAX_BATCH
+from spotify_analysis.cache import TTLCache
+from spotify_analysis.client import SpotifyClient
+
+from test_pages import log_in
+
+
+class FreshCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = TTLCache()
+        patch = mock.patch.object(artist_details, 'artist_cache', self.cache)
+        patch.start()
+        self.addCleanup(patch.stop)
+        fake_spotify.wait_idle(quiet=0.2)
+        self.before = fake_spotify.call_counts()
+
+    def upstream(self):
+        calls = fake_spotify.call_counts()
+        calls.subtract(self.before)
+        return +calls
+
+
+class GetArtistsDetailsTest(FreshCacheTest):
+    def setUp(self):
+        super().setUp()
+        self.client = SpotifyClient(auth='bench-token-details')
+
+    def test_one_metadata_call_for_the_batch(self):
+        ids = ['a11', 'a12', 'a13', 'a11']
+        details, errors = get_artists_details(self.client, ids)
+        self.assertEqual(errors, {})
+        self.assertEqual(list(details), ['a11', 'a12', 'a13'])
+        self.assertEqual(details['a12']['artist']['id'], 'a12')
+        self.assertEqual(len(details['a12']['top_tracks']['tracks']), 10)
+        self.assertEqual(self.upstream(), {'artists': 1, 'artists/{id}/top-tracks': 3, 'artists/{id}/albums': 3})
+
+    def test_cached_artists_are_not_fetched_again(self):
+        get_artists_details(self.client, ['a21', 'a22'])
+        self.before = fake_spotify.call_counts()
+        details, _ = get_artists_details(self.client, ['a22', 'a21', 'a23'])
+        self.assertEqual(set(details), {'a21', 'a22', 'a23'})
+        self.assertEqual(self.upstream(), {'artists': 1, 'artists/{id}/top-tracks': 1, 'artists/{id}/albums': 1})
+        get_artists_details(self.client, ['a23'])
+        self.assertEqual(self.upstream()['artists'], 1)
+
+    def test_unknown_artists_are_reported(self):
+        details, errors = get_artists_details(self.client, ['a31', 'nobody'])
+        self.assertEqual(list(details), ['a31'])
+        self.assertEqual(errors, {'nobody': "Artist not found"})
+        self.assertIsNone(self.cache.get('nobody'))
+
+    def test_partly_loaded_artists_are_not_cached(self):
+        with mock.patch.object(SpotifyClient, 'artist_albums', side_effect=RuntimeError("albums down")):
+            details, errors = get_artists_details(self.client, ['a41'])
+        self.assertEqual(details, {})
+        self.assertEqual(errors, {'a41': "albums down"})
+        self.assertIsNone(self.cache.get('a41'))
+
+
+class ArtistRoutesTest(FreshCacheTest):
+    def setUp(self):
+        super().setUp()
+        self.client = log_in('details-routes')
+        self.before = fake_spotify.call_counts()
+
+    def test_bulk_endpoint(self):
+        response = self.client.get('/api/artists?ids=a51,a52,nobody')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['artist']['id'] for entry in response.json['artists']], ['a51', 'a52'])
+        self.assertEqual(response.json['errors'], {'nobody': "Artist not found"})
+        self.assertEqual(self.upstream()['artists'], 1)
+
+    def test_bulk_endpoint_checks_the_ids(self):
+        self.assertEqual(self.client.get('/api/artists').status_code, 400)
+        ids = ','.join(f"a{n}" for n in range(MAX_BATCH + 1))
+        self.assertEqual(self.client.get(f"/api/artists?ids={ids}").status_code, 400)
+
+    def test_etag_answers_304_when_unchanged(self):
+        response = self.client.get('/api/artist/a61')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.cache_control.public)
+        self.assertEqual(response.cache_control.max_age, app_module.ARTIST_MAX_AGE)
+        etag = response.headers['ETag']
+
+        revalidated = self.client.get('/api/artist/a61', headers={'If-None-Match': etag})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.get_data(), b'')
+        self.assertEqual(self.upstream()['artists'], 1)
+
+        other = self.client.get('/api/artist/a62', headers={'If-None-Match': etag})
+        self.assertEqual(other.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
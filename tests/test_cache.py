@@ -0,0 +1,111 @@
+"""
+The per-user TTL cache: expiry, the stale window and LRU eviction under the memory cap.
+
+    python -m pytest tests
+"""
+import time
+import unittest
+from unittest import mock
+
+from spotify_analysis.cache import TTLCache, estimate_size
+from spotify_analysis.snapshot import UserSnapshot
+
+from test_snapshot import CountingClient, USER
+
+
+class ClockTest(unittest.TestCase):
+    """A time.time() the test moves forward"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patch = mock.patch.object(time, 'time', lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+
+class ExpiryTest(ClockTest):
+    def test_entry_expires_after_its_ttl(self):
+        cache = TTLCache(default_ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=120)
+        self.now += 59
+        self.assertEqual((cache.get('a'), cache.get('b')), (1, 2))
+        self.now += 2
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.get_stale('a'), (None, False))
+        self.assertEqual(cache.stats()['expirations'], 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_stale_entries_served_only_by_get_stale(self):
+        cache = TTLCache(default_ttl=60, stale_ttl=300)
+        cache.set('a', 1)
+        self.assertEqual(cache.get_stale('a'), (1, True))
+        self.now += 61
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get_stale('a'), (1, False))
+        self.now += 300
+        self.assertEqual(cache.get_stale('a'), (None, False))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['stale_hits'], stats['misses']), (1, 1, 2))
+
+    def test_setting_again_restarts_the_ttl(self):
+        cache = TTLCache(default_ttl=60)
+        cache.set('a', 1)
+        self.now += 50
+        cache.set('a', 2)
+        self.now += 50
+        self.assertEqual(cache.get('a'), 2)
+
+
+class EvictionTest(unittest.TestCase):
+    def test_least_recently_used_evicted_over_the_cap(self):
+        value = 'x' * 100
+        size = estimate_size(value)
+        cache = TTLCache(max_bytes=3 * size)
+        for key in 'abc':
+            cache.set(key, value)
+        cache.get('a')  # Now b is the least recently used
+        cache.set('d', value)
+        self.assertEqual([key for key in 'abcd' if cache.get(key)], ['a', 'c', 'd'])
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.current_bytes, 3 * size)
+
+    def test_value_bigger_than_the_cap_is_not_kept(self):
+        cache = TTLCache(max_bytes=50)
+        cache.set('small', 'x')
+        cache.set('huge', 'x' * 100)
+        self.assertIsNone(cache.get('huge'))
+        self.assertEqual(cache.get('small'), 'x')
+
+    def test_replacing_and_deleting_keep_the_size_right(self):
+        cache = TTLCache()
+        cache.set('a', 'x' * 10)
+        cache.set('a', 'x' * 20)
+        self.assertEqual(cache.current_bytes, estimate_size('x' * 20))
+        cache.delete('a')
+        self.assertEqual((cache.current_bytes, len(cache)), (0, 0))
+
+
+class SnapshotCacheTest(unittest.TestCase):
+    def test_repeat_page_views_are_served_from_the_cache(self):
+        client = CountingClient()
+        cache = TTLCache()
+        for _ in range(3):
+            snapshot = UserSnapshot(client, user_info=USER, cache=cache)
+            snapshot.current_user_top_artists(time_range='long_term')
+            snapshot.current_user_recently_played()
+        self.assertEqual(client.calls[('top_artists', 'long_term')], 1)
+        self.assertEqual(client.calls['recently_played'], 1)
+        self.assertEqual(cache.stats()['hits'], 4)
+
+    def test_users_have_their_own_entries(self):
+        client = CountingClient()
+        cache = TTLCache()
+        for user_id in ('first', 'second'):
+            UserSnapshot(client, user_info={'id': user_id}, cache=cache).current_user_top_tracks()
+        self.assertEqual(client.calls[('top_tracks', 'medium_term')], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+SpotifyClient and TokenManager: no /me per request, and one refresh-and-retry on a 401.
+
+    python -m pytest tests
+"""
+import time
+import threading
+import unittest
+
+from spotipy.exceptions import SpotifyException
+
+from support import fake_spotify
+
+from spotify_analysis.client import SpotifyClient, TokenManager
+
+from test_pages import log_in
+
+
+def token_info(access_token, user='client-user'):
+    return {'access_token': access_token, 'refresh_token': f"bench-refresh-{user}",
+            'expires_at': int(time.time()) + 3600}
+
+
+class Refresher:
+    """refresh_token_info callable handing out valid fake-server tokens, counting calls"""
+
+    def __init__(self, access_token='bench-token-client-user'):
+        self.access_token = access_token
+        self.calls = 0
+
+    def __call__(self, refresh_token, stale_access_token):
+        self.calls += 1
+        return token_info(self.access_token)
+
+
+class RefreshOn401Test(unittest.TestCase):
+    def test_rejected_token_is_refreshed_and_the_call_retried(self):
+        refresher = Refresher()
+        manager = TokenManager(token_info('revoked'), refresher)
+        client = SpotifyClient(auth_manager=manager)
+        self.assertEqual(client.me()['id'], 'client-user')
+        self.assertEqual(refresher.calls, 1)
+        self.assertTrue(manager.refreshed)
+        self.assertEqual(manager.token_info['access_token'], 'bench-token-client-user')
+        client.me()
+        self.assertEqual(refresher.calls, 1)
+
+    def test_valid_token_is_not_checked_up_front(self):
+        refresher = Refresher()
+        manager = TokenManager(token_info('bench-token-client-user'), refresher)
+        SpotifyClient(auth_manager=manager).current_user_top_artists()
+        self.assertEqual(refresher.calls, 0)
+        self.assertFalse(manager.refreshed)
+
+    def test_401_after_refreshing_is_raised(self):
+        refresher = Refresher(access_token='still-revoked')
+        client = SpotifyClient(auth_manager=TokenManager(token_info('revoked'), refresher))
+        with self.assertRaises(SpotifyException) as raised:
+            client.me()
+        self.assertEqual(raised.exception.http_status, 401)
+        self.assertEqual(refresher.calls, 1)
+
+    def test_threads_sharing_a_manager_refresh_once(self):
+        refresher = Refresher()
+        manager = TokenManager(token_info('revoked'), refresher)
+        threads = [threading.Thread(target=manager.refresh, args=('revoked',)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(refresher.calls, 1)
+
+
+class AppTokenTest(unittest.TestCase):
+    def test_pages_do_not_fetch_the_profile_again(self):
+        client = log_in('client-no-me')
+        before = fake_spotify.call_counts()['me']
+        for path in ('/dashboard', '/basics', '/debug-user', '/dashboard'):
+            self.assertEqual(client.get(path).status_code, 200, path)
+        self.assertEqual(fake_spotify.call_counts()['me'], before)
+
+    def test_token_refreshed_mid_request_is_saved_in_the_session(self):
+        client = log_in('client-revoked')
+        with client.session_transaction() as session:
+            session['token_info'] = dict(session['token_info'], access_token='revoked')
+        before = fake_spotify.call_counts()['token']
+        self.assertEqual(client.get('/api/artist/a1701').status_code, 200)
+        self.assertEqual(fake_spotify.call_counts()['token'], before + 1)
+        with client.session_transaction() as session:
+            self.assertEqual(session['token_info']['access_token'], 'bench-token-client-revoked')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+The NumPy column analyses against the loop-based functions they replace.
+
+    python -m pytest tests
+"""
+import os
+import random
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from support import ROOT
+
+from spotify_analysis import artist_analysis, columnar, obscurity_score, track_analysis
+from spotify_analysis.columnar import ArtistColumns, PlayColumns
+
+GENRES = ['indie pop', 'shoegaze', 'synthpop', 'dream pop', 'post-punk']
+ARTISTS = ['Low', 'Slowdive', 'Beach House', 'Wire']
+
+
+class FakeClient:
+    """Just the spotipy calls the analyses make, answered from fixed items"""
+
+    def __init__(self, artists=(), plays=()):
+        self.artists = list(artists)
+        self.plays = list(plays)
+
+    def current_user_top_artists(self, time_range='medium_term', limit=20):
+        return {'items': self.artists[:limit]}
+
+    def current_user_recently_played(self, limit=50):
+        return {'items': self.plays[:limit]}
+
+
+def random_artists(rng, count):
+    artists = []
+    for n in range(count):
+        artist = {'id': f"a{n}", 'popularity': rng.choice([0, 30, 30, 55, 100])}
+        if rng.random() > 0.1:  # Some artist objects have no genres key at all
+            artist['genres'] = rng.sample(GENRES, rng.randint(0, 3))
+        artists.append(artist)
+    return artists
+
+
+def random_plays(rng, count):
+    # Few artists and hours, so counts tie often
+    return [{'played_at': f"2024-05-0{rng.randint(1, 9)}T{rng.choice([0, 7, 7, 23]):02d}:15:00.000Z",
+             'track': {'artists': [{'name': rng.choice(ARTISTS)}]}} for _ in range(count)]
+
+
+def without_numpy(module):
+    return mock.patch.object(module, 'HAVE_NUMPY', False)
+
+
+@unittest.skipUnless(columnar.HAVE_NUMPY, "numpy is not installed")
+class EquivalenceTest(unittest.TestCase):
+    def assertSameResult(self, module, fn, client):
+        vectorized = fn(client)
+        with without_numpy(module):
+            loops = fn(client)
+        self.assertEqual(vectorized, loops)
+        # Same order too, where the templates iterate dicts
+        if isinstance(loops, dict):
+            for key, value in loops.items():
+                if isinstance(value, dict):
+                    self.assertEqual(list(vectorized[key]), list(value), key)
+
+    def test_random_users(self):
+        rng = random.Random(14)
+        for _ in range(200):
+            client = FakeClient(random_artists(rng, rng.randint(0, 60)), random_plays(rng, rng.randint(0, 50)))
+            self.assertSameResult(artist_analysis, artist_analysis.analyze_genre_distribution, client)
+            self.assertSameResult(obscurity_score, obscurity_score.calculate_obscurity_score, client)
+            self.assertSameResult(track_analysis, track_analysis.analyze_recent_plays, client)
+
+    def test_empty_inputs(self):
+        for client in (FakeClient(), FakeClient([{'id': 'a', 'popularity': 10, 'genres': []}])):
+            self.assertSameResult(artist_analysis, artist_analysis.analyze_genre_distribution, client)
+            self.assertSameResult(obscurity_score, obscurity_score.calculate_obscurity_score, client)
+            self.assertSameResult(track_analysis, track_analysis.analyze_recent_plays, client)
+
+    def test_ties_keep_first_seen_order(self):
+        artists = [{'id': 'a', 'popularity': 50, 'genres': ['shoegaze', 'indie pop']},
+                   {'id': 'b', 'popularity': 50, 'genres': ['indie pop', 'shoegaze']}]
+        plays = random_plays(random.Random(1), 0) + [
+            {'played_at': '2024-05-01T07:00:00Z', 'track': {'artists': [{'name': name}]}}
+            for name in ['Wire', 'Low', 'Low', 'Wire']]
+        client = FakeClient(artists, plays)
+        self.assertSameResult(artist_analysis, artist_analysis.analyze_genre_distribution, client)
+        self.assertSameResult(track_analysis, track_analysis.analyze_recent_plays, client)
+        self.assertEqual(track_analysis.analyze_recent_plays(client)['top_recent_artists'], [('Wire', 2), ('Low', 2)])
+
+
+@unittest.skipUnless(columnar.HAVE_NUMPY, "numpy is not installed")
+class BatchTest(unittest.TestCase):
+    def test_obscurity_scores_match_per_user_scores(self):
+        rng = random.Random(3)
+        users = [random_artists(rng, rng.choice([0, 0, 1, 20])) for _ in range(100)]
+        # Empty users at the start and the end as well
+        users = [[]] + users + [[]]
+        scores = columnar.obscurity_scores(ArtistColumns.from_users(users)).tolist()
+        with without_numpy(obscurity_score):
+            expected = [obscurity_score.calculate_obscurity_score(FakeClient(user)) for user in users]
+        self.assertEqual(scores, expected)
+
+    def test_last_user_without_artists(self):
+        user = [{'id': 'a', 'popularity': 10}, {'id': 'b', 'popularity': 70}]
+        self.assertEqual(columnar.obscurity_scores(ArtistColumns.from_users([user, []])).tolist(), [60, 50])
+
+    def test_hour_histograms_match_per_user_distributions(self):
+        rng = random.Random(5)
+        users = [random_plays(rng, rng.choice([0, 3, 50])) for _ in range(50)] + [[]]
+        histograms = columnar.hour_histograms(PlayColumns.from_users(users)).tolist()
+        with without_numpy(track_analysis):
+            expected = [list(track_analysis.analyze_recent_plays(FakeClient(plays=user))['hour_distribution'].values())
+                        for user in users]
+        self.assertEqual(histograms, expected)
+
+    def test_vocabularies_belong_to_their_batch(self):
+        first = ArtistColumns.from_items([{'popularity': 1, 'genres': ['shoegaze']}])
+        second = ArtistColumns.from_items([{'popularity': 1, 'genres': ['synthpop', 'shoegaze']}])
+        self.assertEqual(len(first.genres), 1)
+        self.assertEqual(second.genres.names(second.genre_codes.tolist()), ['synthpop', 'shoegaze'])
+
+
+class WithoutNumpyTest(unittest.TestCase):
+    def test_app_starts_and_scores_without_numpy(self):
+        # A fresh interpreter where `import numpy` fails, as on an install without it
+        script = (
+            "import sys; sys.modules['numpy'] = None\n"
+            "import app\n"
+            "from spotify_analysis import columnar, obscurity_score\n"
+            "from test_columnar import FakeClient\n"
+            "assert not columnar.HAVE_NUMPY\n"
+            "client = FakeClient([{'id': 'a', 'popularity': 30, 'genres': []}])\n"
+            "print(obscurity_score.calculate_obscurity_score(client))\n")
+        result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), '70')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Page sections fanned out concurrently, under one deadline, with per-section fallbacks.
+
+    python -m pytest tests
+"""
+import time
+import unittest
+from unittest import mock
+
+import app as app_module
+from spotify_analysis import fanout
+from spotify_analysis.fanout import run_concurrently, SectionTimeout
+
+
+def slow(value, delay=0.2):
+    def task():
+        time.sleep(delay)
+        return value
+    return task
+
+
+def failing():
+    raise ValueError("upstream broke")
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+    def test_tasks_run_in_parallel(self):
+        started = time.monotonic()
+        results, errors = run_concurrently({name: slow(name) for name in 'abcde'})
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(results, {name: name for name in 'abcde'})
+        self.assertEqual(errors, {})
+
+    def test_errors_and_timeouts_are_reported_per_task(self):
+        started = time.monotonic()
+        results, errors = run_concurrently({'quick': slow(1, 0), 'broken': failing, 'late': slow(2, 2)},
+                                           deadline=0.3)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(results, {'quick': 1})
+        self.assertIsInstance(errors['broken'], ValueError)
+        self.assertIsInstance(errors['late'], SectionTimeout)
+
+    def test_sequential_when_the_pool_is_disabled(self):
+        with mock.patch.object(fanout, 'MAX_WORKERS', 0):
+            results, errors = run_concurrently({'first': slow(1, 0.2), 'second': slow(2, 0), 'broken': failing},
+                                               deadline=0.1)
+        self.assertEqual(results, {'first': 1})
+        self.assertIsInstance(errors['second'], SectionTimeout)
+        self.assertIsInstance(errors['broken'], SectionTimeout)
+
+
+class PageSectionsTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshot = mock.Mock()
+        self.snapshot.me.return_value = {}  # No user id, so no warm-up jobs to wait for
+
+    def test_failed_and_late_sections_get_their_fallbacks(self):
+        sections = dict(app_module.PAGE_SECTIONS, recent=(lambda snapshot: failing(), {'empty': []}),
+                        obscurity=(lambda snapshot: slow(80, 2)(), 50),
+                        mood=(lambda snapshot: {'mood': 'Calm'}, {}))
+        with mock.patch.object(app_module, 'PAGE_SECTIONS', sections):
+            data = app_module.load_page_sections(self.snapshot, ['recent', 'obscurity', 'mood'],
+                                                 deadline=time.monotonic() + 0.3)
+        self.assertEqual(data, {'recent': {'empty': []}, 'obscurity': 50, 'mood': {'mood': 'Calm'}})
+
+    def test_fallbacks_are_copies(self):
+        sections = dict(app_module.PAGE_SECTIONS, recent=(lambda snapshot: failing(), {'items': []}))
+        with mock.patch.object(app_module, 'PAGE_SECTIONS', sections):
+            data = app_module.load_page_sections(self.snapshot, ['recent'])
+            data['recent']['items'].append('changed')
+            self.assertEqual(sections['recent'][1], {'items': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+The shared audio-features store: only misses go upstream, 100 ids at a time.
+
+    python -m pytest tests
+"""
+import os
+import tempfile
+import unittest
+
+from spotipy.exceptions import SpotifyException
+
+from fake_spotify import audio_features
+
+from spotify_analysis.feature_store import AudioFeatureStore, BATCH_SIZE
+
+
+class FeaturesClient:
+    """audio_features() like Spotify's: None for tracks it has no features for ('x' ids here)"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batches = []
+
+    def audio_features(self, tracks):
+        self.batches.append(list(tracks))
+        if self.error:
+            raise self.error
+        return [None if track_id.startswith('x') else audio_features(track_id) for track_id in tracks]
+
+
+def track_ids(count, prefix='t'):
+    return [f"{prefix}{n}" for n in range(count)]
+
+
+class FeatureStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'features.sqlite3')
+        self.store = AudioFeatureStore(self.path)
+        self.client = FeaturesClient()
+
+    def test_misses_fetched_in_full_batches(self):
+        features = self.store.get_features(self.client, track_ids(250))
+        self.assertEqual([len(batch) for batch in self.client.batches], [BATCH_SIZE, BATCH_SIZE, 50])
+        self.assertEqual(features['t7'], audio_features('t7'))
+        self.assertEqual(len(features), 250)
+
+    def test_known_tracks_are_not_fetched_again(self):
+        self.store.get_features(self.client, track_ids(120))
+        self.client.batches.clear()
+        features = self.store.get_features(self.client, track_ids(150) + ['t3', 't3'])
+        self.assertEqual(self.client.batches, [track_ids(150)[120:]])
+        self.assertEqual(len(features), 150)
+        stats = self.store.stats()
+        self.assertEqual((stats['tracks'], stats['upstream_calls']), (150, 3))
+        self.assertEqual(stats['hits'], 120)
+
+    def test_tracks_without_features_are_remembered(self):
+        first = self.store.get_features(self.client, ['x1', 't1'])
+        self.assertEqual(first, {'x1': None, 't1': audio_features('t1')})
+        self.client.batches.clear()
+        self.assertEqual(self.store.get_features(self.client, ['x1']), {'x1': None})
+        self.assertEqual(self.client.batches, [])
+
+    def test_shared_by_stores_on_the_same_file(self):
+        self.store.get_features(self.client, track_ids(10))
+        other_worker = AudioFeatureStore(self.path)
+        client = FeaturesClient()
+        self.assertEqual(len(other_worker.get_features(client, track_ids(10))), 10)
+        self.assertEqual(client.batches, [])
+
+    def test_backs_off_when_the_endpoint_is_forbidden(self):
+        self.store.get_features(self.client, ['t1'])
+        forbidden = FeaturesClient(SpotifyException(403, -1, "forbidden"))
+        with self.assertLogs('spotify_analysis.feature_store', 'WARNING'):
+            features = self.store.get_features(forbidden, ['t1', 't2'] + track_ids(150, 'u'))
+        self.assertEqual(features, {'t1': audio_features('t1')})
+        self.assertEqual(len(forbidden.batches), 1)
+        self.assertFalse(self.store.available())
+        # Known tracks are still served, and nothing goes upstream while backing off
+        self.assertEqual(self.store.get_features(forbidden, ['t1', 't2']), {'t1': audio_features('t1')})
+        self.assertEqual(len(forbidden.batches), 1)
+
+    def test_other_errors_are_raised(self):
+        with self.assertRaises(SpotifyException):
+            self.store.get_features(FeaturesClient(SpotifyException(500, -1, "down")), ['t1'])
+        self.assertTrue(self.store.available())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""
+Listening history: incremental ingestion from the `after` cursor and running aggregates.
+
+    python -m pytest tests
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from spotify_analysis import history
+from spotify_analysis.history import (ListeningHistory, ingest, analyze_listening_history, played_at_ms,
+                                      PAGE_SIZE)
+
+ARTISTS = ['Low', 'Wire', 'Slowdive', 'Can']
+START_MS = 1714521600000  # 2024-05-01T00:00:00Z
+
+
+def play(n):
+    """The n-th play, 25 minutes after the one before"""
+    played_at = START_MS + n * 25 * 60 * 1000
+    return {'played_at': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(played_at / 1000)),
+            'track': {'id': f"t{n % 7}", 'artists': [{'name': ARTISTS[n * n % len(ARTISTS)]}]}}
+
+
+class RecentlyPlayedClient:
+    """current_user_recently_played() over a fixed list of plays, newest first like Spotify"""
+
+    def __init__(self, count):
+        self.plays = [play(n) for n in range(count)]
+        self.calls = []
+
+    def me(self):
+        return {'id': 'history-user'}
+
+    def current_user_recently_played(self, limit=50, after=None):
+        self.calls.append(after)
+        newer = [item for item in self.plays if after is None or played_at_ms(item['played_at']) > after]
+        # Spotify pages forward from the cursor, returning the oldest plays after it
+        page = newer[:limit] if after is not None else newer[-limit:]
+        page = list(reversed(page))
+        cursors = {'after': str(played_at_ms(page[0]['played_at']))} if page else None
+        return {'items': page, 'cursors': cursors}
+
+
+def expected_summary(plays):
+    hours = Counter(int(item['played_at'][11:13]) for item in plays)
+    artists = Counter(item['track']['artists'][0]['name'] for item in plays)
+    first_heard = {}
+    for item in sorted(plays, key=lambda item: item['played_at']):
+        first_heard.setdefault(item['track']['artists'][0]['name'], item['played_at'])
+    top = sorted(artists.items(), key=lambda pair: (-pair[1], first_heard[pair[0]]))[:5]
+    return {hour: hours.get(hour, 0) for hour in range(24)}, top
+
+
+class HistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'history.sqlite3')
+        self.history = ListeningHistory(self.path)
+        patches = [mock.patch.object(history, '_history', self.history),
+                   mock.patch.object(history, 'HISTORY_MIN_INTERVAL', 0)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+
+class RecordTest(HistoryTestCase):
+    def test_aggregates_match_the_stored_plays(self):
+        plays = [play(n) for n in range(300)]
+        self.history.record('u', plays[:120])
+        self.history.record('u', plays[100:])
+        summary = self.history.summary('u')
+        hours, top = expected_summary(plays)
+        self.assertEqual(summary['total_plays'], 300)
+        self.assertEqual(summary['hour_distribution'], hours)
+        self.assertEqual([tuple(row) for row in summary['top_recent_artists']], top)
+        self.assertEqual(summary['since'], '2024-05-01')
+        self.assertEqual(len(self.history.plays('u')), 300)
+
+    def test_plays_at_or_before_the_watermark_are_skipped(self):
+        self.assertEqual(self.history.record('u', [play(5), play(6)]), 2)
+        self.assertEqual(self.history.record('u', [play(4), play(6), play(7)]), 1)
+        self.assertEqual(self.history.watermark('u'), played_at_ms(play(7)['played_at']))
+        self.assertEqual(self.history.summary('u')['total_plays'], 3)
+
+    def test_concurrent_workers_count_each_play_once(self):
+        plays = [play(n) for n in range(200)]
+        workers = [ListeningHistory(self.path) for _ in range(4)]
+        threads = [threading.Thread(target=worker.record, args=('u', plays)) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.history.summary('u')['total_plays'], 200)
+        self.assertEqual(sum(self.history.summary('u')['hour_distribution'].values()), 200)
+
+    def test_users_are_kept_apart(self):
+        self.history.record('a', [play(1)])
+        self.assertEqual(self.history.summary('b')['total_plays'], 0)
+        self.assertIsNone(self.history.watermark('b'))
+
+
+class IngestTest(HistoryTestCase):
+    def test_new_user_starts_from_the_regular_page(self):
+        client = RecentlyPlayedClient(120)
+        self.assertEqual(ingest(client, 'u'), PAGE_SIZE)
+        self.assertEqual(client.calls, [None])
+
+    def test_later_ingests_follow_the_after_cursor(self):
+        client = RecentlyPlayedClient(10)
+        ingest(client, 'u')
+        client.plays += [play(n) for n in range(10, 13)]
+        self.assertEqual(ingest(client, 'u'), 3)
+        self.assertEqual(client.calls, [None, played_at_ms(play(9)['played_at'])])
+        self.assertEqual(ingest(client, 'u'), 0)
+
+    def test_full_pages_are_followed_up_to_the_page_limit(self):
+        client = RecentlyPlayedClient(1)
+        ingest(client, 'u')
+        client.plays += [play(n) for n in range(1, 1000)]
+        with mock.patch.object(history, 'HISTORY_MAX_PAGES', 3):
+            self.assertEqual(ingest(client, 'u'), 3 * PAGE_SIZE)
+        self.assertEqual(len(client.calls), 4)
+
+    def test_not_asked_again_within_the_interval(self):
+        client = RecentlyPlayedClient(10)
+        with mock.patch.object(history, 'HISTORY_MIN_INTERVAL', 60):
+            ingest(client, 'u')
+            ingest(client, 'u')
+        self.assertEqual(len(client.calls), 1)
+
+    def test_failed_ingest_still_serves_the_stored_history(self):
+        client = RecentlyPlayedClient(10)
+        ingest(client, 'history-user')
+        with mock.patch.object(client, 'current_user_recently_played', side_effect=RuntimeError("down")):
+            with self.assertLogs('spotify_analysis.history', 'WARNING'):
+                summary = analyze_listening_history(client)
+        self.assertEqual(summary['total_plays'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
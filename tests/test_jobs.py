@@ -0,0 +1,122 @@
+"""
+The background job queue: deduplication by key, result lifetime, and the section jobs started at login.
+
+    python -m pytest tests
+"""
+import threading
+import unittest
+from unittest import mock
+
+from support import fake_spotify
+from test_pages import log_in
+
+import app as app_module
+from spotify_analysis import jobs
+from spotify_analysis.jobs import JobQueue, job_queue, wait_for
+
+
+class Gate:
+    """A job that counts its runs and blocks until opened"""
+
+    def __init__(self):
+        self.runs = 0
+        self.opened = threading.Event()
+
+    def __call__(self, value):
+        self.runs += 1
+        self.opened.wait(5)
+        return value
+
+
+class DeduplicationTest(unittest.TestCase):
+    def test_same_key_shares_one_job(self):
+        queue = JobQueue(workers=2)
+        gate = Gate()
+        first = queue.submit('k', gate, 1)
+        second = queue.submit('k', gate, 2)
+        self.assertIs(second, first)
+        self.assertIs(queue.get('k'), first)
+        gate.opened.set()
+        self.assertEqual(first.result(5), 1)
+        # A finished job is handed out until its result expires
+        self.assertIs(queue.submit('k', gate, 3), first)
+        self.assertEqual(gate.runs, 1)
+        self.assertEqual(queue.stats()['deduplicated'], 2)
+
+    def test_different_keys_run_separately(self):
+        queue = JobQueue(workers=2)
+        gate = Gate()
+        gate.opened.set()
+        futures = {key: queue.submit(key, gate, key) for key in ('a', 'b')}
+        self.assertEqual(wait_for(futures, timeout=5), ({'a': 'a', 'b': 'b'}, {}))
+        self.assertEqual(gate.runs, 2)
+
+    def test_expired_results_run_again(self):
+        queue = JobQueue(workers=1, result_ttl=60)
+        now = [1000.0]
+        with mock.patch.object(jobs.time, 'monotonic', lambda: now[0]):
+            first = queue.submit('k', str, 1)
+            first.result(5)
+            now[0] += 61
+            second = queue.submit('k', str, 1)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.result(5), '1')
+
+    def test_failed_jobs_are_logged_and_retried(self):
+        queue = JobQueue(workers=1)
+        with self.assertLogs('spotify_analysis.jobs', 'WARNING'):
+            failed = queue.submit('k', int, 'not a number')
+            with self.assertRaises(ValueError):
+                failed.result(5)
+        retried = queue.submit('k', int, '7')
+        self.assertIsNot(retried, failed)
+        self.assertEqual(retried.result(5), 7)
+        self.assertEqual(queue.stats()['failed'], 1)
+
+    def test_full_queue_rejects_new_keys(self):
+        queue = JobQueue(workers=0, max_queue=1)
+        self.assertIsNotNone(queue.submit('a', str, 1))
+        self.assertIsNone(queue.submit('b', str, 1))
+        self.assertIsNotNone(queue.submit('a', str, 1))
+        self.assertIsNone(queue.get('b'))
+        self.assertEqual(queue.stats()['rejected'], 1)
+
+
+class WaitForTest(unittest.TestCase):
+    def test_unfinished_and_failed_jobs_are_errors(self):
+        queue = JobQueue(workers=3)
+        gate = Gate()
+        with self.assertLogs('spotify_analysis.jobs', 'WARNING'):
+            futures = {'done': queue.submit('done', str, 1), 'failed': queue.submit('failed', int, 'x'),
+                       'slow': queue.submit('slow', gate, 1)}
+            futures['failed'].exception(5)
+            futures['done'].result(5)
+            results, errors = wait_for(futures, timeout=0.1)
+        self.assertEqual(results, {'done': '1'})
+        self.assertIsInstance(errors['failed'], ValueError)
+        self.assertIsNone(errors['slow'])
+        gate.opened.set()
+        # The slow job kept running for the next request
+        self.assertEqual(wait_for(queue.futures(['slow', 'unknown']), timeout=5), ({'slow': 1}, {}))
+
+    def test_nothing_to_wait_for(self):
+        self.assertEqual(wait_for({}), ({}, {}))
+
+
+class LoginWarmUpTest(unittest.TestCase):
+    def test_login_starts_the_dashboard_sections(self):
+        log_in('jobs-warm-up')
+        for name in app_module.DASHBOARD_SECTIONS:
+            future = job_queue.get(app_module.section_job_key('jobs-warm-up', name))
+            self.assertIsNotNone(future, name)
+            self.assertTrue(future.done(), name)
+
+    def test_dashboard_renders_from_the_login_jobs(self):
+        client = log_in('jobs-dashboard')
+        before = sum(fake_spotify.call_counts().values())
+        self.assertEqual(client.get('/dashboard').status_code, 200)
+        self.assertEqual(sum(fake_spotify.call_counts().values()), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
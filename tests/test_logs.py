@@ -0,0 +1,157 @@
+"""
+Logging off the request thread: the queue handler, its writer thread, and chatter rate limiting.
+
+    python -m pytest tests
+"""
+import io
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+from spotify_analysis import logs
+from spotify_analysis.logs import BackgroundQueueHandler, JsonFormatter, RateLimitFilter, chatter_logger
+
+
+def record(msg, *args, **extra):
+    entry = logging.LogRecord('test', logging.INFO, __file__, 1, msg, args, None)
+    entry.__dict__.update(extra)
+    return entry
+
+
+class SlowHandler(logging.Handler):
+    """Writes the formatted message after a delay, like a stalled stdout pipe"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.lines = []
+        self.threads = set()
+
+    def emit(self, entry):
+        time.sleep(self.delay)
+        self.threads.add(threading.current_thread())
+        self.lines.append(self.format(entry))
+
+
+class QueueHandlerTest(unittest.TestCase):
+    def test_records_are_queued_unformatted(self):
+        handler = BackgroundQueueHandler(queue.Queue())
+        args = {'user': 'u'}
+        handler.handle(record("hello %(user)s", args))
+        queued = handler.queue.get_nowait()
+        self.assertEqual(queued.msg, "hello %(user)s")
+        self.assertIs(queued.args, args)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = BackgroundQueueHandler(queue.Queue(2))
+        started = time.monotonic()
+        for n in range(5):
+            handler.handle(record("message %d", n))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(handler.dropped, 3)
+        self.assertEqual(handler.queue.qsize(), 2)
+
+    def test_writer_thread_formats_and_flushes_on_stop(self):
+        slow = SlowHandler(0.02)
+        handler = BackgroundQueueHandler(queue.Queue(100))
+        listener = logs._Listener(handler.queue, slow, respect_handler_level=True)
+        listener.start()
+        started = time.monotonic()
+        for n in range(20):
+            handler.handle(record("message %d", n))
+        # 20 records at 20 ms each would take 0.4 s on the calling thread
+        self.assertLess(time.monotonic() - started, 0.2)
+        listener.stop()
+        self.assertEqual(slow.lines, [f"message {n}" for n in range(20)])
+        self.assertNotIn(threading.current_thread(), slow.threads)
+
+    def test_stopping_with_a_full_queue_waits_for_room(self):
+        slow = SlowHandler(0.01)
+        handler = BackgroundQueueHandler(queue.Queue(3))
+        listener = logs._Listener(handler.queue, slow, respect_handler_level=True)
+        for n in range(3):
+            handler.handle(record("message %d", n))
+        listener.start()
+        listener.stop()
+        self.assertEqual(len(slow.lines), 3)
+
+
+class JsonFormatterTest(unittest.TestCase):
+    def test_extra_fields_and_exceptions(self):
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            entry = logging.LogRecord('app', logging.ERROR, __file__, 1, "failed for %s", ('u',),
+                                      exc_info=sys.exc_info())
+        entry.route = 'dashboard'
+        line = json.loads(JsonFormatter().format(entry))
+        self.assertEqual(line['message'], "failed for u")
+        self.assertEqual((line['level'], line['logger'], line['route']), ('ERROR', 'app', 'dashboard'))
+        self.assertIn("ValueError: bad", line['exception'])
+        self.assertNotIn('args', line)
+
+
+class RateLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.now = [100.0]
+        patch = mock.patch.object(logs.time, 'monotonic', lambda: self.now[0])
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_limit_per_message_template(self):
+        limiter = RateLimitFilter(limit=3, window=60)
+        let_through = [limiter.filter(record("Route %s accessed", n)) for n in range(5)]
+        self.assertEqual(let_through, [True, True, True, False, False])
+        self.assertTrue(limiter.filter(record("Another message")))
+        self.assertEqual(limiter.suppressed, 2)
+
+    def test_next_window_reports_what_was_dropped(self):
+        limiter = RateLimitFilter(limit=1, window=60)
+        for n in range(4):
+            limiter.filter(record("Route %s accessed", n))
+        self.now[0] += 60
+        entry = record("Route %s accessed", 'x')
+        self.assertTrue(limiter.filter(entry))
+        self.assertEqual(entry.getMessage(), "Route x accessed (3 similar suppressed)")
+        self.now[0] += 60
+        entry = record("Route %s accessed", 'y')
+        limiter.filter(entry)
+        self.assertEqual(entry.getMessage(), "Route y accessed")
+
+    def test_template_table_is_bounded(self):
+        limiter = RateLimitFilter(limit=1, window=60)
+        with mock.patch.object(RateLimitFilter, 'MAX_TEMPLATES', 3):
+            for n in range(10):
+                self.assertTrue(limiter.filter(record(f"message {n}")))
+            self.assertLessEqual(len(limiter._windows), 3)
+
+    def test_chatter_logger_is_limited_and_errors_are_not(self):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        limiter = RateLimitFilter(limit=2, window=60)
+        with mock.patch.object(logs, 'chatter_filter', limiter):
+            chatter = chatter_logger('logs-test')
+            chatter_logger('logs-test')
+        self.addCleanup(chatter.removeFilter, limiter)
+        self.assertEqual(chatter.filters.count(limiter), 1)
+        errors = logging.getLogger('logs-test')
+        for log in (chatter, errors):
+            log.addHandler(handler)
+            log.propagate = False
+            self.addCleanup(log.removeHandler, handler)
+            self.addCleanup(setattr, log, 'propagate', True)
+        for _ in range(5):
+            chatter.warning("Dashboard route accessed")
+            errors.warning("Spotify unavailable")
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines.count("Dashboard route accessed"), 2)
+        self.assertEqual(lines.count("Spotify unavailable"), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+The shared artist/track metadata store and the id-only pages kept per user.
+
+    python -m pytest tests
+"""
+import time
+import unittest
+from unittest import mock
+
+from fake_spotify import artist, recently_played, top_items
+
+from spotify_analysis.cache import TTLCache
+from spotify_analysis.metadata import MetadataStore
+from spotify_analysis.snapshot import UserSnapshot
+
+from test_snapshot import CountingClient, USER
+
+
+class InternTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MetadataStore()
+
+    def test_one_copy_of_each_object(self):
+        first = self.store.intern('artist', artist(1))
+        second = self.store.intern('artist', artist(1))
+        self.assertIs(second, first)
+        self.assertEqual(self.store.stats()['deduplicated'], 1)
+        page = self.store.intern_page('top_artists', {'items': [artist(1), artist(2)]})
+        self.assertIs(page['items'][0], first)
+
+    def test_stale_copy_replaced_by_the_next_one(self):
+        store = MetadataStore(max_age=60)
+        now = time.time()
+        old = store.intern('artist', artist(1))
+        with mock.patch.object(time, 'time', lambda: now + 61):
+            new = store.intern('artist', dict(artist(1), popularity=99))
+        self.assertIsNot(new, old)
+        self.assertEqual(store.get('artist', 'a1')['popularity'], 99)
+        self.assertEqual(store.stats()['refreshed'], 1)
+
+    def test_least_recently_used_evicted_per_kind(self):
+        store = MetadataStore(max_items=2)
+        for number in (1, 2):
+            store.intern('artist', artist(number))
+        store.get('artist', 'a1')
+        store.intern('artist', artist(3))
+        store.intern('track', {'id': 't1'})
+        self.assertEqual([store.get('artist', f"a{n}") is not None for n in (1, 2, 3)], [True, False, True])
+        self.assertEqual(store.stats()['tracks'], 1)
+        self.assertEqual(store.stats()['evictions'], 1)
+
+    def test_objects_without_an_id_are_not_stored(self):
+        local_file = {'id': None, 'name': 'Demo'}
+        self.assertIs(self.store.intern('track', local_file), local_file)
+        self.assertEqual(self.store.stats()['tracks'], 0)
+
+    def test_derived_values_computed_once_per_stored_object(self):
+        compute = mock.Mock(side_effect=lambda obj: obj['name'].upper())
+        stored = self.store.intern('artist', artist(1))
+        for _ in range(3):
+            self.store.derived('artist', stored, 'shout', compute)
+        self.assertEqual(compute.call_count, 1)
+        # A different copy of the object isn't the stored one, so nothing is memoised for it
+        self.store.derived('artist', artist(1), 'shout', compute)
+        self.assertEqual(compute.call_count, 2)
+
+
+class CompactPageTest(unittest.TestCase):
+    def setUp(self):
+        self.store = MetadataStore()
+
+    def test_round_trip(self):
+        for endpoint, payload in (('top_tracks', top_items('u', 'tracks', 'short_term', 50, 0)),
+                                  ('recently_played', recently_played('u', 20, None))):
+            page = self.store.intern_page(endpoint, payload)
+            compact = self.store.compact_page(endpoint, page)
+            self.assertEqual(self.store.rehydrate_page(endpoint, compact), payload)
+
+    def test_ids_and_inline_objects(self):
+        local_file = {'id': None, 'name': 'Demo'}
+        payload = {'items': [artist(5), local_file], 'total': 2}
+        compact = self.store.compact_page('top_artists', self.store.intern_page('top_artists', payload))
+        self.assertEqual(compact['items'], ['a5', local_file])
+        self.assertEqual(compact['total'], 2)
+
+    def test_rehydrate_needs_every_object(self):
+        store = MetadataStore(max_items=10)
+        compact = store.compact_page('top_artists', store.intern_page(
+            'top_artists', top_items('u', 'artists', 'short_term', 20, 0)))
+        self.assertIsNone(store.rehydrate_page('top_artists', compact))
+
+
+class SharedAcrossUsersTest(unittest.TestCase):
+    def test_user_cache_keeps_ids_and_users_share_objects(self):
+        cache = TTLCache()
+        client = CountingClient()
+        pages = []
+        for user_id in ('first', 'second'):
+            snapshot = UserSnapshot(client, user_info=dict(USER, id=user_id), cache=cache)
+            pages.append(snapshot.current_user_top_tracks(limit=50))
+        # CountingClient answers every user with the same top tracks
+        self.assertTrue(all(a is b for a, b in zip(*(page['items'] for page in pages))))
+        cached = cache.get(('first', 'top_tracks', 'medium_term', 50))
+        self.assertTrue(all(isinstance(item, str) for item in cached['items']))
+
+
+if __name__ == '__main__':
+    unittest.main()
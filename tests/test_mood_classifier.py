@@ -0,0 +1,85 @@
+"""
+The compiled mood classifier against the keyword loops it replaces.
+
+    python -m pytest tests
+"""
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from fake_spotify import GENRES
+
+from spotify_analysis.mood_classifier import MoodClassifier, DEFAULT_MOOD_KEYWORDS, load_keyword_table
+
+# Overlapping keywords: prefixes of each other, and each other's substrings
+OVERLAPPING = {
+    'rock': {'rock': 1, 'rocksteady': 2, 'ck': 1},
+    'soft': {'soft rock': 3, 'soft': 1},
+    'dark': {'dark': 1, 'dark wave': 2, 'wave': 1, 'darkwave': 5},
+}
+
+
+def keyword_loops(keywords, genre_counts):
+    """Every keyword tested against every genre, as analyze_mood_from_genres used to"""
+    scores = {mood: 0 for mood in keywords}
+    for genre, count in genre_counts.items():
+        for mood, table in keywords.items():
+            for keyword, weight in table.items():
+                if keyword in genre.lower():
+                    scores[mood] += weight * count
+    return scores
+
+
+def random_genres(rng, keywords, count):
+    words = [keyword for table in keywords.values() for keyword in table] + GENRES + ['x', 'core', 'new']
+    return {' '.join(rng.choice(words) for _ in range(rng.randint(1, 3))) + rng.choice(['', 's', 'ish']):
+            rng.randint(1, 5) for _ in range(count)}
+
+
+class EquivalenceTest(unittest.TestCase):
+    def assertSameScores(self, keywords, genre_counts):
+        self.assertEqual(MoodClassifier(keywords).score(genre_counts), keyword_loops(keywords, genre_counts))
+
+    def test_default_keywords(self):
+        rng = random.Random(13)
+        for _ in range(200):
+            self.assertSameScores(DEFAULT_MOOD_KEYWORDS, random_genres(rng, DEFAULT_MOOD_KEYWORDS, 10))
+
+    def test_overlapping_keywords(self):
+        rng = random.Random(31)
+        for _ in range(200):
+            self.assertSameScores(OVERLAPPING, random_genres(rng, OVERLAPPING, 10))
+        self.assertSameScores(OVERLAPPING, {'Rocksteady': 1, 'soft rock': 2, 'darkwave': 1, 'dark wave': 1})
+
+    def test_each_keyword_counts_once_per_genre(self):
+        classifier = MoodClassifier(DEFAULT_MOOD_KEYWORDS)
+        self.assertEqual(classifier.score({'pop pop pop': 2})['happy'], 2)
+        self.assertEqual(classifier.score({'Dance-Pop': 1}), {'happy': 2, 'angry': 0, 'sad': 0, 'chill': 0})
+
+    def test_no_keywords(self):
+        self.assertEqual(MoodClassifier({}).score({'pop': 1}), {})
+
+
+class MemoTest(unittest.TestCase):
+    def test_genres_classified_once(self):
+        classifier = MoodClassifier(DEFAULT_MOOD_KEYWORDS, cache_size=2)
+        for _ in range(3):
+            classifier.score({'indie pop': 1, 'emo': 1})
+        self.assertEqual(classifier.stats()['genres'], 2)
+        self.assertAlmostEqual(classifier.stats()['hit_ratio'], 4 / 6, places=3)
+        classifier.score({'lofi': 1})
+        self.assertEqual(classifier.stats()['genres'], 2)
+
+    def test_keyword_table_from_a_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'moods.json')
+        with open(path, 'w') as f:
+            json.dump(OVERLAPPING, f)
+        classifier = MoodClassifier(load_keyword_table(path))
+        self.assertEqual(classifier.moods, ['rock', 'soft', 'dark'])
+        self.assertEqual(classifier.score({'darkwave': 1}), keyword_loops(OVERLAPPING, {'darkwave': 1}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Pages against the fake Spotify API: which sections each page runs.
+
+    python -m pytest tests
+"""
+import unittest
+
+from support import fake_spotify
+
+import app as app_module
+from spotify_analysis.history import get_listening_history
+
+
+def log_in(user_id):
+    """Test client logged in through /callback as user_id, once its login jobs have settled"""
+    client = app_module.app.test_client()
+    response = client.get(f"/callback?code={user_id}")
+    assert response.status_code == 302, response.status_code
+    fake_spotify.wait_idle(quiet=0.3)
+    return client
+
+
+class PageSectionsTest(unittest.TestCase):
+    def test_pages_list_their_sections(self):
+        for page, (_, names, _) in app_module.PAGES.items():
+            self.assertTrue(set(names) <= set(app_module.PAGE_SECTIONS), page)
+        self.assertNotIn('history', app_module.DASHBOARD_SECTIONS)
+        self.assertNotIn('history', app_module.BASICS_SECTIONS)
+        self.assertIn('history', app_module.MUSIC_DNA_SECTIONS)
+
+    def test_dashboard_and_basics_leave_history_alone(self):
+        client = log_in('pages-no-history')
+        for path in ('/dashboard', '/basics'):
+            self.assertEqual(client.get(path).status_code, 200)
+        fake_spotify.wait_idle(quiet=0.3)
+        self.assertIsNone(get_listening_history().watermark('pages-no-history'))
+
+    def test_music_dna_ingests_history(self):
+        client = log_in('pages-history')
+        self.assertEqual(client.get('/music_dna').status_code, 200)
+        self.assertIsNotNone(get_listening_history().watermark('pages-history'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+"""
+The columnar play store: time-range queries through the sparse index, appends and rewrites.
+
+    python -m pytest tests
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from datetime import datetime
+from unittest import mock
+
+from support import ROOT
+
+from spotify_analysis import columnar, history, play_store, track_analysis
+from spotify_analysis.history import ListeningHistory
+from spotify_analysis.play_store import PlayStore, sync_listening_history, import_export
+
+ARTISTS = ['Low', 'Wire', 'Slowdive', 'Can', 'Stereolab']
+START_MS = 1704067200000  # 2024-01-01T00:00:00Z
+HOUR_MS = 3600 * 1000
+
+
+def random_plays(rng, count):
+    """(played_at, track_id, artist) in random order, some sharing a played_at"""
+    return [(START_MS + rng.randrange(0, 400) * HOUR_MS // 3, rng.choice(['t1', 't2', None, 't3']),
+             rng.choice(ARTISTS)) for _ in range(count)]
+
+
+def expected_summary(plays, top=5):
+    """What PlayRange.summary() should report for (played_at, track_id, artist) plays, oldest first"""
+    hours = Counter((played_at // HOUR_MS) % 24 for played_at, _, _ in plays)
+    artists = Counter(artist for _, _, artist in plays)
+    first = {}
+    for position, (_, _, artist) in enumerate(plays):
+        first.setdefault(artist, position)
+    ranked = sorted(artists.items(), key=lambda pair: (-pair[1], first[pair[0]]))[:top]
+    return {'hour_distribution': {hour: hours.get(hour, 0) for hour in range(24)},
+            'peak_listening_hour': max(range(24), key=lambda hour: (hours.get(hour, 0), -hour)) if plays else None,
+            'top_recent_artists': ranked, 'total_plays': len(plays)}
+
+
+def first_of_each(plays):
+    """Plays sorted by time, keeping the first added of those sharing a played_at"""
+    kept = {}
+    for play in plays:
+        kept.setdefault(play[0], play)
+    return sorted(kept.values())
+
+
+@unittest.skipUnless(columnar.HAVE_NUMPY, "numpy is not installed")
+class PlayStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = PlayStore(self.root)
+        # A small stride, so ranges cross many index blocks
+        patch = mock.patch.object(play_store, 'INDEX_STRIDE', 8)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def append(self, plays, store=None):
+        played_at, track_ids, artists = zip(*plays) if plays else ((), (), ())
+        return (store or self.store).append('u', played_at, track_ids, artists)
+
+
+class RangeTest(PlayStoreTestCase):
+    def test_ranges_match_a_scan_of_the_plays(self):
+        rng = random.Random(17)
+        plays = random_plays(rng, 300)
+        self.assertEqual(self.append(plays), len(first_of_each(plays)))
+        stored = first_of_each(plays)
+        for _ in range(200):
+            start, end = sorted(rng.randrange(START_MS - HOUR_MS, START_MS + 140 * HOUR_MS) for _ in range(2))
+            start = rng.choice([start, None])
+            end = rng.choice([end, None])
+            expected = [play for play in stored
+                        if (start is None or play[0] >= start) and (end is None or play[0] < end)]
+            found = self.store.plays('u', start, end)
+            self.assertEqual(found.played_at.tolist(), [play[0] for play in expected])
+            self.assertEqual(found.summary(), expected_summary(expected))
+
+    def test_empty_store_and_empty_range(self):
+        self.assertEqual(len(self.store.plays('u')), 0)
+        self.assertEqual(self.store.plays('u').summary()['peak_listening_hour'], None)
+        self.append([(START_MS, 't1', 'Low')])
+        self.assertEqual(len(self.store.plays('u', START_MS + 1, START_MS + 2)), 0)
+        self.assertEqual(len(self.store.plays('u', START_MS + 5, START_MS)), 0)
+
+    def test_top_tracks_leave_out_plays_without_a_track(self):
+        self.append([(START_MS, None, 'Low'), (START_MS + 1, 't1', 'Low'), (START_MS + 2, None, 'Wire')])
+        self.assertEqual(self.store.plays('u').top_tracks(), [('t1', 1)])
+
+
+class AppendTest(PlayStoreTestCase):
+    def test_newer_plays_are_appended_in_place(self):
+        plays = first_of_each(random_plays(random.Random(3), 100))
+        self.append(plays[:40])
+        self.append(plays[40:])
+        self.assertEqual(self.store.stats()['rewrites'], 0)
+        self.assertEqual(self.store.plays('u').played_at.tolist(), [play[0] for play in plays])
+
+    def test_older_plays_rewrite_the_columns(self):
+        rng = random.Random(5)
+        recent, older = random_plays(rng, 50), random_plays(rng, 50)
+        self.append(recent)
+        added = self.append(older)
+        self.assertEqual(added, len(first_of_each(recent + older)) - len(first_of_each(recent)))
+        self.assertEqual(self.store.stats()['rewrites'], 1)
+        stored = first_of_each(recent + older)
+        self.assertEqual(self.store.plays('u').summary(), expected_summary(stored))
+
+    def test_readding_plays_is_a_no_op(self):
+        plays = random_plays(random.Random(7), 60)
+        self.append(plays)
+        self.assertEqual(self.append(plays), 0)
+        self.assertEqual(self.append(plays[:10]), 0)
+        self.assertEqual(len(self.store.plays('u')), len(first_of_each(plays)))
+
+    def test_other_workers_see_committed_plays(self):
+        other_worker = PlayStore(self.root)
+        self.append([(START_MS, 't1', 'Low')])
+        self.assertEqual(len(other_worker.plays('u')), 1)
+        self.append([(START_MS + 1, 't2', 'Wire')], store=other_worker)
+        self.assertEqual(self.store.plays('u').top_artists(), [('Low', 1), ('Wire', 1)])
+
+    def test_users_are_kept_apart(self):
+        self.append([(START_MS, 't1', 'Low')])
+        self.assertEqual(len(self.store.plays('someone else')), 0)
+
+
+class SourcesTest(PlayStoreTestCase):
+    def test_sync_copies_new_listening_history_once(self):
+        listening_history = ListeningHistory(os.path.join(self.root, 'history.sqlite3'))
+        items = [{'played_at': f"2024-01-0{day}T0{hour}:00:00Z", 'track': {'id': f"t{day}",
+                  'artists': [{'name': ARTISTS[day]}]}} for day in (1, 2, 3) for hour in (1, 5)]
+        with mock.patch.object(history, '_history', listening_history):
+            listening_history.record('u', items[:4])
+            self.assertEqual(sync_listening_history('u', self.store), 4)
+            listening_history.record('u', items[4:])
+            self.assertEqual(sync_listening_history('u', self.store), 2)
+            self.assertEqual(sync_listening_history('u', self.store), 0)
+        self.assertEqual(self.store.plays('u').summary()['total_plays'], 6)
+
+    def test_import_export_skips_short_plays_and_podcasts(self):
+        export = [{'ts': '2024-01-01T10:00:00Z', 'ms_played': 200000, 'spotify_track_uri': 'spotify:track:t1',
+                   'master_metadata_album_artist_name': 'Low'},
+                  {'ts': '2024-01-01T11:00:00Z', 'ms_played': 1000, 'spotify_track_uri': 'spotify:track:t2',
+                   'master_metadata_album_artist_name': 'Low'},
+                  {'ts': '2024-01-01T12:00:00Z', 'ms_played': 900000, 'spotify_track_uri': None,
+                   'master_metadata_album_artist_name': None},
+                  {'ts': '2024-01-01T13:00:00Z', 'ms_played': 60000, 'spotify_track_uri': None,
+                   'master_metadata_album_artist_name': 'Wire'}]
+        path = os.path.join(self.root, 'Streaming_History_Audio_2024.json')
+        with open(path, 'w') as f:
+            json.dump(export, f)
+        self.assertEqual(import_export('u', [path], self.store), 2)
+        stored = self.store.plays('u')
+        self.assertEqual(stored.played_at.tolist(), [START_MS + 10 * HOUR_MS, START_MS + 13 * HOUR_MS])
+        self.assertEqual(stored.top_tracks(), [('t1', 1)])
+
+
+class AnalyzePlayHistoryTest(PlayStoreTestCase):
+    def test_store_and_history_fallback_agree(self):
+        listening_history = ListeningHistory(os.path.join(self.root, 'history.sqlite3'))
+        rng = random.Random(11)
+        items = [{'played_at': datetime.utcfromtimestamp(played_at / 1000).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                  'track': {'id': track_id, 'artists': [{'name': artist}]}}
+                 for played_at, track_id, artist in first_of_each(random_plays(rng, 200))]
+        listening_history.record('u', items)
+        start, end = datetime(2024, 1, 2), datetime(2024, 1, 4, 12)
+        with mock.patch.object(history, '_history', listening_history), \
+                mock.patch.object(play_store, '_store', self.store):
+            from_store = track_analysis.analyze_play_history('u', start, end)
+            with mock.patch.object(track_analysis, 'HAVE_NUMPY', False):
+                from_history = track_analysis.analyze_play_history('u', start, end)
+        self.assertEqual(self.store.stats()['appended'], len(items))
+        self.assertTrue(from_store['total_plays'])
+        self.assertEqual(from_store, from_history)
+
+    def test_failures_are_logged(self):
+        with mock.patch.object(track_analysis, 'sync_listening_history', side_effect=OSError("disk full")):
+            with self.assertLogs('spotify_analysis.track_analysis', 'WARNING'):
+                summary = track_analysis.analyze_play_history('u')
+        self.assertEqual(summary['total_plays'], 0)
+
+
+class WithoutNumpyTest(unittest.TestCase):
+    def test_play_history_falls_back_to_the_listening_history(self):
+        # A fresh interpreter where `import numpy` fails, as on an install without it
+        script = (
+            "import sys; sys.modules['numpy'] = None\n"
+            "from spotify_analysis import play_store, track_analysis\n"
+            "from spotify_analysis.history import get_listening_history\n"
+            "assert not track_analysis.HAVE_NUMPY\n"
+            "get_listening_history().record('no-numpy', [{'played_at': '2024-01-01T10:00:00Z',"
+            " 'track': {'id': 't1', 'artists': [{'name': 'Low'}]}}])\n"
+            "summary = track_analysis.analyze_play_history('no-numpy')\n"
+            "print(summary['total_plays'], summary['peak_listening_hour'])\n")
+        result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path),
+                                         LISTENING_HISTORY_DB=os.path.join(tempfile.mkdtemp(), 'history.sqlite3')))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ['1', '10'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Request profiles: collapsed stacks, pruning and the admin endpoints.
+
+    python -m pytest tests
+"""
+import unittest
+from unittest import mock
+
+import app as app_module
+from spotify_analysis import profiling
+from spotify_analysis.profiling import PROFILE_HEADER, Profile
+
+TOKEN = 'profile-secret'
+
+
+def saved_profile(route='dashboard'):
+    profile = Profile(route)
+    profile.stacks['MainThread;dashboard (app.py:1)'] += 3
+    return profiling.save(profile)
+
+
+class AdminProfilesTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(profiling, 'PROFILE_TOKEN', TOKEN)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.client = app_module.app.test_client()
+        self.name = saved_profile()
+
+    def test_token_only_accepted_in_the_header(self):
+        self.assertEqual(self.client.get(f"/admin/profiles?token={TOKEN}").status_code, 404)
+        self.assertEqual(self.client.get(f"/admin/profiles/{self.name}?token={TOKEN}").status_code, 404)
+        self.assertEqual(self.client.get('/admin/profiles', headers={PROFILE_HEADER: 'wrong'}).status_code, 404)
+
+        response = self.client.get('/admin/profiles', headers={PROFILE_HEADER: TOKEN})
+        self.assertEqual(response.status_code, 200)
+        urls = [profile['url'] for profile in response.json['profiles']]
+        self.assertIn(f"/admin/profiles/{self.name}", urls)
+        self.assertFalse([url for url in urls if TOKEN in url])
+
+    def test_profile_served_as_collapsed_stacks(self):
+        response = self.client.get(f"/admin/profiles/{self.name}", headers={PROFILE_HEADER: TOKEN})
+        self.assertEqual(response.get_data(as_text=True), "MainThread;dashboard (app.py:1) 3\n")
+        missing = self.client.get('/admin/profiles/../etc', headers={PROFILE_HEADER: TOKEN})
+        self.assertEqual(missing.status_code, 404)
+
+
+class PruneTest(unittest.TestCase):
+    def test_only_newest_profiles_kept(self):
+        with mock.patch.object(profiling, 'PROFILE_KEEP', 3):
+            names = [saved_profile(f"route{n}") for n in range(5)]
+            kept = [profile['name'] for profile in profiling.list_profiles()]
+        self.assertEqual(kept, list(reversed(names[-3:])))
+
+
+class SaveFailureTest(unittest.TestCase):
+    def test_unwritable_profile_is_logged(self):
+        profile = profiling.start_profile('dashboard')
+        profile.stacks['MainThread;dashboard (app.py:1)'] += 1
+        with mock.patch.object(profiling, 'save', side_effect=OSError("read-only file system")):
+            with self.assertLogs('spotify_analysis.profiling', 'WARNING'):
+                self.assertIsNone(profiling.stop_profile(profile))
+
+
+if __name__ == '__main__':
+    unittest.main()
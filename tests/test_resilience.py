@@ -0,0 +1,84 @@
+"""
+The circuit breaker and scheduler during a Spotify outage, against benchmarks/fake_spotify.py.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# No transport backoff, so exhausting the 5xx retries is quick
+os.environ.setdefault('SPOTIFY_RETRY_BACKOFF', '0')
+
+from spotipy.exceptions import SpotifyException  # noqa: E402
+
+from fake_spotify import FakeSpotify  # noqa: E402
+from spotify_analysis import client as client_module  # noqa: E402
+from spotify_analysis.client import SpotifyClient  # noqa: E402
+from spotify_analysis.resilience import CircuitBreaker, CircuitOpenError, OPEN, is_upstream_failure  # noqa: E402
+from spotify_analysis.scheduler import RequestScheduler, is_rate_limited  # noqa: E402
+from spotify_analysis.transport import HTTP_RETRIES  # noqa: E402
+
+
+class OutageTest(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeSpotify(error_rate=1.0).start()
+        self.breaker = CircuitBreaker(window=10, min_calls=5, failure_ratio=0.5, cooldown=60)
+        self.scheduler = RequestScheduler()
+        patches = [mock.patch.object(client_module, 'spotify_breaker', self.breaker),
+                   mock.patch.object(client_module, 'scheduler', self.scheduler)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = SpotifyClient(auth='bench-token-outage')
+        self.client.prefix = self.fake.url + '/v1/'
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_breaker_opens_on_5xx(self):
+        statuses = []
+        for _ in range(self.breaker.min_calls):
+            with self.assertRaises(SpotifyException) as raised:
+                self.client.me()
+            statuses.append(raised.exception.http_status)
+
+        self.assertEqual(statuses, [503] * self.breaker.min_calls)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertEqual(self.breaker.failures, self.breaker.min_calls)
+
+        # Open: failed fast without going upstream
+        upstream = sum(self.fake.call_counts().values())
+        with self.assertRaises(CircuitOpenError):
+            self.client.me()
+        self.assertEqual(sum(self.fake.call_counts().values()), upstream)
+
+    def test_outage_is_not_throttling(self):
+        with self.assertRaises(SpotifyException):
+            self.client.me()
+        # Only the transport's own retries went upstream, and nothing paused the worker
+        self.assertEqual(sum(self.fake.call_counts().values()), HTTP_RETRIES + 1)
+        self.assertEqual(self.scheduler.throttled, 0)
+        self.assertEqual(self.scheduler.blocked_until, 0.0)
+
+
+class ClassificationTest(unittest.TestCase):
+    def test_max_retries_429_is_an_upstream_failure(self):
+        # spotipy's report of a RetryError: a 429 without response headers
+        error = SpotifyException(429, -1, "/v1/me:\n Max Retries", reason=None)
+        self.assertFalse(is_rate_limited(error))
+        self.assertTrue(is_upstream_failure(error))
+
+    def test_real_429_is_throttling(self):
+        error = SpotifyException(429, -1, "rate limited", headers={'Retry-After': '2'})
+        self.assertTrue(is_rate_limited(error))
+        self.assertFalse(is_upstream_failure(error))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+The request scheduler: Retry-After, re-queueing, priorities and which 429s count as throttling.
+
+    python -m pytest tests
+"""
+import time
+import threading
+import unittest
+from email.utils import formatdate
+from unittest import mock
+
+from spotipy.exceptions import SpotifyException
+
+from fake_spotify import FakeSpotify
+from spotify_analysis import client as client_module
+from spotify_analysis.client import SpotifyClient
+from spotify_analysis.resilience import CircuitBreaker
+from spotify_analysis.scheduler import (RequestScheduler, INTERACTIVE, BACKGROUND, background_priority,
+                                        parse_retry_after)
+
+# The fake server's Retry-After
+RETRY_AFTER = 1.0
+
+
+class ThrottledServerTest(unittest.TestCase):
+    """A client whose every call goes through its own scheduler, against a fake Spotify that answers 429"""
+
+    def setUp(self):
+        self.fake = FakeSpotify(throttle_rate=1.0).start()
+        self.addCleanup(self.fake.stop)
+        self.scheduler = RequestScheduler(max_retries=1)
+        patches = [mock.patch.object(client_module, 'scheduler', self.scheduler),
+                   mock.patch.object(client_module, 'spotify_breaker', CircuitBreaker())]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = SpotifyClient(auth='bench-token-throttled')
+        self.client.prefix = self.fake.url + '/v1/'
+
+        self.throttled = threading.Event()
+        throttle = self.scheduler.throttle
+
+        def throttle_once(retry_after):
+            # Spotify lets calls through again once the Retry-After has passed
+            self.fake.throttle_rate = 0.0
+            throttle(retry_after)
+            self.throttled.set()
+
+        self.throttle_once = mock.patch.object(self.scheduler, 'throttle', throttle_once)
+
+    def test_rejected_call_is_requeued_after_retry_after(self):
+        started = time.monotonic()
+        with self.throttle_once:
+            user = self.client.me()
+        self.assertEqual(user['id'], 'throttled')
+        self.assertEqual(self.fake.call_counts()['me'], 2)
+        self.assertEqual(self.scheduler.throttled, 1)
+        self.assertGreaterEqual(time.monotonic() - started, RETRY_AFTER)
+
+    def test_retry_after_blocks_every_caller(self):
+        with self.throttle_once:
+            first = threading.Thread(target=self.client.me)
+            first.start()
+            self.assertTrue(self.throttled.wait(5))
+            # A call from another request thread waits out the same Retry-After
+            started = time.monotonic()
+            self.client.current_user_top_artists()
+            waited = time.monotonic() - started
+            first.join()
+        self.assertGreater(waited, RETRY_AFTER / 2)
+        self.assertEqual(self.fake.call_counts()['me/top/artists'], 1)
+
+    def test_gives_up_after_max_retries(self):
+        with self.assertRaises(SpotifyException) as raised:
+            self.client.me()
+        self.assertEqual(raised.exception.http_status, 429)
+        self.assertEqual(self.fake.call_counts()['me'], self.scheduler.max_retries + 1)
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_acquire_waits_until_retry_after_has_passed(self):
+        scheduler = RequestScheduler()
+        scheduler.throttle(0.3)
+        started = time.monotonic()
+        scheduler.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.29)
+        self.assertEqual(scheduler.throttled, 1)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after({'Retry-After': '2'}), 2.0)
+        self.assertEqual(parse_retry_after({}), 1.0)
+        self.assertEqual(parse_retry_after({'Retry-After': 'soon'}), 1.0)
+        self.assertAlmostEqual(parse_retry_after({'Retry-After': formatdate(time.time() + 30, usegmt=True)}),
+                               30, delta=1.5)
+
+
+class PriorityTest(unittest.TestCase):
+    def test_interactive_calls_go_before_waiting_background_calls(self):
+        scheduler = RequestScheduler(rate=10, burst=1)
+        scheduler.acquire()  # Empty the bucket, so every call below queues
+        order = []
+
+        def background():
+            with background_priority():
+                scheduler.acquire()
+            order.append(BACKGROUND)
+
+        def interactive():
+            scheduler.acquire()
+            order.append(INTERACTIVE)
+
+        threads = [threading.Thread(target=background) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.02)  # The background calls have been waiting longer
+        threads.append(threading.Thread(target=interactive))
+        threads[-1].start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [INTERACTIVE] + [BACKGROUND] * 4)
+
+    def test_interactive_call_not_queued_past_max_wait(self):
+        scheduler = RequestScheduler(rate=1, burst=1, max_wait=0.1)
+        scheduler.acquire()
+        with self.assertRaises(SpotifyException) as raised:
+            scheduler.acquire()
+        self.assertEqual(raised.exception.http_status, 429)
+
+
+class HeaderlessRateLimitTest(unittest.TestCase):
+    """429s that Spotify didn't send don't pause the worker or get re-queued"""
+
+    def test_queue_rejection_is_not_throttling(self):
+        scheduler = RequestScheduler(rate=1, burst=1, max_wait=0.1)
+        scheduler.acquire()
+        fn = mock.Mock()
+        with self.assertRaises(SpotifyException):
+            scheduler.call(fn)
+        fn.assert_not_called()
+        self.assertEqual(scheduler.throttled, 0)
+        self.assertEqual(scheduler.blocked_until, 0.0)
+
+    def test_headerless_429_is_raised_straight_away(self):
+        scheduler = RequestScheduler()
+        # As spotipy reports a transport that ran out of retries, or a nested scheduler rejection
+        fn = mock.Mock(side_effect=SpotifyException(429, -1, "/v1/me:\n Max Retries", reason=None))
+        started = time.monotonic()
+        with self.assertRaises(SpotifyException):
+            scheduler.call(fn)
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(scheduler.throttled, 0)
+        self.assertLess(time.monotonic() - started, RETRY_AFTER / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
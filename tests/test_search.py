@@ -0,0 +1,114 @@
+"""
+Artist search: the shared result cache and the local type-ahead prefix index.
+
+    python -m pytest tests
+"""
+import unittest
+from unittest import mock
+
+from support import fake_spotify
+
+import app as app_module
+from spotify_analysis import search
+from spotify_analysis.cache import TTLCache
+from spotify_analysis.client import SpotifyClient
+from spotify_analysis.search import ArtistIndex, search_artists, normalize_query
+
+from test_pages import log_in
+
+
+def artist(artist_id, name, popularity=50):
+    return {'id': artist_id, 'name': name, 'popularity': popularity,
+            'images': [{'url': f"https://i.example/{artist_id}"}]}
+
+
+class ArtistIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = ArtistIndex()
+        self.index.add_many([artist('beatles', 'The Beatles', 90), artist('beach', 'Beach House', 70),
+                             artist('best', 'Best Coast', 40), artist('house', 'House of Love', 20)])
+
+    def names(self, prefix, limit=5):
+        return [found['name'] for found in self.index.suggest(prefix, limit=limit)]
+
+    def test_prefix_of_the_name_or_a_later_word(self):
+        self.assertEqual(self.names('the b'), ['The Beatles'])
+        self.assertEqual(self.names('bea'), ['The Beatles', 'Beach House'])
+        self.assertEqual(self.names('hou'), ['Beach House', 'House of Love'])
+        self.assertEqual(self.names('coast'), ['Best Coast'])
+        self.assertEqual(self.names('eatles'), [])
+
+    def test_case_and_whitespace_are_ignored(self):
+        self.assertEqual(self.names('  BEACH   ho'), ['Beach House'])
+        self.assertEqual(normalize_query(' The  BEATLES '), 'the beatles')
+        self.assertEqual(self.names('   '), [])
+
+    def test_most_popular_first_up_to_the_limit(self):
+        self.assertEqual(self.names('b'), ['The Beatles', 'Beach House', 'Best Coast'])
+        self.assertEqual(self.names('b', limit=2), ['The Beatles', 'Beach House'])
+
+    def test_readding_updates_without_duplicating(self):
+        self.index.add(artist('best', 'Best Coast', 99))
+        self.assertEqual(self.names('b'), ['Best Coast', 'The Beatles', 'Beach House'])
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.stats()['keys'], 9)
+
+    def test_capped_at_max_artists(self):
+        index = ArtistIndex(max_artists=2)
+        index.add_many([artist('a', 'Alpha'), artist('b', 'Bravo'), artist('c', 'Charlie')])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.suggest('charlie'), [])
+
+    def test_artists_without_id_or_name_are_skipped(self):
+        self.index.add({'name': 'No Id'})
+        self.index.add({'id': 'no-name'})
+        self.assertEqual(len(self.index), 4)
+
+
+class SearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.index = ArtistIndex()
+        patches = [mock.patch.object(search, 'search_cache', TTLCache()),
+                   mock.patch.object(search, 'artist_index', self.index)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = SpotifyClient(auth='bench-token-search')
+
+    def test_equivalent_queries_share_one_upstream_search(self):
+        before = fake_spotify.call_counts()['search']
+        first = search_artists(self.client, 'Velvet Owls')
+        again = search_artists(self.client, '  velvet   OWLS ')
+        self.assertEqual(first, again)
+        self.assertEqual(fake_spotify.call_counts()['search'], before + 1)
+        # A different limit is a different result page
+        search_artists(self.client, 'velvet owls', limit=10)
+        self.assertEqual(fake_spotify.call_counts()['search'], before + 2)
+
+    def test_results_feed_the_type_ahead_index(self):
+        results = search_artists(self.client, 'neon rivers')
+        names = {item['name'] for item in results['artists']['items']}
+        self.assertTrue(names)
+        self.assertEqual({found['name'] for found in self.index.suggest('neon riv', limit=20)}, names)
+
+
+class SuggestRouteTest(unittest.TestCase):
+    def test_suggestions_never_call_spotify(self):
+        client = log_in('search-suggest')
+        client.get('/api/search-artist?query=golden tigers')
+        fake_spotify.wait_idle(quiet=0.3)
+        before = sum(fake_spotify.call_counts().values())
+        response = client.get('/api/suggest-artist?prefix=golden ti&limit=3')
+        self.assertEqual(response.status_code, 200)
+        names = [found['name'] for found in response.json['artists']]
+        self.assertTrue(names)
+        self.assertTrue(all(name.startswith('The Golden Tigers') for name in names))
+        self.assertEqual(sum(fake_spotify.call_counts().values()), before)
+
+    def test_suggestions_need_a_login(self):
+        response = app_module.app.test_client().get('/api/suggest-artist?prefix=a')
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
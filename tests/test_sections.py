@@ -0,0 +1,82 @@
+"""
+Progressive pages: placeholder shells and the /api/section fragments that fill them in.
+
+    python -m pytest tests
+"""
+import json
+import re
+import unittest
+from unittest import mock
+
+from test_pages import log_in
+
+import app as app_module
+
+SLOT = re.compile(r'class="[^"]*section-slot\s*([^"]*)"\s+data-slot="([^"]+)"')
+
+
+def slots(html):
+    """data-slot name -> whether the slot is still pending, for each slot on a page"""
+    return {name: 'pending' in classes for classes, name in SLOT.findall(html)}
+
+
+def fragments(client, page, name):
+    response = client.get(f"/api/section/{name}?page={page}")
+    assert response.status_code == 200, response.status_code
+    return response.get_json()['fragments']
+
+
+class SectionFragmentTest(unittest.TestCase):
+    def test_fragments_match_the_full_page(self):
+        client = log_in('sections-fragments')
+        for page, (_, names, _) in app_module.PAGES.items():
+            html = client.get(f"/{page}").get_data(as_text=True)
+            page_slots = slots(html)
+            self.assertTrue(page_slots, page)
+            self.assertFalse(any(page_slots.values()), page)
+            rendered = {}
+            for name in names:
+                for block, fragment in fragments(client, page, name).items():
+                    self.assertIn(block, page_slots, (page, block))
+                    self.assertIn(fragment, html, (page, block))
+                    rendered[block] = fragment
+            # Every slot on the page is filled in by one of its sections
+            self.assertEqual(set(rendered), set(page_slots), page)
+            self.assertTrue(any(fragment.strip() for fragment in rendered.values()), page)
+
+    def test_unknown_sections_and_logged_out_requests(self):
+        client = log_in('sections-unknown')
+        self.assertEqual(client.get('/api/section/history?page=dashboard').status_code, 404)
+        self.assertEqual(client.get('/api/section/mood?page=nowhere').status_code, 404)
+        logged_out = app_module.app.test_client()
+        self.assertEqual(logged_out.get('/api/section/mood').status_code, 401)
+
+
+class ProgressiveShellTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(app_module, 'PROGRESSIVE_PAGES', True)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_shell_leaves_every_slot_pending(self):
+        client = log_in('sections-shell')
+        for page in app_module.PAGES:
+            page_slots = slots(client.get(f"/{page}").get_data(as_text=True))
+            self.assertTrue(page_slots, page)
+            self.assertTrue(all(page_slots.values()), page)
+
+    def test_shell_sections_come_from_its_jobs(self):
+        client = log_in('sections-shell-jobs')
+        self.assertEqual(client.get('/music_dna').status_code, 200)
+        for name in app_module.MUSIC_DNA_SECTIONS:
+            key = app_module.section_job_key('sections-shell-jobs', name)
+            self.assertIsNotNone(app_module.job_queue.get(key), name)
+        job = app_module.job_queue.get(app_module.section_job_key('sections-shell-jobs', 'history'))
+        response = client.get('/api/section/history?page=music_dna')
+        self.assertEqual(response.status_code, 200)
+        # As the job computed it, through JSON (hour keys become strings)
+        self.assertEqual(response.get_json()['data'], json.loads(json.dumps(job.result(5))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+"""
+Server-side sessions: the memory and SQLite stores, and a cookie that carries only the session id.
+
+    python -m pytest tests
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask, session, jsonify
+
+from test_pages import log_in
+
+import app as app_module
+from spotify_analysis import sessions
+from spotify_analysis.sessions import (MemorySessionStore, SqliteSessionStore, ServerSideSessionInterface,
+                                       SID_BYTES)
+
+COOKIE = 'test-session'
+
+
+def session_app(store, lifetime=3600):
+    """A Flask app whose session lives in store"""
+    test_app = Flask(__name__)
+    test_app.secret_key = 'unused'
+    test_app.config['SESSION_COOKIE_NAME'] = COOKIE
+    test_app.session_interface = ServerSideSessionInterface(store, lifetime=lifetime)
+
+    @test_app.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return ''
+
+    @test_app.route('/login/<value>')
+    def login(value):
+        session.clear()
+        session['value'] = value
+        return ''
+
+    @test_app.route('/get')
+    def get_value():
+        return jsonify(session.get('value'))
+
+    @test_app.route('/logout')
+    def logout():
+        session.clear()
+        return ''
+
+    return test_app
+
+
+def cookie(client):
+    found = client.get_cookie(COOKIE)
+    return found.value if found is not None else None
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StoreContract:
+    """What both stores do; subclasses provide make_store()"""
+
+    def setUp(self):
+        self.clock = Clock()
+        patch = mock.patch.object(sessions.time, 'time', self.clock)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.store = self.make_store()
+
+    def test_save_load_and_delete(self):
+        self.assertIsNone(self.store.load('sid'))
+        self.store.save('sid', {'token_info': {'access_token': 'a'}}, self.clock.now + 60)
+        self.assertEqual(self.store.load('sid'), ({'token_info': {'access_token': 'a'}}, self.clock.now + 60))
+        self.store.delete('sid')
+        self.assertIsNone(self.store.load('sid'))
+        self.store.delete('sid')
+
+    def test_expiry_touch_and_sweep(self):
+        self.store.save('short', {'n': 1}, self.clock.now + 10)
+        self.store.save('long', {'n': 2}, self.clock.now + 100)
+        self.store.touch('short', self.clock.now + 50)
+        self.clock.now += 20
+        self.assertEqual(self.store.load('short')[0], {'n': 1})
+        self.clock.now += 40
+        self.assertIsNone(self.store.load('short'))
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.sweep(), 1)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store.load('long')[0], {'n': 2})
+
+    def test_loaded_data_is_a_copy(self):
+        self.store.save('sid', {'items': [1]}, self.clock.now + 60)
+        self.store.load('sid')[0]['items'].append(2)
+        self.assertEqual(self.store.load('sid')[0], {'items': [1]})
+
+
+class MemoryStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return MemorySessionStore()
+
+
+class SqliteStoreTest(StoreContract, unittest.TestCase):
+    def make_store(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'sessions.sqlite3')
+        return SqliteSessionStore(self.path)
+
+    def test_file_is_private(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_other_workers_and_threads_see_sessions(self):
+        other_worker = SqliteSessionStore(self.path)
+        self.store.save('sid', {'n': 1}, self.clock.now + 60)
+        self.assertEqual(other_worker.load('sid')[0], {'n': 1})
+        loaded = []
+        thread = threading.Thread(target=lambda: loaded.append(self.store.load('sid')))
+        thread.start()
+        thread.join()
+        self.assertEqual(loaded[0][0], {'n': 1})
+
+
+class SessionInterfaceTest(unittest.TestCase):
+    def setUp(self):
+        self.store = SqliteSessionStore(os.path.join(tempfile.mkdtemp(), 'sessions.sqlite3'))
+        self.app = session_app(self.store)
+        self.client = self.app.test_client()
+
+    def test_cookie_holds_only_the_session_id(self):
+        self.client.get('/set/secret-token')
+        sid = cookie(self.client)
+        self.assertNotIn('secret-token', sid)
+        self.assertGreaterEqual(len(sid), SID_BYTES)
+        self.assertEqual(self.store.load(sid)[0], {'value': 'secret-token'})
+        self.assertEqual(self.client.get('/get').get_json(), 'secret-token')
+
+    def test_sessions_are_shared_between_workers(self):
+        self.client.get('/set/shared')
+        other_worker = session_app(SqliteSessionStore(self.store.path)).test_client()
+        other_worker.set_cookie(COOKIE, cookie(self.client))
+        self.assertEqual(other_worker.get('/get').get_json(), 'shared')
+
+    def test_reads_do_not_write_or_set_a_cookie(self):
+        self.assertNotIn('Set-Cookie', self.client.get('/get').headers)
+        self.assertEqual(len(self.store), 0)
+        self.client.get('/set/x')
+        self.assertNotIn('Set-Cookie', self.client.get('/get').headers)
+
+    def test_login_moves_the_session_to_a_new_id(self):
+        self.client.get('/set/before')
+        before = cookie(self.client)
+        self.client.get('/login/after')
+        after = cookie(self.client)
+        self.assertNotEqual(after, before)
+        self.assertIsNone(self.store.load(before))
+        self.assertEqual(self.store.load(after)[0], {'value': 'after'})
+
+    def test_logout_forgets_the_session(self):
+        self.client.get('/set/x')
+        sid = cookie(self.client)
+        self.client.get('/logout')
+        self.assertIsNone(cookie(self.client))
+        self.assertIsNone(self.store.load(sid))
+
+    def test_unknown_and_oversized_ids_start_a_new_session(self):
+        for sid in ('no-such-session', 'x' * 200):
+            self.client.set_cookie(COOKIE, sid)
+            self.assertIsNone(self.client.get('/get').get_json())
+            self.client.get('/set/fresh')
+            self.assertNotEqual(cookie(self.client), sid)
+
+    def test_sessions_in_use_are_extended(self):
+        clock = Clock()
+        with mock.patch.object(sessions.time, 'time', clock):
+            self.client.get('/set/x')
+            sid = cookie(self.client)
+            clock.now += 1000
+            self.assertNotIn('Set-Cookie', self.client.get('/get').headers)
+            clock.now += 1000
+            self.assertIn('Set-Cookie', self.client.get('/get').headers)
+            self.assertEqual(self.store.load(sid)[1], clock.now + 3600)
+
+
+class AppSessionTest(unittest.TestCase):
+    def test_login_keeps_the_token_on_the_server(self):
+        client = log_in('sessions-login')
+        sid = client.get_cookie(app_module.app.config['SESSION_COOKIE_NAME']).value
+        self.assertNotIn('bench-token', sid)
+        data, _ = app_module.app.session_interface.store.load(sid)
+        self.assertEqual(data['token_info']['access_token'], 'bench-token-sessions-login')
+        self.assertEqual(data['user_info']['id'], 'sessions-login')
+
+
+if __name__ == '__main__':
+    unittest.main()
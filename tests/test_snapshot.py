@@ -0,0 +1,113 @@
+"""
+UserSnapshot: each endpoint fetched once per page and shared by every analysis.
+
+    python -m pytest tests
+"""
+import time
+import threading
+import unittest
+from collections import Counter
+
+from fake_spotify import top_items, recently_played
+
+from spotify_analysis.artist_analysis import get_top_artists, analyze_genre_distribution
+from spotify_analysis.obscurity_score import calculate_obscurity_score
+from spotify_analysis.track_analysis import get_top_tracks, analyze_recent_plays
+from spotify_analysis.snapshot import UserSnapshot, MAX_LIMIT
+
+USER = {'id': 'snapshot-user', 'display_name': 'Snapshot User'}
+
+
+class CountingClient:
+    """The spotipy calls a snapshot makes, answered like the fake server and counted"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        time.sleep(self.delay)
+
+    def me(self):
+        self._count('me')
+        return dict(USER)
+
+    def current_user_top_artists(self, limit=20, offset=0, time_range='medium_term'):
+        self._count(('top_artists', time_range))
+        return top_items(USER['id'], 'artists', time_range, limit, offset)
+
+    def current_user_top_tracks(self, limit=20, offset=0, time_range='medium_term'):
+        self._count(('top_tracks', time_range))
+        return top_items(USER['id'], 'tracks', time_range, limit, offset)
+
+    def current_user_recently_played(self, limit=50, after=None, before=None):
+        self._count('recently_played')
+        return recently_played(USER['id'], limit, after)
+
+    def artist(self, artist_id):
+        self._count('artist')
+        return {'id': artist_id}
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.client = CountingClient()
+        self.snapshot = UserSnapshot(self.client, user_info=USER, cache=None)
+
+    def test_analyses_share_one_fetch_per_endpoint(self):
+        get_top_artists(self.snapshot, 'medium_term')
+        get_top_tracks(self.snapshot, 'medium_term')
+        analyze_genre_distribution(self.snapshot)
+        calculate_obscurity_score(self.snapshot)
+        analyze_recent_plays(self.snapshot)
+        analyze_recent_plays(self.snapshot, limit=10)
+
+        self.assertEqual(self.client.calls, Counter({
+            ('top_artists', 'short_term'): 1, ('top_artists', 'medium_term'): 1,
+            ('top_artists', 'long_term'): 1, ('top_tracks', 'medium_term'): 1, 'recently_played': 1}))
+        self.assertEqual(self.snapshot.upstream_calls, 5)
+
+    def test_smaller_pages_are_sliced_from_the_full_page(self):
+        full = top_items(USER['id'], 'artists', 'short_term', MAX_LIMIT, 0)
+        page = self.snapshot.current_user_top_artists(limit=5, offset=10, time_range='short_term')
+        self.assertEqual([item['id'] for item in page['items']], [item['id'] for item in full['items'][10:15]])
+        self.assertEqual((page['limit'], page['offset']), (5, 10))
+        self.assertEqual(self.client.calls[('top_artists', 'short_term')], 1)
+
+    def test_profile_given_by_the_caller_is_not_refetched(self):
+        self.assertEqual(self.snapshot.me()['id'], USER['id'])
+        self.assertEqual(self.client.calls['me'], 0)
+        snapshot = UserSnapshot(self.client, cache=None)
+        snapshot.me()
+        snapshot.current_user()
+        self.assertEqual(self.client.calls['me'], 1)
+
+    def test_requests_beyond_the_shared_page_pass_through(self):
+        self.snapshot.current_user_top_tracks(limit=20, offset=40)
+        self.snapshot.current_user_recently_played(limit=10, after=0)
+        self.snapshot.artist('a1')
+        self.assertEqual(self.client.calls[('top_tracks', 'medium_term')], 1)
+        self.assertEqual(self.client.calls['recently_played'], 1)
+        self.assertEqual(self.client.calls['artist'], 1)
+        # Passed-through calls are not kept: asking again goes upstream again
+        self.snapshot.artist('a1')
+        self.assertEqual(self.snapshot.upstream_calls, 4)
+
+    def test_concurrent_callers_wait_for_one_fetch(self):
+        self.client.delay = 0.1
+        pages = []
+        threads = [threading.Thread(target=lambda: pages.append(self.snapshot.current_user_top_tracks()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.client.calls[('top_tracks', 'medium_term')], 1)
+        self.assertEqual(len({tuple(item['id'] for item in page['items']) for page in pages}), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+Extended Streaming History imports: chunked decoding and the aggregates built from it.
+
+    python -m pytest tests
+"""
+import json
+import os
+import random
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+
+from spotify_analysis import streaming_history
+from spotify_analysis.streaming_history import (iter_plays, import_streaming_history, resolve_artist_genres,
+                                                StreamingHistoryError, MIN_MS_PLAYED)
+
+ARTISTS = ['Low', 'Wire', 'Slowdive', 'Can', 'Ëlëctric Ünïcode "Quoted"']
+
+
+def random_plays(rng, count):
+    plays = []
+    for _ in range(count):
+        play = {'ts': f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:"
+                      f"{rng.randint(0, 59):02d}:00Z",
+                'ms_played': rng.choice([0, 5000, 31000, 200000]),
+                'master_metadata_album_artist_name': rng.choice(ARTISTS + [None]),
+                'master_metadata_track_name': "Track {with} [brackets], \"quotes\"\nand a newline"}
+        plays.append(play)
+    return plays
+
+
+def write_export(plays, indent=None):
+    path = os.path.join(tempfile.mkdtemp(), 'Streaming_History_Audio_2023.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(plays, f, indent=indent, ensure_ascii=False)
+    return path
+
+
+def write_text(text):
+    path = os.path.join(tempfile.mkdtemp(), 'export.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return path
+
+
+class IterPlaysTest(unittest.TestCase):
+    def test_plays_split_across_chunks(self):
+        plays = random_plays(random.Random(16), 60)
+        for indent in (None, 2):
+            path = write_export(plays, indent)
+            for chunk_size in (1, 7, 64, 1000, 1 << 20):
+                self.assertEqual(list(iter_plays(path, chunk_size=chunk_size)), plays, (indent, chunk_size))
+
+    def test_empty_and_whitespace(self):
+        self.assertEqual(list(iter_plays(write_text('[]'))), [])
+        self.assertEqual(list(iter_plays(write_text('\n  [ \n ]\n'), chunk_size=2)), [])
+        self.assertEqual(list(iter_plays(write_text(' [ {"a": 1} ,\n{"a": 2} ] '), chunk_size=3)),
+                         [{'a': 1}, {'a': 2}])
+
+    def test_malformed_files(self):
+        for text in ('{"a": 1}', '[{"a": 1}, {"a": ', '[{"a": 1}', '[{"a": tru}]'):
+            with self.assertRaises(StreamingHistoryError, msg=text):
+                list(iter_plays(write_text(text), chunk_size=4))
+
+    def test_oversized_play_is_rejected(self):
+        path = write_text('[{"a": "' + 'x' * 100)
+        with mock.patch.object(streaming_history, 'MAX_PLAY_SIZE', 50):
+            with self.assertRaises(StreamingHistoryError):
+                list(iter_plays(path, chunk_size=8))
+
+
+class ImportTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(61)
+        self.exports = [random_plays(rng, count) for count in (200, 0, 150)]
+        self.paths = [write_export(plays) for plays in self.exports]
+        self.counted = [play for plays in self.exports for play in plays
+                        if play['master_metadata_album_artist_name'] and play['ms_played'] >= MIN_MS_PLAYED]
+
+    def test_aggregates_match_the_plays(self):
+        summary = import_streaming_history(self.paths, workers=0).recent_plays_summary(top=10)
+        hours = Counter(int(play['ts'][11:13]) for play in self.counted)
+        artists = Counter(play['master_metadata_album_artist_name'] for play in self.counted)
+        self.assertEqual(summary['hour_distribution'], {hour: hours.get(hour, 0) for hour in range(24)})
+        self.assertEqual(dict(summary['top_recent_artists']), dict(artists))
+        self.assertEqual(summary['total_plays'], len(self.counted))
+        self.assertEqual(summary['hours_played'],
+                         round(sum(play['ms_played'] for play in self.counted) / 3600000, 1))
+        self.assertEqual(summary['since'], min(play['ts'] for play in self.counted))
+        self.assertEqual(summary['until'], max(play['ts'] for play in self.counted))
+
+    def test_parallel_import_matches_a_single_process(self):
+        serial = import_streaming_history(self.paths, workers=0)
+        parallel = import_streaming_history(self.paths, workers=2)
+        self.assertEqual(parallel.recent_plays_summary(), serial.recent_plays_summary())
+        self.assertEqual(list(parallel.artist_counts), list(serial.artist_counts))
+        self.assertEqual(parallel.skipped, serial.skipped)
+
+    def test_genres_weighted_by_plays(self):
+        aggregate = import_streaming_history(self.paths, workers=0)
+        genres = aggregate.genre_distribution({'Low': ['slowcore'], 'Slowdive': ['shoegaze', 'slowcore']})
+        plays = aggregate.artist_counts
+        self.assertEqual(genres['genre_counts'], {'slowcore': plays['Low'] + plays['Slowdive'],
+                                                  'shoegaze': plays['Slowdive']})
+        self.assertAlmostEqual(sum(genres['genre_percentages'].values()), 100)
+
+
+class ResolveGenresTest(unittest.TestCase):
+    def test_failed_lookups_are_logged_and_skipped(self):
+        def search(client, name, limit=1):
+            if name == 'Wire':
+                raise RuntimeError("search down")
+            return {'artists': {'items': [{'name': name, 'genres': ['post-punk']}] if name != 'Nobody' else []}}
+
+        with mock.patch.object(streaming_history, 'search_artists', search):
+            with self.assertLogs('spotify_analysis.streaming_history', 'WARNING'):
+                genres = resolve_artist_genres(None, ['Low', 'Wire', 'Nobody'])
+        self.assertEqual(genres, {'Low': ['post-punk']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+Single-flight and ahead-of-expiry token refresh, over several expiry cycles.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('SPOTIFY_SESSION_STORE', 'memory')
+
+from spotify_analysis.token_refresh import TokenRefresher, REFRESH_MARGIN, PROACTIVE_REFRESH_WINDOW  # noqa: E402
+
+# Inside the background refresh window, outside the synchronous one
+SOON = (REFRESH_MARGIN + PROACTIVE_REFRESH_WINDOW) // 2
+
+
+class FakeAccounts:
+    """refresh_fn handing out numbered tokens that expire about `lifetime` seconds later"""
+
+    def __init__(self, lifetime=SOON):
+        self.lifetime = lifetime
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, refresh_token):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        # Each token outlives the one before, as it would with real time passing between cycles
+        return {'access_token': f"access-{number}", 'refresh_token': refresh_token,
+                'expires_at': int(time.time()) + self.lifetime + number}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class BackgroundRefreshTest(unittest.TestCase):
+    def test_every_expiry_cycle_is_refreshed_in_the_background(self):
+        accounts = FakeAccounts()
+        refresher = TokenRefresher(accounts, lock_dir=None)
+        token_info = {'access_token': 'access-0', 'refresh_token': 'r', 'expires_at': int(time.time()) + SOON}
+
+        for cycle in range(1, 4):
+            refresher.refresh_in_background('r', token_info['access_token'])
+            wait_for(lambda: refresher.refreshes == cycle)
+            newer = refresher.peek('r')
+            self.assertEqual(newer['access_token'], f"access-{cycle}")
+            token_info = newer
+        self.assertEqual(accounts.calls, 3)
+
+    def test_remembered_token_is_reused_by_other_callers(self):
+        accounts = FakeAccounts(lifetime=3600)
+        refresher = TokenRefresher(accounts, lock_dir=None)
+        first = refresher.refresh('r', 'access-0')
+        # A request still carrying the old token picks up the new one
+        self.assertIs(refresher.refresh('r', 'access-0'), first)
+        self.assertEqual(accounts.calls, 1)
+
+    def test_concurrent_refreshes_share_one_call(self):
+        release = threading.Event()
+        accounts = FakeAccounts(lifetime=3600)
+
+        def slow(refresh_token):
+            release.wait()
+            return accounts(refresh_token)
+
+        refresher = TokenRefresher(slow, lock_dir=None)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(refresher.refresh('r', 'access-0')))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        wait_for(lambda: refresher.coalesced == 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(accounts.calls, 1)
+        self.assertEqual({info['access_token'] for info in results}, {'access-1'})
+
+
+class SharedRefreshTest(unittest.TestCase):
+    """Two workers on one host, coalescing through the flock result file"""
+
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.accounts = FakeAccounts()
+        self.workers = [TokenRefresher(self.accounts, lock_dir=self.lock_dir) for _ in range(2)]
+
+    def test_each_cycle_refreshes_once_across_workers(self):
+        access_token = 'access-0'
+        for cycle in range(1, 3):
+            for worker in self.workers:
+                worker.refresh_in_background('r', access_token)
+                wait_for(lambda: worker.peek('r') and worker.peek('r')['access_token'] != access_token)
+            tokens = {worker.peek('r')['access_token'] for worker in self.workers}
+            self.assertEqual(tokens, {f"access-{cycle}"})
+            access_token = tokens.pop()
+        self.assertEqual(self.accounts.calls, 2)
+
+
+class GetTokenTest(unittest.TestCase):
+    """app.get_token() keeps a session's token fresh without a request waiting on a refresh"""
+
+    def setUp(self):
+        import app as app_module
+        self.app_module = app_module
+        self.accounts = FakeAccounts(lifetime=3600)
+        self.refresher = TokenRefresher(self.accounts, lock_dir=None)
+        patch = mock.patch.object(app_module, 'token_refresher', self.refresher)
+        patch.start()
+        self.addCleanup(patch.stop)
+        # A clock the test moves forward, so each new token in turn gets close to expiry
+        self.now = time.time()
+        patch = mock.patch.object(time, 'time', lambda: self.now)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def get_token(self, token_info):
+        with self.app_module.app.test_request_context('/'):
+            self.app_module.session['token_info'] = token_info
+            return self.app_module.get_token()
+
+    def test_two_expiry_cycles(self):
+        token_info = {'access_token': 'access-0', 'refresh_token': 'r', 'expires_at': int(self.now) + SOON}
+        for cycle in range(1, 3):
+            # Still usable: served as is, with a refresh started behind it
+            self.assertEqual(self.get_token(token_info)['access_token'], token_info['access_token'])
+            wait_for(lambda: self.refresher.refreshes == cycle)
+            token_info = self.get_token(token_info)
+            self.assertEqual(token_info['access_token'], f"access-{cycle}")
+            self.now = token_info['expires_at'] - SOON
+        self.assertEqual(self.accounts.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+The pooled keep-alive session shared by every SpotifyClient in a worker.
+
+    python -m pytest tests
+"""
+import gc
+import unittest
+from unittest import mock
+
+import requests
+
+from support import fake_spotify
+
+from spotify_analysis.client import SpotifyClient
+from spotify_analysis.transport import get_session, is_shared_session, pool_stats
+
+
+def fake_pool():
+    return pool_stats().get(fake_spotify.url, {})
+
+
+class SharedSessionTest(unittest.TestCase):
+    def test_clients_share_the_worker_session(self):
+        clients = [SpotifyClient(auth=f"bench-token-pool{n}") for n in range(3)]
+        self.assertTrue(all(is_shared_session(client._session) for client in clients))
+        self.assertIs(clients[0]._session, get_session())
+
+    def test_own_session_is_not_shared(self):
+        client = SpotifyClient(auth='bench-token-pool', requests_session=requests.Session())
+        self.assertFalse(is_shared_session(client._session))
+
+    def test_connections_are_reused_across_clients(self):
+        SpotifyClient(auth='bench-token-pool-warm').me()
+        before = fake_pool()
+        for n in range(20):
+            SpotifyClient(auth=f"bench-token-pool{n}").me()
+        after = fake_pool()
+        self.assertEqual(after['requests'] - before['requests'], 20)
+        self.assertLessEqual(after['connections_opened'] - before['connections_opened'], 1)
+        self.assertGreater(after['reuse_ratio'], 0.5)
+
+    def test_collected_client_leaves_the_session_open(self):
+        session = get_session()
+        with mock.patch.object(session, 'close') as close:
+            client = SpotifyClient(auth='bench-token-pool')
+            client.me()
+            del client
+            gc.collect()
+        close.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()